@@ -0,0 +1,350 @@
+"""Benchmarks for DGEANN's genome operations.
+
+Builds synthetic genomes of a chosen size and times recombine, crossover,
+mutate, structure_network, build_weights, and full builds, reporting
+throughput and peak memory (as seen by tracemalloc).
+
+If PyCaffe is not installed, a stand-in is used that parses the network
+definitions DGEANN writes and makes NumPy weight arrays of the right shape,
+so everything but Caffe's own work can be measured anywhere.
+
+Usage: python "dgeann benchmarks.py" [--layers N] [--nodes N] [--fan-in N]
+       [--haploid] [--columnar] [--repeat N] [--save FILE] [--compare FILE]
+With no size options, runs the small, medium, and large presets.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+import types
+
+import numpy
+
+#stand-in for PyCaffe, used only if it is not installed
+def _stand_in_caffe():
+    """Return a module with just enough of PyCaffe for DGEANN's builds.
+    """
+    def tokens(text):
+        return re.findall(r'"[^"]*"|[{}:]|[^\s{}:"]+', text)
+
+    def parse(toks, i=0):
+        #returns a list of (key, value) pairs; nested blocks are lists
+        out = []
+        while i < len(toks):
+            key = toks[i]
+            if key == "}":
+                return out, i + 1
+            i += 1
+            if toks[i] == ":":
+                i += 1
+            if toks[i] == "{":
+                sub, i = parse(toks, i + 1)
+                out.append((key, sub))
+            else:
+                out.append((key, toks[i].strip('"')))
+                i += 1
+        return out, i
+
+    def get(entries, key):
+        return [v for k, v in entries if k == key]
+
+    class Blob(object):
+        def __init__(self, shape):
+            self.data = numpy.zeros(shape, dtype=numpy.float32)
+
+    class Net(object):
+        def __init__(self, entries):
+            self.blobs = {}
+            self.params = {}
+            self._layer_names = []
+            self._blob_names = []
+            self._bottoms = []
+            for name, shape in zip(get(entries, "input"),
+                                   get(entries, "input_shape")):
+                self.blobs[name] = Blob([int(d) for d in get(shape, "dim")])
+                self._blob_names.append(name)
+            for layer in get(entries, "layer"):
+                name = get(layer, "name")[0]
+                kind = get(layer, "type")[0]
+                bottoms = get(layer, "bottom")
+                top = get(layer, "top")[0]
+                self._layer_names.append(name)
+                self._bottoms.append([self._blob_names.index(b)
+                                      for b in bottoms])
+                if kind == "Concat":
+                    width = sum(self.blobs[b].data.shape[1] for b in bottoms)
+                    self.blobs[top] = Blob((1, width))
+                elif kind == "InnerProduct":
+                    n = int(get(get(layer, "inner_product_param")[0],
+                                "num_output")[0])
+                    k = self.blobs[bottoms[0]].data.shape[1]
+                    weights = Blob((n, k))
+                    scale = (3.0 / k) ** 0.5
+                    weights.data[...] = numpy.random.uniform(-scale, scale,
+                                                             (n, k))
+                    self.params[name] = [weights, Blob((n,))]
+                    self.blobs[top] = Blob((1, n))
+                else:
+                    self.blobs[top] = Blob(())
+                self._blob_names.append(top)
+
+        def _bottom_ids(self, i):
+            return list(self._bottoms[i])
+
+    class AdaDeltaSolver(object):
+        def __init__(self, path):
+            with open(path) as f:
+                entries = parse(tokens(f.read()))[0]
+            net = get(entries, "net")
+            if net:
+                with open(net[0]) as f:
+                    self.net = Net(parse(tokens(f.read()))[0])
+            else:
+                self.net = Net(get(entries, "net_param")[0])
+
+    caffe = types.ModuleType("caffe")
+    caffe.AdaDeltaSolver = AdaDeltaSolver
+    caffe.Net = Net
+    caffe.TRAIN = 0
+    caffe.TEST = 1
+    return caffe
+
+try:
+    import caffe
+    stand_in = False
+except ImportError:
+    sys.modules["caffe"] = _stand_in_caffe()
+    stand_in = True
+
+import dgeann
+
+#name: (layers, nodes per layer, concat fan-in)
+presets = {"small": (3, 10, 2),
+           "medium": (5, 50, 2),
+           "large": (8, 100, 3)}
+
+#operations that are run, in order
+operations = ["recombine", "crossover", "mutate", "duplicate",
+              "structure_network", "build_weights", "build", "build_in_memory"]
+
+
+def synthetic_genome(layers, nodes, fan_in, haploid=False, columnar=False):
+    """Return a random genome with fan_in input layers followed by layers
+    inner product layers, each taking the last fan_in layers as inputs
+    (through a concat if fan_in > 1), all with nodes nodes.
+    """
+    layer_genes = []
+    for i in range(fan_in):
+        layer_genes.append(dgeann.LayerGene(5, False, False, 0, "IN" + str(i),
+                                            [], nodes, "input"))
+    for i in range(layers):
+        inputs = [g.ident for g in layer_genes[-fan_in:]]
+        layer_genes.append(dgeann.LayerGene(random.randint(1, 5), True, True,
+                                            0.01, "IP" + str(i), inputs,
+                                            nodes, "IP"))
+    weights_a = []
+    weights_b = []
+    for out_layer in layer_genes[fan_in:]:
+        for in_layer in out_layer.inputs:
+            for i in range(nodes):
+                for j in range(nodes):
+                    ident = dgeann.gene_ident()
+                    weights_a.append(dgeann.WeightGene(
+                        random.randint(1, 5), True, False, dgeann.def_mut_rate,
+                        ident, random.gauss(0, 0.5), i, j, in_layer,
+                        out_layer.ident))
+                    weights_b.append(dgeann.WeightGene(
+                        random.randint(1, 5), True, False, dgeann.def_mut_rate,
+                        ident, random.gauss(0, 0.5), i, j, in_layer,
+                        out_layer.ident))
+    if columnar:
+        weights_a = dgeann.WeightChromosome(weights_a)
+        weights_b = dgeann.WeightChromosome(weights_b)
+    if haploid:
+        return dgeann.HaploidGenome(layer_genes, weights_a)
+    return dgeann.Genome(layer_genes, [dgeann.copy_gene(g) for g in
+                                       layer_genes], weights_a, weights_b)
+
+def copy_genome(genome):
+    """Return an independent copy of a genome.
+    """
+    return dgeann.unpack_genome(dgeann.pack_genome(genome,
+                                                   copy_arrays=True))
+
+def gene_count(genome):
+    """Return the number of genes in a genome.
+    """
+    return (len(genome.layerchr_a) + len(genome.layerchr_b) +
+            len(genome.weightchr_a) + len(genome.weightchr_b))
+
+def haploid_crossover(genome, other):
+    """Cross over two haploid genomes the way HaploidGenome.recombine does.
+    """
+    genome.layerchr_b = other.layerchr_a
+    genome.weightchr_b = other.weightchr_a
+    try:
+        return genome.crossover()
+    finally:
+        genome.layerchr_b = []
+        genome.weightchr_b = []
+
+def duplicate_layer(genome):
+    """Duplicate the first inner product layer of a genome, as a Dup
+    mutation does.
+    """
+    chro = genome.layerchr_a
+    gene = [g for g in chro if g.layer_type == "IP"][0]
+    genome.handle_duplication(gene, chro)
+
+def setup_op(name, genome, other, repeat):
+    """Return a function running one operation (called with the run number)
+    and anything it needs that should not be timed.
+    """
+    if name == "recombine":
+        return lambda k: genome.recombine(other)
+    if name == "crossover":
+        if isinstance(genome, dgeann.HaploidGenome):
+            return lambda k: haploid_crossover(genome, other)
+        return lambda k: genome.crossover()
+    if name == "mutate":
+        copies = [copy_genome(genome) for k in range(repeat + 1)]
+        return lambda k: copies[k].mutate()
+    if name == "duplicate":
+        copies = [copy_genome(genome) for k in range(repeat + 1)]
+        return lambda k: duplicate_layer(copies[k])
+    if name == "structure_network":
+        copies = [copy_genome(genome) for k in range(repeat + 1)]
+        return lambda k: copies[k].express_layout({})
+    if name == "build_weights":
+        built = copy_genome(genome)
+        solver = built.build(in_memory=True)
+        sub_dict, active_list, layout = copy_genome(built).express_layout({})
+        return lambda k: built.build_weights(active_list, solver.net,
+                                             sub_dict)
+    if name == "build":
+        return lambda k: genome.build()
+    if name == "build_in_memory":
+        return lambda k: genome.build(in_memory=True)
+    raise ValueError("unknown operation " + name)
+
+def bench(name, genome, other, repeat):
+    """Return timing and memory results for one operation on a genome.
+    """
+    genes = gene_count(genome)
+    run = setup_op(name, genome, other, repeat)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        #one run for peak memory, kept out of the timings
+        tracemalloc.start()
+        run(repeat)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for k in range(repeat):
+            run(k)
+        seconds = time.perf_counter() - start
+    return {"seconds": seconds / repeat,
+            "genomes_per_s": repeat / seconds,
+            "genes_per_s": genes * repeat / seconds,
+            "peak_bytes": peak,
+            "genes": genes}
+
+def run_case(layers, nodes, fan_in, haploid, columnar, repeat, ops, seed=0):
+    """Return the results of every operation for one genome size.
+    """
+    random.seed(seed)
+    dgeann.np_random = numpy.random.default_rng(seed)
+    numpy.random.seed(seed)
+    genome = synthetic_genome(layers, nodes, fan_in, haploid, columnar)
+    other = synthetic_genome(layers, nodes, fan_in, haploid, columnar)
+    results = {}
+    for name in ops:
+        results[name] = bench(name, genome, other, repeat)
+    return results
+
+def case_name(layers, nodes, fan_in, haploid, columnar):
+    """Return the name a genome size is reported under.
+    """
+    name = "{0}x{1}/fan{2}".format(layers, nodes, fan_in)
+    name += "/haploid" if haploid else "/diploid"
+    if columnar:
+        name += "/columnar"
+    return name
+
+def report(case, results, baseline=None, tolerance=0.25):
+    """Print results for one case, and return the operations that are slower
+    than in baseline by more than tolerance.
+    """
+    slower = []
+    print(case)
+    print("  {0:<18}{1:>12}{2:>14}{3:>14}{4:>12}".format(
+        "operation", "ms", "genomes/s", "genes/s", "peak KiB"))
+    for name, res in results.items():
+        line = "  {0:<18}{1:>12.3f}{2:>14.1f}{3:>14.0f}{4:>12.1f}".format(
+            name, res["seconds"] * 1000, res["genomes_per_s"],
+            res["genes_per_s"], res["peak_bytes"] / 1024)
+        if baseline is not None and name in baseline:
+            ratio = res["seconds"] / baseline[name]["seconds"]
+            line += "  x{0:.2f}".format(ratio)
+            if ratio > 1 + tolerance:
+                line += " SLOWER"
+                slower.append(name)
+        print(line)
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DGEANN genome "
+                                                 "operations.")
+    parser.add_argument("--layers", type=int, help="hidden layers")
+    parser.add_argument("--nodes", type=int, help="nodes per layer")
+    parser.add_argument("--fan-in", type=int, help="inputs per layer")
+    parser.add_argument("--haploid", action="store_true")
+    parser.add_argument("--columnar", action="store_true",
+                        help="use WeightChromosomes for weight genes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ops", nargs="+", default=operations,
+                        choices=operations)
+    parser.add_argument("--save", help="write results to a JSON file")
+    parser.add_argument("--compare", help="compare to results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before --compare fails")
+    args = parser.parse_args(argv)
+    if args.layers or args.nodes or args.fan_in:
+        default = presets["small"]
+        sizes = [(args.layers or default[0], args.nodes or default[1],
+                  args.fan_in or default[2])]
+    else:
+        sizes = list(presets.values())
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    if stand_in:
+        print("PyCaffe not found; using the stand-in for builds\n")
+    if not os.path.exists("Gen files"):
+        os.makedirs("Gen files")
+    all_results = {}
+    slower = []
+    for layers, nodes, fan_in in sizes:
+        case = case_name(layers, nodes, fan_in, args.haploid, args.columnar)
+        results = run_case(layers, nodes, fan_in, args.haploid, args.columnar,
+                           args.repeat, args.ops)
+        all_results[case] = results
+        slower += [case + " " + name for name in
+                   report(case, results, (baseline or {}).get(case),
+                          args.tolerance)]
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(all_results, f, indent=2)
+    if slower:
+        print("\nslower than baseline: " + ", ".join(slower))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
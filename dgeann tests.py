@@ -69,6 +69,39 @@ class testWeight(unittest.TestCase):
                                     "Z", "Y").read({"X": 1, "Y": 1}, {"Z": "X"})
         self.assertEqual(test_i, ["X", 0, "Y", 0, 1.0])
 
+    def test_read_blocks(self):
+        block = dgeann.WeightBlockGene
+        low = block(1, False, False, 0, "blk", [1.0, 2.0, 3.0], 3, 0, "A", "B")
+        high = block(5, False, False, 0, "blk", [5.0, 6.0], 3, 0, "A", "B")
+        same = block(1, False, False, 0, "blk", [3.0, 4.0], 3, 0, "A", "B")
+        #more dominant block wins where both have weights; longer tail kept
+        result = low.read(self.active_list, {}, high)
+        self.assertEqual(result[0:4], ["A", 3, "B", 0])
+        self.assertEqual(result[4].tolist(), [5.0, 6.0, 3.0])
+        #co-dominant blocks are averaged
+        result = low.read(self.active_list, {}, same)
+        self.assertEqual(result[4].tolist(), [2.0, 3.0, 3.0])
+        #blocks starting at different weights are both read
+        other = block(1, False, False, 0, "blk", [7.0], 5, 0, "A", "B")
+        result = low.read(self.active_list, {}, other)
+        self.assertEqual(result[0:4], ["A", 5, "B", 0])
+        self.assertEqual(result[5:9], ["A", 3, "B", 0])
+        #single weight genes read through a block opposite them
+        result = self.low_dom_a.read(self.active_list, {}, high)
+        self.assertEqual(result[4].tolist(), [5.0, 6.0])
+        #weight mutations pick one weight of the block
+        mut = block(1, True, False, 1.0, "blk", [1.0, 2.0], 3, 0, "A", "B")
+        probs = dgeann.weight_mut_probs
+        dgeann.weight_mut_probs = (1, 0, 0)
+        try:
+            result = mut.mutate()
+        finally:
+            dgeann.weight_mut_probs = probs
+        self.assertEqual(result.split(", ")[0], "Weight")
+        self.assertTrue(result.split(", ")[1] in ["0", "1"])
+        with self.assertRaises(ValueError):
+            dgeann.WeightChromosome([mut])
+
     def test_mutate(self):
         #case where mutatability is off
         test_mut_off = self.unread_a.mutate()
@@ -105,6 +138,69 @@ class testWeight(unittest.TestCase):
         test_clamp_rate = self.mut_rate.mutate()
         self.assertEqual(test_clamp_rate, "Rate, -0.0004181538857107627")
 
+#tests the array-backed weight chromosome
+class testWeightChromosome(unittest.TestCase):
+
+    def setUp(self):
+        self.genes = [wg(1, True, False, 0.01, "abcd", 1.5, 0, 0, "A", "B"),
+                      wg(3, False, True, 0.02, "efgh", -2.0, 0, 1, "A", "B"),
+                      wg(5, True, False, 0.03, "ijklmnop", 0.5, 1, 0,
+                         "B", "C")]
+        self.chro = dgeann.WeightChromosome(self.genes)
+
+    def test_views(self):
+        self.assertEqual(len(self.chro), 3)
+        self.assertEqual(self.chro.layers, ["A", "B", "C"])
+        for gene, view in zip(self.genes, self.chro):
+            self.assertIsInstance(view, wg)
+            self.assertEqual(view.dom, gene.dom)
+            self.assertEqual(view.can_mut, gene.can_mut)
+            self.assertEqual(view.can_dup, gene.can_dup)
+            self.assertEqual(view.mut_rate, gene.mut_rate)
+            self.assertEqual(view.ident, gene.ident)
+            self.assertEqual(view.weight, gene.weight)
+            self.assertEqual(view.in_node, gene.in_node)
+            self.assertEqual(view.out_node, gene.out_node)
+            self.assertEqual(view.in_layer, gene.in_layer)
+            self.assertEqual(view.out_layer, gene.out_layer)
+        self.assertEqual(self.chro[-1].ident, "ijklmnop")
+        active_list = {"A": 2, "B": 2, "C": 1}
+        self.assertEqual(self.chro[0].read(active_list, {}, self.chro[1]),
+                         self.genes[0].read(active_list, {}, self.genes[1]))
+
+    def test_write_through(self):
+        genome = dgeann.Genome([], [], self.chro, [])
+        genome.handle_mutation("Weight, 1.0", self.chro[0], "a")
+        genome.handle_mutation("Dom, 1", self.chro[0], "a")
+        self.assertEqual(self.chro.weight[0], 2.5)
+        self.assertEqual(self.chro.dom[0], 2)
+        self.chro[1].out_layer = "D"
+        self.assertEqual(self.chro[1].out_layer, "D")
+        self.assertEqual(self.chro.layers, ["A", "B", "C", "D"])
+        #copies are independent genes
+        gene = dgeann.copy.copy(self.chro[2])
+        gene.weight = 9.0
+        self.assertEqual(self.chro[2].weight, 0.5)
+
+    def test_list_ops(self):
+        new = wg(2, True, False, 0.01, "qrst", 4.0, 1, 1, "A", "B")
+        self.chro.insert(self.chro.index(self.chro[1]) + 1, new)
+        self.assertEqual([g.ident for g in self.chro],
+                         ["abcd", "efgh", "qrst", "ijklmnop"])
+        self.chro.append(new)
+        self.assertEqual(len(self.chro), 5)
+        del self.chro[0]
+        self.assertEqual(self.chro[0].ident, "efgh")
+        self.assertEqual([g.ident for g in reversed(self.chro)],
+                         ["qrst", "ijklmnop", "qrst", "efgh"])
+        part = self.chro[1:3]
+        self.assertEqual([g.ident for g in part], ["qrst", "ijklmnop"])
+        part[0].weight = 7.0
+        self.assertEqual(self.chro[1].weight, 4.0)
+        genes = self.chro.to_genes()
+        self.assertEqual(type(genes[0]), wg)
+        self.assertEqual(genes[2].in_layer, "B")
+
 #tests that layer genes read and mutate properly
 class testLayer(unittest.TestCase):
 
@@ -319,6 +415,23 @@ class testBuild(unittest.TestCase):
         ident = dgeann.network_ident()
         self.assertEqual(ident, "T125-659-499")
 
+    def test_net_ident_collision(self):
+        dgeann.random.seed("genetic")
+        taken = os.path.join("Gen files", dgeann.network_ident() + ".gen")
+        layer_a = lg(5, False, False, 0, "INa", [], 5, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa"], 5, "IP")
+        genome = dgeann.Genome([layer_a, layer_u], [layer_a, layer_u], [], [])
+        with open(taken, "w") as f:
+            f.write("taken")
+        try:
+            dgeann.random.seed("genetic")
+            genome.build()
+            self.assertNotEqual(genome.ident + ".gen", os.path.basename(taken))
+            with open(taken) as f:
+                self.assertEqual(f.read(), "taken")
+        finally:
+            os.remove(taken)
+
     def test_layers_equalize_simple(self):
         self.l_unread_a.inputs = []
         self.l_unread_a.layer_type = 'input'
@@ -522,6 +635,38 @@ class testBuild(unittest.TestCase):
         self.assertEqual(g6.layerchr_a[2].inputs, ["G"])
         self.assertEqual(g6_layout[2].inputs, ["G"])
 
+    def test_dead_layers(self):
+        layers = [lg(5, False, False, 0, "in", [], 1, "input"),
+                  lg(5, False, False, 0, "a", ["in"], 2, "IP"),
+                  lg(5, False, False, 0, "b", ["a"], 2, "IP"),
+                  lg(5, False, False, 0, "c", ["in"], 1, "IP"),
+                  lg(5, False, False, 0, "out", ["c"], 1, "IP")]
+        weights = [wg(5, False, False, 0, "ia0", 1.0, 0, 0, "in", "a"),
+                   wg(5, False, False, 0, "ia1", 1.0, 0, 1, "in", "a"),
+                   wg(5, False, False, 0, "ab0", 1.0, 0, 0, "a", "b"),
+                   wg(5, False, False, 0, "ic0", 2.0, 0, 0, "in", "c"),
+                   wg(5, False, False, 0, "co0", 3.0, 0, 0, "c", "out")]
+        genome = dgeann.Genome(list(layers), list(layers), weights, weights,
+                               ["out"])
+        sub_dict, active_list, layout = genome.express_layout({})
+        #the a -> b chain is gone, not just b
+        self.assertEqual([g.ident for g in layout], ["in", "c", "out"])
+        self.assertEqual(active_list, {"in": 1, "c": 1, "out": 1})
+        self.assertEqual(dgeann.live_layers(layers, ["b"]), {"in", "a", "b"})
+        #and the weights into it are not read
+        genome = dgeann.Genome(list(layers), list(layers), weights, weights,
+                               ["out"])
+        net = genome.build_numpy()
+        self.assertEqual(sorted(net.params), ["c", "out"])
+        self.assertEqual(net.forward(**{"in": [1.0]})["out"].tolist(), [[6.0]])
+        #if no output is in the layout, nothing is cleared out
+        genome = dgeann.Genome(list(layers), list(layers), weights, weights,
+                               ["gone"])
+        sub_dict, active_list, layout = genome.express_layout({})
+        self.assertEqual([g.ident for g in layout],
+                         ["in", "a", "b", "c", "out"])
+        self.assertEqual(len(active_list), 5)
+
     def test_build_layers_text(self):
         askl = lg(1, False, False, 0, "askl", [], 3, "input")
         IPG = lg(5, False, False, 0, "G", ["askl"], 2, "IP")
@@ -775,7 +920,47 @@ class testBuild(unittest.TestCase):
         for i in range(len(results)):
             self.assertEqual(cwa[i].alt_in, results[i])
             self.assertEqual(cwb[i].alt_in, results[i])
+        self.assertEqual(dgeann.concat_offsets(concat_dict2),
+                         {("INi", "IPu"): 5, ("INi", "IPo"): 5,
+                          ("INe", "IPu"): 10, ("INe", "IPo"): 10})
+        #and with WeightChromosomes
+        chro = dgeann.WeightChromosome(weight_list2)
+        chro.alt_in[:] = chro.in_node
+        concat_genome3 = dgeann.Genome([], [], chro, [])
+        concat_genome3.concat_adjust(concat_dict2)
+        self.assertEqual(list(chro.alt_in), [0, 0, 5, 5, 10, 10])
         
+    def test_shared_concats(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 1, "input")
+        layer_b = lg(5, False, False, 0, "INb", [], 1, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INb"], 1, "IP")
+        layer_v = lg(5, False, False, 0, "IPv", ["INb", "INa"], 1, "IP")
+        layers = [layer_a, layer_b, layer_u, layer_v]
+        weights = [wg(5, False, False, 0, "au", 1.0, 0, 0, "INa", "IPu"),
+                   wg(5, False, False, 0, "bu", 2.0, 0, 0, "INb", "IPu"),
+                   wg(5, False, False, 0, "bv", 4.0, 0, 0, "INb", "IPv"),
+                   wg(5, False, False, 0, "av", 3.0, 0, 0, "INa", "IPv")]
+        concat_dict = {}
+        active_list = {"INa": 1, "INb": 1}
+        text = layer_u.read_out(concat_dict, active_list)
+        self.assertEqual(text.count("Concat"), 1)
+        text = layer_v.read_out(concat_dict, active_list)
+        #the second layer uses the first one's concat
+        self.assertEqual(text.count("Concat"), 0)
+        self.assertEqual(len(concat_dict), 1)
+        key = list(concat_dict)[0]
+        self.assertEqual(concat_dict[key], [["INa", "INb"], [1, 1],
+                                            ["IPu", "IPv"]])
+        self.assertTrue('bottom: "' + key + '"' in text)
+        self.assertEqual(layer_v.inputs, ["INb", "INa"])
+        genome = dgeann.Genome(list(layers), list(layers), weights, weights)
+        net = genome.build_numpy()
+        self.assertEqual([kind for kind, bottoms, top in net.layers],
+                         ["concat", "IP", "IP"])
+        out = net.forward(INa=[1.0], INb=[10.0])
+        self.assertEqual(out["IPu"].tolist(), [[21.0]])
+        self.assertEqual(out["IPv"].tolist(), [[43.0]])
+
     def test_build_weights(self):
         act = lg(5, False, False, 0, "action", ["data"], 5, "IP")
         gen = dgeann.Genome([self.data, act], [self.data, act], [], [])
@@ -848,6 +1033,29 @@ class testBuild(unittest.TestCase):
         genome_l.build_weights(active_list, net, {})
         self.assertAlmostEqual(data[0][0], 3.00)
    
+    def test_weight_buffer(self):
+        class Blob(object):
+            def __init__(self, data):
+                self.data = data
+        class Net(object):
+            params = {"action": [Blob(dgeann.numpy.zeros((3, 4)))],
+                      "other": [Blob(dgeann.numpy.zeros((2, 2)))]}
+        net = Net()
+        buf = dgeann.WeightBuffer(net)
+        dgeann.Genome.adjust_weight(buf, ["data", 1, "action", 2, 1.5])
+        dgeann.Genome.adjust_weight(buf, ["data", 3, "action", 0, 2.5,
+                                          "x", 1, "other", 1, -1.0])
+        #a later change to the same weight replaces an earlier one
+        dgeann.Genome.adjust_weight(buf, ["data", 1, "action", 2, 4.0])
+        self.assertEqual(net.params["action"][0].data[2][1], 0.0)
+        buf.flush()
+        data = net.params["action"][0].data
+        self.assertEqual(data[2][1], 4.0)
+        self.assertEqual(data[0][3], 2.5)
+        self.assertEqual(data.sum(), 6.5)
+        self.assertEqual(net.params["other"][0].data[1][1], -1.0)
+        self.assertEqual(buf.changes, {})
+
     def test_build(self):
         dgeann.random.seed("genetics")
         solv = self.test_genome_a.build(delete=False)
@@ -881,6 +1089,320 @@ class testBuild(unittest.TestCase):
         self.assertAlmostEqual(data_o[0][0], 3.00)
         self.assertAlmostEqual(data_o[0][5], 5.00)
 
+    def test_build_columnar(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 5, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 5, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 5, "IP")
+        layer_list = [layer_a, layer_i, layer_u]
+        weight_a = dgeann.WeightChromosome([
+            wg(5, False, False, 0, "au00", 3.00, 0, 0, "INa", "IPu"),
+            wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu")])
+        weight_b = dgeann.WeightChromosome([
+            wg(5, False, False, 0, "au00", 1.00, 0, 0, "INa", "IPu"),
+            wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu")])
+        genome = dgeann.Genome(layer_list, layer_list, weight_a, weight_b)
+        solv = genome.build()
+        data_u = solv.net.params['IPu'][0].data
+        self.assertAlmostEqual(data_u[0][0], 2.00)
+        self.assertAlmostEqual(data_u[0][5], 5.00)
+        self.assertEqual(list(weight_a.alt_in), [0, 5])
+
+    def test_build_in_memory(self):
+        dgeann.random.seed("genetics")
+        layer_a = lg(5, False, False, 0, "INa", [], 5, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 5, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 5, "IP")
+        weight_list = [wg(5, False, False, 0, "au00", 3.00, 0, 0, "INa", "IPu"),
+                       wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu")]
+        genome = dgeann.Genome([layer_a, layer_i, layer_u],
+                               [layer_a, layer_i, layer_u],
+                               weight_list, weight_list)
+        solv = genome.build(in_memory=True)
+        data_u = solv.net.params['IPu'][0].data
+        self.assertAlmostEqual(data_u[0][0], 3.00)
+        self.assertAlmostEqual(data_u[0][5], 5.00)
+        self.assertFalse(os.path.exists(os.path.join('Gen files',
+                                                     genome.ident + '.gen')))
+        self.assertFalse(os.path.exists("temp_solver.txt"))
+
+    def test_build_numpy(self):
+        dgeann.random.seed("genetics")
+        layer_a = lg(5, False, False, 0, "INa", [], 2, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 1, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 2, "IP")
+        layer_o = lg(5, False, False, 0, "IPo", ["IPu"], 1, "IP")
+        layers = [layer_a, layer_i, layer_u, layer_o]
+        weight_list = [wg(5, False, False, 0, "au00", 1.00, 0, 0, "INa", "IPu"),
+                       wg(5, False, False, 0, "au01", 2.00, 0, 1, "INa", "IPu"),
+                       wg(5, False, False, 0, "au10", 3.00, 1, 0, "INa", "IPu"),
+                       wg(5, False, False, 0, "au11", 4.00, 1, 1, "INa", "IPu"),
+                       wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu"),
+                       wg(5, False, False, 0, "iu01", 6.00, 0, 1, "INi", "IPu"),
+                       wg(5, False, False, 0, "uo00", 1.00, 0, 0, "IPu", "IPo"),
+                       wg(5, False, False, 0, "uo10", -1.0, 1, 0, "IPu", "IPo")]
+        genome = dgeann.Genome(list(layers), list(layers), weight_list,
+                               weight_list)
+        net = genome.build_numpy()
+        solver = dgeann.Genome(list(layers), list(layers), weight_list,
+                               weight_list).build(in_memory=True)
+        #same names and weights as the Caffe network
+        self.assertEqual(set(net.params), set(solver.net.params))
+        self.assertEqual(len(net._layer_names), len(solver.net._layer_names))
+        for key in net.params:
+            self.assertTrue(dgeann.numpy.array_equal(
+                net.params[key][0].data, solver.net.params[key][0].data))
+        self.assertEqual(net.outputs, ["IPo"])
+        out = net.forward(INa=[1.0, 2.0], INi=[3.0])
+        #IPu = [1*1 + 2*3 + 3*5, 1*2 + 2*4 + 3*6] = [22, 28]; IPo = 22 - 28
+        self.assertEqual(out["IPo"].tolist(), [[-6.0]])
+        self.assertEqual(net.blobs["IPu"].data.tolist(), [[22.0, 28.0]])
+        #a batch at once
+        out = net.forward(INa=[[1.0, 2.0], [0.0, 0.0]], INi=[[3.0], [1.0]])
+        self.assertEqual(out["IPo"].tolist(), [[-6.0], [-1.0]])
+        #random weights become weight genes, as with build
+        genome = dgeann.Genome(list(layers), list(layers), [], [])
+        net = genome.build_numpy()
+        self.assertEqual(len(genome.weightchr_a), 8)
+        self.assertAlmostEqual(genome.weightchr_a[0].weight,
+                               net.params["IPu"][0].data[0][0])
+
+    def test_build_blocks(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 2, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa"], 3, "IP")
+        layers = [layer_a, layer_u]
+        block = dgeann.WeightBlockGene
+        weights_a = [block(5, False, False, 0, "b0", [1.0, 2.0, 3.0], 0, 0,
+                           "INa", "IPu"),
+                     block(1, False, False, 0, "b1", [4.0, 5.0], 1, 1,
+                           "INa", "IPu")]
+        weights_b = [block(1, False, False, 0, "b0", [9.0, 9.0], 0, 0,
+                           "INa", "IPu"),
+                     block(5, False, False, 0, "b1", [7.0, 8.0], 1, 1,
+                           "INa", "IPu")]
+        genome = dgeann.Genome(list(layers), list(layers), weights_a,
+                               weights_b)
+        net = genome.build_numpy()
+        self.assertEqual(net.params["IPu"][0].data[:, 0].tolist(),
+                         [1.0, 2.0, 3.0])
+        self.assertEqual(net.params["IPu"][0].data[1:, 1].tolist(),
+                         [7.0, 8.0])
+        #random weights make one block per input node
+        dgeann.block_weights = True
+        try:
+            genome = dgeann.Genome(list(layers), list(layers), [], [])
+            net = genome.build_numpy()
+        finally:
+            dgeann.block_weights = False
+        self.assertEqual(len(genome.weightchr_a), 2)
+        self.assertEqual(len(genome.weightchr_b), 2)
+        for i, g in enumerate(genome.weightchr_a):
+            self.assertTrue(isinstance(g, block))
+            self.assertEqual((g.in_node, g.out_node), (i, 0))
+            self.assertEqual(g.ident, genome.weightchr_b[i].ident)
+            self.assertEqual(g.weight.tolist(),
+                             net.params["IPu"][0].data[:, i].tolist())
+
+    def test_swap_weights(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 2, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa"], 2, "IP")
+        layers = [layer_a, layer_u]
+        weights_a = [wg(5, True, False, 0, "au00", 1.00, 0, 0, "INa", "IPu"),
+                     wg(5, True, False, 0, "au01", 2.00, 0, 1, "INa", "IPu"),
+                     wg(5, True, False, 0, "au10", 3.00, 1, 0, "INa", "IPu"),
+                     wg(1, True, False, 0, "au11", 4.00, 1, 1, "INa", "IPu")]
+        weights_b = [dgeann.copy_gene(g) for g in weights_a]
+        genome = dgeann.Genome(list(layers), list(layers), weights_a,
+                               weights_b)
+        with self.assertRaises(ValueError):
+            genome.swap_weights(None)
+        solver = genome.build(in_memory=True)
+        data = solver.net.params["IPu"][0].data
+        genome.handle_mutation("Weight, 1.5", weights_a[0], "a")
+        genome.handle_mutation("Dom, 4", weights_b[3], "b")
+        genome.handle_mutation("Rate, 0.5", weights_a[1], "a")
+        self.assertEqual(genome.swap_weights(solver.net), 2)
+        #same weights as a new build
+        self.assertEqual(data.tolist(), [[1.75, 3.0], [2.0, 4.0]])
+        self.assertEqual(data.tolist(),
+                         genome.build_numpy().params["IPu"][0].data.tolist())
+        #a weight-gene diff also works
+        weights_b[1].weight = 6.0
+        self.assertEqual(genome.swap_weights(solver.net, ["au01"]), 1)
+        self.assertEqual(data[1][0], 4.0)
+        #each swap only reads the mutations since the last one
+        self.assertEqual(genome.swap_weights(solver.net), 0)
+        #structural mutations need a full build
+        genome.mut_record.append(["a", "IPu", "Nodes, +1"])
+        with self.assertRaises(ValueError):
+            genome.swap_weights(solver.net)
+        #but not ones made before it (as when the genome was born)
+        genome.mut_record.append(["b", "au00", "Dup"])
+        solver = genome.build(in_memory=True)
+        data = solver.net.params["IPu"][0].data
+        genome.handle_mutation("Weight, 0.5", weights_b[0], "b")
+        self.assertEqual(genome.swap_weights(solver.net), 1)
+        self.assertEqual(data[0][0], 2.0)
+
+    def test_express(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 2, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa"], 2, "IP")
+        layers = [layer_a, layer_u]
+        weights_a = [wg(5, True, False, 0, "au00", 1.00, 0, 0, "INa", "IPu"),
+                     wg(5, True, False, 0, "au01", 2.00, 0, 1, "INa", "IPu"),
+                     wg(5, True, False, 0, "au10", 3.00, 1, 0, "INa", "IPu"),
+                     wg(1, True, False, 0, "au11", 4.00, 1, 1, "INa", "IPu")]
+        weights_b = [dgeann.copy_gene(g) for g in weights_a]
+        weights_b[0].weight = 2.0
+        genome = dgeann.Genome(list(layers), list(layers), weights_a,
+                               weights_b)
+        expressed = genome.express()
+        self.assertEqual([g.ident for g in expressed.layout], ["INa", "IPu"])
+        self.assertEqual(expressed.active_list, {"INa": 2, "IPu": 2})
+        self.assertEqual(expressed.weights["IPu"].tolist(),
+                         [[1.5, 3.0], [2.0, 4.0]])
+        #kept until a mutation
+        self.assertTrue(genome.express() is expressed)
+        #and used by builds
+        solver = genome.build(in_memory=True)
+        self.assertEqual(solver.net.params["IPu"][0].data.tolist(),
+                         [[1.5, 3.0], [2.0, 4.0]])
+        net = genome.build_numpy()
+        self.assertEqual(net.params["IPu"][0].data.tolist(),
+                         [[1.5, 3.0], [2.0, 4.0]])
+        self.assertEqual(net.layout_key, expressed.key)
+        self.assertFalse(net.params["IPu"][0].data is expressed.weights["IPu"])
+        genome.handle_mutation("Weight, 1.0", weights_a[1], "a")
+        self.assertTrue(genome.phenotype is None)
+        self.assertEqual(genome.express().weights["IPu"].tolist(),
+                         [[1.5, 3.0], [2.5, 4.0]])
+
+    def test_population_net(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 2, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 1, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 3, "IP")
+        layer_o = lg(5, False, False, 0, "IPo", ["IPu"], 2, "IP")
+        layer_p = lg(5, False, False, 0, "IPp", ["INa"], 2, "IP")
+        big = [layer_a, layer_i, layer_u, layer_o]
+        small = [layer_a, layer_p]
+        genomes = []
+        for layers in [big, small, big, big, small]:
+            genomes.append(dgeann.Genome(list(layers), list(layers), [], []))
+        pop = dgeann.PopulationNet.from_genomes(genomes)
+        self.assertEqual(sorted(len(g) for g in pop.groups.values()), [2, 3])
+        ins_a = [[1.0, 2.0], [0.5, -1.0], [3.0, 0.0], [0.0, 1.0], [2.0, 2.0]]
+        ins_i = [[1.0], [0.0], [-2.0], [4.0], [1.0]]
+        results = pop.forward(INa=ins_a, INi=ins_i)
+        #same as running each net on its own
+        for k, net in enumerate(pop.nets):
+            if "INi" in net.blobs:
+                one = net.forward(INa=ins_a[k], INi=ins_i[k])
+            else:
+                one = net.forward(INa=ins_a[k])
+            self.assertEqual(set(results[k]), set(one))
+            for name in one:
+                self.assertTrue(dgeann.numpy.allclose(results[k][name],
+                                                      one[name], atol=1e-5))
+        #weights changed after stacking are picked up by refresh
+        pop.nets[1].params["IPp"][0].data[...] = 0
+        pop.nets[1].params["IPp"][1].data[...] = 1
+        pop.refresh()
+        results = pop.forward(INa=ins_a, INi=ins_i)
+        self.assertEqual(results[1]["IPp"].tolist(), [[1.0, 1.0]])
+
+    def test_profiling(self):
+        dgeann.random.seed("genetics")
+        layer_a = lg(5, False, False, 0, "INa", [], 5, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 5, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 5, "IP")
+        weight_list = [wg(5, False, False, 0, "au00", 3.00, 0, 0, "INa", "IPu"),
+                       wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu")]
+        genome = dgeann.Genome([layer_a, layer_i, layer_u],
+                               [layer_a, layer_i, layer_u],
+                               weight_list, weight_list)
+        #nothing is recorded unless toggled
+        genome.build(in_memory=True)
+        self.assertEqual(genome.profile, None)
+        dgeann.profiling = True
+        try:
+            genome.build(in_memory=True)
+            child = genome.recombine(genome)
+            child.build()
+        finally:
+            dgeann.profiling = False
+        stages = genome.profile.summary()
+        self.assertEqual(set(stages), {"build", "net_text", "structure_network",
+                                       "solver", "build_weights"})
+        self.assertEqual(stages["build"]["calls"], 1)
+        self.assertEqual(stages["build_weights"]["genes"], 4)
+        self.assertEqual(stages["build_weights"]["bytes"], 8)
+        self.assertTrue(stages["build"]["seconds"] >=
+                        stages["solver"]["seconds"])
+        #the child's profile covers how it was made as well as its build
+        stages = child.profile.summary()
+        self.assertEqual(stages["crossover"]["calls"], 2)
+        self.assertEqual(stages["crossover"]["genes"], 20)
+        self.assertEqual(stages["cross_weights"]["calls"], 2)
+        for name in ["recombine", "mutate", "build", "build_weights"]:
+            self.assertEqual(stages[name]["calls"], 1)
+        self.assertEqual(dgeann.json.loads(child.profile.to_json()), stages)
+        total = dgeann.population_profile([genome, child, genome])
+        self.assertEqual(total.stages["build"]["calls"], 3)
+        self.assertEqual(total.stages["recombine"]["calls"], 1)
+
+    def test_template_cache(self):
+        layer_a = lg(5, False, False, 0, "INa", [], 5, "input")
+        layer_i = lg(5, False, False, 0, "INi", [], 5, "input")
+        layer_u = lg(5, False, False, 0, "IPu", ["INa", "INi"], 5, "IP")
+        weights_a = [wg(5, False, False, 0, "au00", 3.00, 0, 0, "INa", "IPu"),
+                     wg(5, False, False, 0, "iu00", 5.00, 0, 0, "INi", "IPu")]
+        weights_b = [wg(5, False, False, 0, "au00", 1.00, 0, 0, "INa", "IPu"),
+                     wg(5, False, False, 0, "iu00", 2.00, 0, 0, "INi", "IPu")]
+        layers = [layer_a, layer_i, layer_u]
+        dgeann.template_cache = dgeann.TemplateCache()
+        try:
+            gen_a = dgeann.Genome(list(layers), list(layers), weights_a,
+                                  weights_a)
+            gen_b = dgeann.Genome(list(layers), list(layers), weights_b,
+                                  weights_b)
+            solv_a = gen_a.build()
+            solv_b = gen_b.build()
+            self.assertEqual(gen_a.layout_key, gen_b.layout_key)
+            self.assertEqual(dgeann.template_cache.misses, 1)
+            self.assertEqual(dgeann.template_cache.hits, 1)
+            self.assertIsNot(solv_a, solv_b)
+            self.assertAlmostEqual(solv_b.net.params['IPu'][0].data[0][0],
+                                   1.00)
+            self.assertAlmostEqual(solv_b.net.params['IPu'][0].data[0][5],
+                                   2.00)
+            #released solvers are reused, with the new genome's weights,
+            #and without the training history of the last one
+            solv_a.step(1)
+            dgeann.template_cache.release(solv_a)
+            gen_c = dgeann.Genome(list(layers), list(layers), weights_b,
+                                  weights_b)
+            solv_c = gen_c.build()
+            self.assertIs(solv_c, solv_a)
+            self.assertEqual(solv_c.iter, 0)
+            self.assertAlmostEqual(solv_c.net.params['IPu'][0].data[0][0],
+                                   1.00)
+            self.assertAlmostEqual(solv_c.net.params['IPu'][0].data[0][5],
+                                   2.00)
+            #a different structure gets its own template
+            layer_u2 = lg(5, False, False, 0, "IPu", ["INa", "INi"], 4, "IP")
+            gen_d = dgeann.Genome([layer_a, layer_i, layer_u2],
+                                  [layer_a, layer_i, layer_u2],
+                                  weights_a, weights_a)
+            gen_d.build()
+            self.assertNotEqual(gen_d.layout_key, gen_a.layout_key)
+            self.assertEqual(dgeann.template_cache.misses, 2)
+            state_dir = dgeann.template_cache.state_dir
+            #a snapshot (two files) for each of the three solvers made
+            self.assertEqual(len(os.listdir(state_dir)), 6)
+            dgeann.template_cache.clear()
+            self.assertFalse(os.path.exists(state_dir))
+        finally:
+            dgeann.template_cache = None
+
     def test_build_subs(self):
         #test that subbing layers works correctly
         test_subs = dgeann.Genome([lg(1, False, False, 0, "A", [], 2, "input"),
@@ -941,6 +1463,31 @@ class testRandGenes(unittest.TestCase):
                 i = 0
                 j += 1
 
+    def test_create_rweights_columnar(self):
+        lay = [lg(1, False, False, 0, "a", [], 3, "input"),
+               lg(1, False, False, 0, "h", ["a"], 2, "IP")]
+        genome = dgeann.Genome(lay, lay, [], [])
+        net = genome.build().net
+        d = net.params["h"][0].data
+        genome.weightchr_a = dgeann.WeightChromosome()
+        genome.weightchr_b = []
+        off = genome.create_rweights("a", d, "h", net, 0)
+        self.assertEqual(off, 3)
+        self.assertEqual(len(genome.weightchr_a), 6)
+        #same genes (and IDs) in the same order on both kinds of chromosome
+        self.assertEqual([(g.ident, g.weight, g.in_node, g.out_node,
+                           g.alt_in, g.in_layer, g.out_layer)
+                          for g in genome.weightchr_a],
+                         [(g.ident, g.weight, g.in_node, g.out_node,
+                           g.alt_in, g.in_layer, g.out_layer)
+                          for g in genome.weightchr_b])
+        self.assertEqual([(g.in_node, g.out_node) for g in genome.weightchr_b],
+                         [(0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 1)])
+        for g in genome.weightchr_a:
+            self.assertTrue(1 <= g.dom <= 5)
+            self.assertTrue(g.can_mut)
+            self.assertEqual(g.mut_rate, dgeann.def_mut_rate)
+
     def test_concat_rweights(self):
         #concats case
         layers = [lg(1, False, False, 0, "i", [], 1, "input"),
@@ -980,6 +1527,92 @@ class testMutation(unittest.TestCase):
         ident = dgeann.gene_ident()
         self.assertEqual(ident, "QXLPYG")
 
+    def test_fast_idents(self):
+        alloc = dgeann.IdentAllocator(block=3)
+        ids = alloc.take(5)
+        self.assertEqual(len(set(ids.tolist())), 5)
+        self.assertEqual(list(alloc.render([0, 1, 26, 2**64 - 1])),
+                         ["A" * 14, "A" * 13 + "B", "A" * 12 + "BA",
+                          "HLHXCZMXSYUMQP"])
+        idents = [alloc.next_ident() for i in range(7)]
+        self.assertEqual(len(set(idents)), 7)
+        #the namespace is the run number over the process ID
+        pid = dgeann.os.getpid() % 2**22
+        self.assertEqual(ids[0] >> 32, pid)
+        dgeann.ident_run = 5
+        try:
+            other = alloc.take(2)
+        finally:
+            dgeann.ident_run = 0
+        self.assertEqual(other[0] >> 32, (5 << 22) | pid)
+        self.assertEqual(other[0] & (2**32 - 1), 0)
+        #going back to a run carries on from where it was
+        later = alloc.take(1)
+        self.assertEqual(later[0] >> 32, pid)
+        self.assertTrue(later[0] > max(ids))
+        both = dgeann.numpy.concatenate([ids, other, later])
+        idents.extend(alloc.render(both))
+        self.assertEqual(len(set(idents)), len(idents))
+        dgeann.ident_run = 1024
+        try:
+            self.assertRaises(ValueError, dgeann.IdentAllocator().take, 1)
+        finally:
+            dgeann.ident_run = 0
+        state = dgeann.random.getstate()
+        dgeann.fast_idents = True
+        try:
+            gene = dgeann.gene_ident()
+            net = dgeann.network_ident()
+        finally:
+            dgeann.fast_idents = False
+        self.assertEqual(len(gene), 14)
+        self.assertEqual(len(net), 17)
+        self.assertTrue(net.startswith("T"))
+        #fast IDs take nothing from random
+        self.assertEqual(dgeann.random.getstate(), state)
+
+    def test_reused_pid(self):
+        old_allocator = dgeann.ident_allocator
+        old_reserved = dgeann.ident_reserved
+        path = os.path.join("Gen files", "test_reused_pid.dgn")
+        arc_path = os.path.join("Gen files", "test_reused_pid.arc")
+        dgeann.fast_idents = True
+        try:
+            #a run saves genomes with fast IDs...
+            dgeann.ident_allocator = dgeann.IdentAllocator(block=4)
+            dgeann.ident_reserved = {}
+            lay_a = lg(3, True, False, .01, "IPa", [], 2, "IP")
+            lay_b = lg(3, True, False, .01, "IPb", ["IPa"], 2, "IP")
+            weights = [wg(3, True, False, .01, dgeann.gene_ident(), 1.0,
+                          i, 0, "IPa", "IPb") for i in range(6)]
+            genome = dgeann.Genome([lay_a, lay_b], [lay_a, lay_b],
+                                   weights[:3], weights[3:])
+            genome.save(path)
+            archive = dgeann.LineageArchive()
+            archive.add(genome)
+            archive.save(arc_path)
+            saved = set(gene.ident for gene in weights)
+            #...and a later run gets the same process ID, so the same IDs
+            dgeann.ident_allocator = dgeann.IdentAllocator(block=4)
+            dgeann.ident_reserved = {}
+            self.assertTrue(dgeann.gene_ident() in saved)
+            #unless it has loaded them first
+            for load, where in [(dgeann.Genome.load, path),
+                                (dgeann.LineageArchive.load, arc_path)]:
+                dgeann.ident_allocator = dgeann.IdentAllocator(block=4)
+                dgeann.ident_reserved = {}
+                load(where)
+                new = dgeann.gene_idents(5) + [dgeann.gene_ident()]
+                self.assertEqual(saved & set(new), set())
+            self.assertTrue("ident_reserved" in dgeann.current_settings())
+        finally:
+            dgeann.fast_idents = False
+            dgeann.ident_allocator = old_allocator
+            dgeann.ident_reserved = old_reserved
+            for name in [path, arc_path]:
+                if os.path.exists(name):
+                    os.remove(name)
+
     def test_new_input(self):
         test_layer_b = lg(4, True, True, .01, "INa", [], 5, "IP")
         test_dup_layer = lg(4, True, True, .01, "ABCDEF", [], 5, "IP")
@@ -1055,6 +1688,54 @@ class testMutation(unittest.TestCase):
                     n = 0
                     m += 1
 
+    def test_dup_weights_blocks(self):
+        test_in = lg(4, False, False, 0, "IN", [], 2, "data")
+        test_dup_layer = lg(4, True, True, .01, "ABCDEF", ["IN"], 3, "IP")
+        test_out = lg(4, False, False, 0, "OUT", ["ABCDEF"], 2, "IP")
+        block = dgeann.WeightBlockGene
+        weights = [block(5, True, False, .01, "a" + str(i), [1.0] * 3, i, 0,
+                         "IN", "ABCDEF") for i in range(2)]
+        weights += [block(5, True, False, .01, "o" + str(i), [1.0] * 2, i, 0,
+                          "ABCDEF", "OUT") for i in range(3)]
+        test_genome = dgeann.Genome([test_in, test_dup_layer, test_out], [],
+                                    list(weights), [])
+        #a duplicated layer gets blocks if its weights are blocks
+        test_genome.handle_duplication(test_dup_layer,
+                                       test_genome.layerchr_a)
+        new = test_genome.weightchr_a[5:]
+        self.assertEqual(len(new), 5)
+        self.assertTrue(all(isinstance(g, block) for g in new))
+        self.assertEqual([(g.in_node, g.out_node) for g in new],
+                         [(0, 0), (1, 0), (0, 0), (1, 0), (2, 0)])
+        self.assertEqual([len(g.weight) for g in new[:2]], [3, 3])
+        self.assertEqual(new[0].out_layer, new[2].in_layer)
+        #or if block_weights is on
+        test_genome = dgeann.Genome([test_in, test_dup_layer, test_out], [],
+                                    [], [])
+        dgeann.block_weights = True
+        try:
+            test_genome.dup_weights(test_dup_layer, test_out,
+                                    test_genome.layerchr_a)
+        finally:
+            dgeann.block_weights = False
+        self.assertEqual(len(test_genome.weightchr_a), 5)
+        self.assertTrue(all(isinstance(g, block)
+                            for g in test_genome.weightchr_a))
+        #WeightChromosomes cannot hold blocks
+        plain = [wg(5, True, False, .01, "w" + str(i), 1.0, i // 3, i % 3,
+                    "IN", "ABCDEF") for i in range(6)]
+        columnar = dgeann.Genome([test_in, test_dup_layer, test_out], [],
+                                 dgeann.WeightChromosome(plain), [])
+        dgeann.block_weights = True
+        try:
+            self.assertRaises(ValueError, columnar.dup_weights,
+                              test_dup_layer, test_out, columnar.layerchr_a)
+            self.assertRaises(ValueError, columnar.add_nodes, test_dup_layer,
+                              columnar.layerchr_a, 1, columnar.weightchr_a, 2)
+        finally:
+            dgeann.block_weights = False
+        self.assertEqual(len(columnar.weightchr_a), 6)
+
     def test_handle_duplication(self):
         test_input = lg(4, False, False, 0, "d", [], 1, "data")
         test_layer_b = lg(4, True, True, .01, "INa", ["d"], 5, "IP")
@@ -1101,6 +1782,67 @@ class testMutation(unittest.TestCase):
         out = test_genome2.find_outputs(test_gene, test_genome2.layerchr_a)
         self.assertEqual(out, [out1, out2, out3])
 
+    def test_layer_graph(self):
+        test_in = lg(5, False, False, 0, "d", [], 1, "data")
+        test_gene = lg(5, True, True, .017, "tester", ["d"], 5, "IP")
+        conc = lg(5, False, False, 0, "con", ["tester", "d"], None, "concat")
+        out1 = lg(5, True, True, .017, "out1", ["con"], 3, "IP")
+        out2 = lg(5, True, True, .017, "out2", ["tester"], 2, "IP")
+        genome = dgeann.Genome([test_in, test_gene, conc, out1, out2], [],
+                               [], [])
+        chro = genome.layerchr_a
+        graph = genome.layer_graph(chro)
+        self.assertTrue(genome.layer_graph(chro) is graph)
+        self.assertEqual(graph.locate(out1), 3)
+        self.assertEqual(graph.outputs(test_gene), [out1, out2])
+        self.assertEqual(graph.inputs(conc), (6, {"tester": 5, "d": 1}))
+        #node counts are read from the chromosome
+        test_gene.nodes = 7
+        self.assertEqual(graph.inputs(out2), (7, {"tester": 7}))
+        #inserting and adding inputs keep it up to date
+        new = lg(5, True, True, .017, "new", ["d"], 4, "IP")
+        graph.insert(1, new)
+        graph.add_input(out2, "new")
+        self.assertEqual([g.ident for g in chro],
+                         ["d", "new", "tester", "con", "out1", "out2"])
+        self.assertEqual(graph.locate(out2), 5)
+        self.assertEqual(graph.outputs(new), [out2])
+        self.assertEqual(graph.inputs(out2), (11, {"new": 4, "tester": 7}))
+        self.assertEqual(graph.inputs(conc, before=True)[0], 8)
+        self.assertTrue(genome.layer_graph(chro) is graph)
+        #changes made without it are noticed by length
+        chro.append(lg(5, True, True, .017, "out3", ["new"], 2, "IP"))
+        self.assertFalse(genome.layer_graph(chro) is graph)
+        self.assertEqual(len(genome.find_outputs(new, chro)), 2)
+
+    def test_layer_graph_duplicates(self):
+        #crossover can leave two layer genes with the same ident
+        test_in = lg(5, False, False, 0, "d", [], 1, "data")
+        x = lg(5, True, True, .017, "x", ["d"], 2, "IP")
+        lay_1 = lg(5, True, True, .017, "lay", ["d"], 3, "IP")
+        mid = lg(5, True, True, .017, "mid", ["lay"], 4, "IP")
+        lay_2 = lg(5, True, True, .017, "lay", ["x"], 5, "IP")
+        end = lg(5, True, True, .017, "end", ["lay"], 2, "IP")
+        genome = dgeann.Genome([test_in, x, lay_1, mid, lay_2, end], [],
+                               [], [])
+        chro = genome.layerchr_a
+        graph = genome.layer_graph(chro)
+        self.assertEqual(graph.locate(lay_1), 2)
+        self.assertEqual(graph.locate(lay_2), 4)
+        self.assertEqual(graph.inputs(lay_2, before=True), (2, {"x": 2}))
+        #each layer reads the latest "lay" before it
+        self.assertEqual(genome.find_n_inputs(mid, chro), (3, {"lay": 3}))
+        self.assertEqual(genome.find_n_inputs(end, chro), (5, {"lay": 5}))
+        self.assertEqual(graph.outputs(lay_1), [mid, end])
+        #duplicating the second one puts the copy before it, not the first
+        dgeann.random.seed("genetic")
+        genome.handle_duplication(lay_2, chro)
+        self.assertTrue(chro[2] is lay_1)
+        self.assertTrue(chro[5] is lay_2)
+        self.assertEqual(chro[4].inputs, ["x"])
+        self.assertTrue(chro[4].ident in end.inputs or
+                        chro[4].ident in lay_2.inputs)
+
     def test_add_nodes(self):
         test_in = lg(5, False, False, 0, "d", [], 1, "data")
         test_gene = lg(5, True, True, .01, "tester", ["d"], 5, "IP")
@@ -1136,6 +1878,65 @@ class testMutation(unittest.TestCase):
                 m = 0
                 n += 1
 
+    def test_add_nodes_blocks(self):
+        test_in = lg(5, False, False, 0, "d", [], 2, "data")
+        test_gene = lg(5, True, True, .01, "tester", ["d"], 3, "IP")
+        test_out = lg(5, False, False, 0, "o", ["tester"], 2, "IP")
+        block = dgeann.WeightBlockGene
+        weights = [block(5, True, False, .01, "d0", [1.0, 1.0, 1.0], 0, 0,
+                         "d", "tester"),
+                   block(5, True, False, .01, "d1", [1.0, 1.0, 1.0], 1, 0,
+                         "d", "tester")]
+        for i in range(3):
+            weights.append(block(5, True, False, .01, "t" + str(i), [2.0, 2.0],
+                                 i, 0, "tester", "o"))
+        test_genome = dgeann.Genome([test_in, test_gene, test_out], [],
+                                    weights, [])
+        n_in, d = test_genome.find_n_inputs(test_gene, test_genome.layerchr_a)
+        test_genome.add_nodes(test_gene, test_genome.layerchr_a, 2,
+                              test_genome.weightchr_a, n_in)
+        chro = test_genome.weightchr_a
+        #input blocks grow to cover the new nodes
+        self.assertEqual([len(g.weight) for g in chro[:2]], [5, 5])
+        self.assertEqual(chro[0].weight[:3].tolist(), [1.0, 1.0, 1.0])
+        #and each new node gets one output block
+        self.assertEqual(len(chro), 7)
+        self.assertEqual([(g.in_node, g.out_node) for g in chro[2:]],
+                         [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0)])
+        self.assertEqual([len(g.weight) for g in chro[5:]], [2, 2])
+        #block weight mutations change one weight
+        test_genome.handle_mutation("Weight, 1, 0.5", chro[2], "a", chro)
+        self.assertEqual(chro[2].weight.tolist(), [2.0, 2.5])
+
+    def test_add_nodes_columnar(self):
+        out1 = lg(5, True, True, .017, "out1", ["tester"], 5, "IP")
+        out2 = lg(5, True, True, .017, "out2", ["tester", "d"], 3, "IP")
+        test_gene = lg(5, True, True, .01, "tester", ["d"], 3, "IP")
+        test_in = lg(5, False, False, 0, "d", [], 1, "data")
+        weights = []
+        for i in range(3):
+            weights.append(wg(5, True, False, .01, str(i), 3, 0, i, "d",
+                              "tester"))
+        for out, n in [("out1", 5), ("out2", 3)]:
+            for i in range(3):
+                for j in range(n):
+                    weights.append(wg(5, True, False, .01, str(i), 3, i, j,
+                                      "tester", out))
+        #the batched splice gives the same genes, in the same places,
+        #for lists and WeightChromosomes
+        results = []
+        for chro in [list(weights), dgeann.WeightChromosome(weights)]:
+            dgeann.random.seed("nodes")
+            genome = dgeann.Genome([test_in, test_gene, out1, out2], [],
+                                   chro, [])
+            genome.add_nodes(test_gene, genome.layerchr_a, 2, chro, 1)
+            results.append([(g.ident, g.weight, g.in_node, g.out_node,
+                             g.in_layer, g.out_layer) for g in chro])
+        self.assertEqual(len(results[0]), 27 + 2 + 10 + 6)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([(g[2], g[3]) for g in results[0][:5]],
+                         [(0, 0), (0, 1), (0, 2), (0, 3), (0, 4)])
+
     def test_add_nodes_complicated(self):
         #more complicated version: 3 outputs on 2 concats, weights on both chrs
         out1 = lg(5, True, True, .017, "out1", ["tester"], 5, "IP")
@@ -1354,6 +2155,113 @@ class testMutation(unittest.TestCase):
         self.assertNotEqual(wgene_5.dom, 5)
         
 
+    def test_batch_mutate(self):
+        old_probs = dgeann.weight_mut_probs
+        dgeann.np_random = dgeann.numpy.random.default_rng(7)
+        try:
+            #everything mutates, all weight mutations
+            dgeann.weight_mut_probs = (1, 0, 0)
+            genes = [wg(5, True, False, 1.0, str(i), 3.00, i, 0, "A", "B")
+                     for i in range(20)]
+            frozen = wg(5, False, False, 1.0, "frozen", 3.00, 20, 0, "A", "B")
+            genes.append(frozen)
+            genome = dgeann.Genome([], [], genes, [])
+            genome.batch_mutate(genome.weightchr_a, "a")
+            self.assertEqual(len(genome.mut_record), 20)
+            for gene, rec in zip(genes, genome.mut_record):
+                self.assertNotEqual(gene.weight, 3.00)
+                self.assertEqual(rec[0], "a")
+                self.assertEqual(rec[1], gene.ident)
+                self.assertAlmostEqual(float(rec[2][8:]), gene.weight - 3.00)
+            self.assertEqual(frozen.weight, 3.00)
+            #dominance changes stay in bounds, on the array-backed chromosome
+            dgeann.weight_mut_probs = (0, 1, 0)
+            chro = dgeann.WeightChromosome(
+                [wg(d, True, False, 1.0, str(d), 3.00, d, 0, "A", "B")
+                 for d in [1, 5, 1, 5, 3, 3]])
+            genome = dgeann.Genome([], [], chro, [])
+            genome.batch_mutate(chro, "a")
+            self.assertTrue(((chro.dom >= 1) & (chro.dom <= 5)).all())
+            self.assertTrue((chro.dom != [1, 5, 1, 5, 3, 3]).all())
+            #rate changes keep rates within (0, 1]
+            dgeann.weight_mut_probs = (0, 0, 1)
+            genome.batch_mutate(chro, "a")
+            self.assertTrue(((chro.mut_rate > 0) &
+                             (chro.mut_rate <= 1)).all())
+            self.assertTrue((chro.mut_rate != 1.0).all())
+            self.assertEqual(genome.mut_record[-1][2][0:4], "Rate")
+            #nothing mutates with zero rates
+            chro.mut_rate[:] = 0.0
+            n = len(genome.mut_record)
+            dgeann.batch_mutation = True
+            genome.mutate()
+            self.assertEqual(len(genome.mut_record), n)
+        finally:
+            dgeann.batch_mutation = False
+            dgeann.weight_mut_probs = old_probs
+
+    def test_sparse_mutate(self):
+        dgeann.np_random = dgeann.numpy.random.default_rng(11)
+        #each gene mutates with odds of its own rate
+        rates = dgeann.numpy.full(200000, 0.01)
+        rates[::2] = 0.002
+        rates[::10] = -1.0
+        hits = dgeann.sparse_hits(rates)
+        self.assertTrue((dgeann.numpy.diff(hits) > 0).all())
+        self.assertTrue((rates[hits] > 0).all())
+        low = (rates[hits] == 0.002).sum()
+        high = (rates[hits] == 0.01).sum()
+        self.assertTrue(abs(low - 80000 * 0.002) < 60)
+        self.assertTrue(abs(high - 100000 * 0.01) < 150)
+        self.assertEqual(len(dgeann.sparse_hits(rates * 0 - 1)), 0)
+        self.assertEqual(dgeann.sparse_hits(dgeann.numpy.ones(5)).tolist(),
+                         [0, 1, 2, 3, 4])
+        old_probs = dgeann.weight_mut_probs
+        dgeann.weight_mut_probs = (1, 0, 0)
+        dgeann.sparse_mutation = True
+        try:
+            genes = [wg(5, True, False, 1.0, str(i), 3.00, i, 0, "A", "B")
+                     for i in range(10)]
+            genes[4].can_mut = False
+            layer = lg(5, False, False, 0, "A", [], 3, "input")
+            genome = dgeann.Genome([layer], [layer], genes,
+                                   dgeann.WeightChromosome(genes))
+            genome.mutate()
+            self.assertEqual(len(genome.mut_record), 18)
+            self.assertEqual([g.weight == 3.00 for g in genes],
+                             [i == 4 for i in range(10)])
+            self.assertTrue((genome.weightchr_b.weight != 3.00).sum() == 9)
+        finally:
+            dgeann.sparse_mutation = False
+            dgeann.weight_mut_probs = old_probs
+
+    def test_sparse_mutate_dup(self):
+        dgeann.random.seed("copies")
+        dgeann.np_random = dgeann.numpy.random.default_rng(5)
+        old_probs = dgeann.layer_mut_probs
+        #every layer mutation is a duplication
+        dgeann.layer_mut_probs = (0, 0, 0, 1, 0)
+        dups = {False: [], True: []}
+        try:
+            for sparse in [False, True]:
+                dgeann.sparse_mutation = sparse
+                for i in range(400):
+                    data = lg(5, False, False, 0, "data", [], 2, "input")
+                    a = lg(5, True, True, 0.5, "A", ["data"], 2, "IP")
+                    b = lg(5, False, False, 0, "B", ["A"], 2, "IP")
+                    genome = dgeann.Genome([data, a, b], [], [], [])
+                    genome.mutate()
+                    dups[sparse].append(len(genome.layerchr_a) - 3)
+        finally:
+            dgeann.sparse_mutation = False
+            dgeann.layer_mut_probs = old_probs
+        #a duplicated layer is rolled for again, so it is copied
+        #0.5 / (1 - 0.5) = 1 time on average, either way
+        mean = dict((k, sum(v) / 400.0) for k, v in dups.items())
+        self.assertTrue(abs(mean[False] - 1) < 0.25)
+        self.assertTrue(abs(mean[True] - 1) < 0.25)
+        self.assertTrue(max(dups[True]) > 1)
+
 #tests recombination and helper functions
 class testRecombination(unittest.TestCase):
 
@@ -1477,35 +2385,37 @@ class testRecombination(unittest.TestCase):
         self.assertEqual(cross_a.weightchr_a[3].weight, 7.00)
         self.assertEqual(cross_a.weightchr_b[3].weight, 5.00)
         #crossover at 1, 5
+        #both chromosomes have input -> u weights, but for different nodes,
+        #so each child keeps all of them once instead of dropping the extras
         cross_b = self.genome_b.crossover()
         self.assertEqual(len(cross_b.weightchr_b), 8)
-        self.assertEqual(len(cross_b.weightchr_a), 6)
-        self.assertEqual(cross_b.weightchr_a[5].ident, "io00")
+        self.assertEqual(len(cross_b.weightchr_a), 8)
+        self.assertEqual(cross_b.weightchr_a[5].ident, "ao01")
         self.assertEqual(cross_b.weightchr_b[5].ident, "ao01")
         #and other way around
         cross_c = self.genome_c.crossover()
         self.assertEqual(len(cross_c.weightchr_a), 8)
-        self.assertEqual(len(cross_c.weightchr_b), 6)
+        self.assertEqual(len(cross_c.weightchr_b), 8)
         cross_d = self.genome_d.crossover()
         self.assertEqual(len(cross_d.layerchr_b), 6)
         self.assertEqual(len(cross_d.layerchr_a), 5)
-        self.assertEqual(len(cross_d.weightchr_a), 6)
+        self.assertEqual(len(cross_d.weightchr_a), 8)
         self.assertEqual(len(cross_d.weightchr_b), 8)
         cross_e = self.genome_e.crossover()
         self.assertEqual(len(cross_e.layerchr_a), 6)
         self.assertEqual(len(cross_e.layerchr_b), 5)
-        self.assertEqual(len(cross_e.weightchr_b), 6)
+        self.assertEqual(len(cross_e.weightchr_b), 8)
         self.assertEqual(len(cross_e.weightchr_a), 8)
         #crossover at 2, 2
         cross_f = self.genome_f.crossover()
         self.assertEqual(cross_f.weightchr_b[5].ident, "iu01")
-        self.assertEqual(cross_f.weightchr_a[5].ident, "io00")
+        self.assertEqual(cross_f.weightchr_a[5].ident, "iu01")
         #crossover at 1, 4
         cross_g = self.genome_g.crossover()
         self.assertEqual(cross_g.weightchr_a[4].ident, "iu00")
         self.assertEqual(cross_g.weightchr_b[4].ident, "iu00")
         self.assertEqual(cross_g.weightchr_a[5].ident, "iu01")
-        self.assertEqual(cross_g.weightchr_b[5].ident, "io00")
+        self.assertEqual(cross_g.weightchr_b[5].ident, "iu01")
         cross_h = self.genome_h.crossover()
         self.assertEqual(len(cross_h.weightchr_a), 6)
         self.assertEqual(len(cross_h.weightchr_b), 8)
@@ -1545,8 +2455,10 @@ class testRecombination(unittest.TestCase):
         child_c = child.crossover()
         print(child_c.layerchr_a[0].nodes, child_c.layerchr_a[1].nodes,
               child_c.layerchr_b[0].nodes, child_c.layerchr_b[1].nodes, )
-        self.assertEqual(len(child_c.weightchr_a), 9)
-        self.assertEqual(len(child_c.weightchr_b), 9)
+        #every A -> B weight either parent has, once each
+        #(neither parent has a gene for the 2 -> 2 weight)
+        self.assertEqual(len(child_c.weightchr_a), 8)
+        self.assertEqual(len(child_c.weightchr_b), 8)
         #test case from actual data that caused bug
         dgeann.random.seed("genetic")
         data = lg(5, False, False, 0, "data", [], 12, "input")
@@ -1593,6 +2505,56 @@ class testRecombination(unittest.TestCase):
                 self.assertEqual(result.weightchr_a[i].out_node, k)
                 i += 1
         
+    def test_weight_index(self):
+        weights = self.genome_b.weightchr_a
+        for chro in [weights, dgeann.WeightChromosome(weights)]:
+            index = dgeann.WeightIndex(chro)
+            self.assertEqual(index.find("INa", "IPu", 0, 3), 3)
+            self.assertEqual(index.find("INa", "IPu", 0, 4), None)
+            self.assertEqual(index.rows[("INi", "IPo", 0)], 7)
+            self.assertEqual(index.segments[("INa", "IPu")], [0, 4])
+            self.assertEqual(index.segments[("INa", "IPo")], [4, 6])
+
+    def test_cross_weights_uneven(self):
+        #a layer resized on one chromosome only
+        xy_a = [wg(3, True, False, 0.1, "xy0", 1.0, 0, 0, "IPx", "IPy"),
+                wg(3, True, False, 0.1, "xy1", 1.0, 1, 0, "IPx", "IPy"),
+                wg(3, True, False, 0.1, "ay00", 1.0, 0, 0, "IPa", "IPy")]
+        xy_b = [wg(3, True, False, 0.1, "xy0", 2.0, 0, 0, "IPx", "IPy"),
+                wg(3, True, False, 0.1, "xy1", 2.0, 1, 0, "IPx", "IPy"),
+                wg(3, True, False, 0.1, "xy2", 2.0, 2, 0, "IPx", "IPy"),
+                wg(3, True, False, 0.1, "ay00", 2.0, 0, 0, "IPa", "IPy")]
+        #same layers, different weights between them
+        grid_a = []
+        grid_b = []
+        for i in range(3):
+            for j in range(2):
+                grid_a.append(wg(3, True, False, 0.1, str(i)+str(j), 1.0,
+                                 i, j, "A", "B"))
+        for i in range(2):
+            for j in range(3):
+                grid_b.append(wg(3, True, False, 0.1, str(i)+str(j), 2.0,
+                                 i, j, "A", "B"))
+        grid_idents = ["00", "01", "02", "10", "11", "12", "20", "21"]
+        cases = [(xy_a, xy_b, 3, ["xy0", "xy1", "xy2", "ay00"],
+                  [1.0, 1.0, 2.0, 1.0]),
+                 (xy_a, xy_b, 1, ["xy0", "xy1", "xy2", "ay00"],
+                  [1.0, 2.0, 2.0, 2.0]),
+                 (grid_a, grid_b, 5, grid_idents,
+                  [1.0, 1.0, 2.0, 1.0, 1.0, 2.0, 1.0, 1.0]),
+                 (grid_a, grid_b, 2, grid_idents,
+                  [1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 1.0, 1.0])]
+        for chr_a, chr_b, point, idents, weights in cases:
+            for columnar in [False, True]:
+                if columnar:
+                    chr_a = dgeann.WeightChromosome(chr_a)
+                    chr_b = dgeann.WeightChromosome(chr_b)
+                parts = self.genome_a.cross_weights_comp(point, chr_a, chr_b,
+                                                         {})
+                result = dgeann.assemble_weights(parts)
+                self.assertEqual([gene.ident for gene in result], idents)
+                self.assertEqual([gene.weight for gene in result], weights)
+
     def test_recomb(self):
         recomb_a = self.genome_a.recombine(self.genome_a)
         x = 0
@@ -1640,6 +2602,306 @@ class testRecombination(unittest.TestCase):
                     aru = True
             self.assertTrue(aru)
 
+    def test_recomb_copy_on_write(self):
+        old_probs = dgeann.weight_mut_probs
+        dgeann.weight_mut_probs = (1, 0, 0)
+        try:
+            dat = lg(5, True, False, 0, "dat", [], 2, "input")
+            out = lg(5, True, False, 0, "out", ["dat"], 2, "IP")
+            weights = [wg(5, True, False, 0, str(i), 1.00, i, 0, "dat", "out")
+                       for i in range(2)]
+            weights[1].mut_rate = 1.0
+            parent = dgeann.Genome([dat, out], [dat, out], weights,
+                                   list(weights))
+            child = parent.recombine(parent)
+            self.assertIsInstance(child.weightchr_a, dgeann.CowChromosome)
+            #the mutated gene was copied; the parents' genes are untouched
+            self.assertEqual(weights[1].weight, 1.00)
+            self.assertNotEqual(child.weightchr_a[1].weight, 1.00)
+            self.assertNotEqual(child.weightchr_b[1].weight, 1.00)
+            self.assertIsNot(child.weightchr_a[1], weights[1])
+            #genes that did not mutate are still shared
+            self.assertIs(child.weightchr_a[0], weights[0])
+            self.assertIs(child.layerchr_a[1], out)
+            #changes to a child's layer go to its own copy
+            gene = dgeann.own_gene(child.layerchr_a, 1)
+            gene.inputs.append("other")
+            self.assertEqual(out.inputs, ["dat"])
+            self.assertIs(dgeann.own_gene(child.layerchr_a, 1), gene)
+        finally:
+            dgeann.weight_mut_probs = old_probs
+
+    def test_recomb_copy_on_write_relatives(self):
+        old_probs = dgeann.weight_mut_probs
+        dgeann.weight_mut_probs = (1, 0, 0)
+        try:
+            dat = lg(5, False, False, 0, "dat", [], 2, "input")
+            out = lg(5, False, False, 0, "out", ["dat"], 2, "IP")
+            weights = [wg(5, True, False, 0, str(i), 1.00, i // 2, i % 2,
+                          "dat", "out") for i in range(4)]
+            founder = dgeann.Genome([dat, out], [dat, out], weights,
+                                    list(weights))
+            child = founder.recombine(founder)
+            #the founder's later mutations go to its own copies
+            for gene in founder.weightchr_a:
+                gene.mut_rate = 1.0
+            founder.mutate()
+            self.assertEqual([g.weight for g in child.weightchr_a +
+                              child.weightchr_b], [1.00] * 8)
+            #as do a child's second mutations, to genes it already owned
+            gene = dgeann.own_gene(child.weightchr_a, 0)
+            gene.weight = 5.00
+            grandchild = child.recombine(child)
+            gene = dgeann.own_gene(child.weightchr_a, 0)
+            gene.weight = 9.00
+            for chro in [grandchild.weightchr_a, grandchild.weightchr_b]:
+                self.assertTrue(9.00 not in [g.weight for g in chro])
+            self.assertEqual(child.weightchr_a[0].weight, 9.00)
+            #and a grandchild's mutations stay with the grandchild
+            for chro in [grandchild.weightchr_a, grandchild.weightchr_b]:
+                for i in range(len(chro)):
+                    dgeann.own_gene(chro, i).weight = -1.00
+            self.assertEqual(child.weightchr_a[0].weight, 9.00)
+            self.assertEqual([g.weight for g in child.weightchr_a[1:] +
+                              child.weightchr_b], [1.00] * 7)
+        finally:
+            dgeann.weight_mut_probs = old_probs
+
+    def test_recomb_columnar(self):
+        old_probs = dgeann.weight_mut_probs
+        dgeann.weight_mut_probs = (1, 0, 0)
+        dgeann.np_random = dgeann.numpy.random.default_rng(3)
+        try:
+            dat = lg(5, False, False, 0, "dat", [], 4, "input")
+            out = lg(5, False, False, 0, "out", ["dat"], 5, "IP")
+            weights = [wg(5, True, False, 0, str(i), 1.00, i // 5, i % 5,
+                          "dat", "out") for i in range(20)]
+            parent = dgeann.Genome([dat, out], [dat, out],
+                                   dgeann.WeightChromosome(weights),
+                                   dgeann.WeightChromosome(weights))
+            child = parent.recombine(parent)
+            #children keep array-backed chromosomes of their own
+            for chro in [child.weightchr_a, child.weightchr_b]:
+                self.assertIsInstance(chro, dgeann.WeightChromosome)
+                self.assertEqual(len(chro), 20)
+                self.assertEqual(chro.ident.tolist(),
+                                 [str(i) for i in range(20)])
+                self.assertEqual(chro.layers, ["dat", "out"])
+            #so changes to the parent do not reach them
+            parent.weightchr_a.mut_rate[:] = 1.0
+            parent.batch_mutate(parent.weightchr_a, "a")
+            self.assertTrue((parent.weightchr_a.weight != 1.0).all())
+            self.assertTrue((child.weightchr_a.weight == 1.0).all())
+            self.assertTrue((child.weightchr_b.weight == 1.0).all())
+        finally:
+            dgeann.weight_mut_probs = old_probs
+
+    def test_pack_genome(self):
+        packed = dgeann.pack_genome(self.genome_b)
+        genome = dgeann.unpack_genome(packed)
+        self.assertEqual(type(genome), dgeann.Genome)
+        for chro, other in [(genome.layerchr_a, self.genome_b.layerchr_a),
+                            (genome.layerchr_b, self.genome_b.layerchr_b)]:
+            self.assertEqual([(g.ident, g.nodes, g.inputs) for g in chro],
+                             [(g.ident, g.nodes, g.inputs) for g in other])
+        for chro, other in [(genome.weightchr_a, self.genome_b.weightchr_a),
+                            (genome.weightchr_b, self.genome_b.weightchr_b)]:
+            self.assertEqual(type(chro[0]), wg)
+            self.assertEqual([(g.ident, g.weight, g.in_node, g.out_node,
+                               g.in_layer, g.out_layer) for g in chro],
+                             [(g.ident, g.weight, g.in_node, g.out_node,
+                               g.in_layer, g.out_layer) for g in other])
+
+    def test_save_load(self):
+        def genes(genome):
+            return ([(g.ident, g.nodes, g.inputs) for g in genome.layerchr_a],
+                    [(g.ident, g.nodes, g.inputs) for g in genome.layerchr_b],
+                    [(g.ident, g.weight, g.in_node, g.out_node, g.in_layer,
+                      g.out_layer) for g in genome.weightchr_a],
+                    [(g.ident, g.weight, g.in_node, g.out_node, g.in_layer,
+                      g.out_layer) for g in genome.weightchr_b])
+        columnar = dgeann.unpack_genome(dgeann.pack_genome(self.genome_b))
+        columnar.weightchr_a = dgeann.WeightChromosome(columnar.weightchr_a)
+        columnar.weightchr_b = dgeann.WeightChromosome(columnar.weightchr_b)
+        #round trip through bytes, with and without compression
+        for compress in [False, True]:
+            data = self.genome_b.to_bytes(compress)
+            self.assertEqual(data[:4], b"DGEN")
+            genome = dgeann.Genome.from_bytes(data)
+            self.assertEqual(type(genome.weightchr_a[0]), wg)
+            self.assertEqual(genes(genome), genes(self.genome_b))
+            genome = dgeann.Genome.from_bytes(columnar.to_bytes(compress))
+            self.assertEqual(type(genome.weightchr_a),
+                             dgeann.WeightChromosome)
+            self.assertEqual(genes(genome), genes(self.genome_b))
+        path = os.path.join("Gen files", "test_save_load.dgn")
+        try:
+            columnar.save(path)
+            genome = dgeann.Genome.load(path, mmap=True)
+            self.assertEqual(genes(genome), genes(self.genome_b))
+            #memory-mapped arrays are copy-on-write
+            genome.weightchr_a[0].weight = 9.0
+            self.assertEqual(dgeann.Genome.load(path).weightchr_a[0].weight,
+                             self.genome_b.weightchr_a[0].weight)
+            del genome
+            columnar.save(path, compress=True)
+            self.assertRaises(ValueError, dgeann.Genome.load, path, True)
+        finally:
+            os.remove(path)
+        haploid = dgeann.HaploidGenome(self.genome_b.layerchr_a,
+                                       self.genome_b.weightchr_a)
+        genome = dgeann.Genome.from_bytes(haploid.to_bytes())
+        self.assertEqual(type(genome), dgeann.HaploidGenome)
+        self.assertEqual(genes(genome), genes(haploid))
+        self.assertRaises(ValueError, dgeann.Genome.from_bytes, b"\0" * 24)
+
+    def test_save_load_blocks(self):
+        block = dgeann.WeightBlockGene
+        blocks = [block(5, False, False, 0, "blk", [1.0, 2.0, 3.0], 0, 0,
+                        "INa", "IPu"),
+                  wg(5, False, False, 0, "ao00", 4.0, 0, 0, "INa", "IPo"),
+                  block(3, False, False, 0.1, "emp", [], 0, 0, "INi", "IPu"),
+                  block(5, False, False, 0, "io", [5.0, 6.0], 0, 1, "INi",
+                        "IPo")]
+        genome = dgeann.Genome(self.genome_a.layerchr_a,
+                               self.genome_a.layerchr_b, blocks,
+                               self.genome_a.weightchr_b)
+        def genes(chro):
+            return [(type(g), g.ident, g.dom, g.mut_rate,
+                     dgeann.numpy.atleast_1d(g.weight).tolist(), g.in_node,
+                     g.out_node, g.in_layer, g.out_layer) for g in chro]
+        path = os.path.join("Gen files", "test_save_load_blocks.dgn")
+        archive = dgeann.LineageArchive(cache_size=0)
+        ident = archive.add(genome)
+        try:
+            genome.save(path)
+            copies = [dgeann.Genome.from_bytes(genome.to_bytes()),
+                      dgeann.Genome.from_bytes(genome.to_bytes(True)),
+                      dgeann.Genome.load(path, mmap=True),
+                      dgeann.unpack_genome(dgeann.pack_genome(genome)),
+                      archive.get(ident)]
+            for copy in copies:
+                self.assertEqual(genes(copy.weightchr_a), genes(blocks))
+                self.assertEqual(genes(copy.weightchr_b),
+                                 genes(genome.weightchr_b))
+            del copies
+        finally:
+            os.remove(path)
+        #and children with blocks come back from worker processes
+        old = dgeann.block_weights
+        dgeann.block_weights = True
+        try:
+            pairs = [(genome, genome), (genome, self.genome_a)]
+            local = dgeann.breed_population(pairs, seed=7)
+            pooled = dgeann.breed_population(pairs, workers=2, seed=7)
+        finally:
+            dgeann.block_weights = old
+        for one, two in zip(local, pooled):
+            self.assertEqual(genes(one.weightchr_a), genes(two.weightchr_a))
+            self.assertEqual(genes(one.weightchr_b), genes(two.weightchr_b))
+
+    def test_breed_population(self):
+        pairs = [(self.genome_a, self.genome_a), (self.genome_b, self.genome_c),
+                 (self.genome_d, self.genome_e), (self.genome_a, self.genome_k)]
+        state = dgeann.random.getstate()
+        local = dgeann.breed_population(pairs, seed=42)
+        #the global random state is left alone
+        self.assertEqual(dgeann.random.getstate(), state)
+        pooled = dgeann.breed_population(pairs, workers=2, seed=42)
+        self.assertEqual(len(local), 4)
+        self.assertEqual(len(pooled), 4)
+        for one, two in zip(local, pooled):
+            self.assertEqual([g.ident for g in one.layerchr_a],
+                             [g.ident for g in two.layerchr_a])
+            self.assertEqual([g.ident for g in one.layerchr_b],
+                             [g.ident for g in two.layerchr_b])
+            self.assertEqual([(g.ident, g.weight) for g in one.weightchr_a],
+                             [(g.ident, g.weight) for g in two.weightchr_a])
+            self.assertEqual([(g.ident, g.weight) for g in one.weightchr_b],
+                             [(g.ident, g.weight) for g in two.weightchr_b])
+        self.assertEqual(len(pooled[3].weightchr_b), 8)
+
+    def test_lineage_archive(self):
+        archive = dgeann.LineageArchive(keyframe_every=3, cache_size=0)
+        a = archive.add(self.genome_a)
+        b = archive.add(self.genome_k)
+        children = []
+        ids = [a, b]
+        for i in range(5):
+            ident, child = archive.breed(ids[-2], ids[-1], seed=i)
+            ids.append(ident)
+            children.append(child)
+        self.assertEqual(len(archive), 7)
+        #depth 1, 2, then keyframes at 3, then 1 again
+        self.assertEqual([archive.records[i][0] for i in ids[2:]],
+                         ["child", "child", "key", "key", "child"])
+        self.assertEqual([archive.depth(i) for i in ids[2:]], [1, 2, 0, 0, 1])
+        path = os.path.join("Gen files", "lineage.arc")
+        archive.save(path)
+        try:
+            loaded = dgeann.LineageArchive.load(path)
+        finally:
+            os.remove(path)
+        for ident, child in zip(ids[2:], children):
+            for arc in [archive, loaded]:
+                again = arc.get(ident)
+                self.assertEqual([g.ident for g in again.layerchr_a],
+                                 [g.ident for g in child.layerchr_a])
+                self.assertEqual([(g.ident, g.weight, g.dom)
+                                  for g in again.weightchr_b],
+                                 [(g.ident, g.weight, g.dom)
+                                  for g in child.weightchr_b])
+                self.assertEqual(again.mut_record, child.mut_record)
+        #children that do not breed the same way again are caught
+        kind, id_a, id_b, seed, depth, record = archive.records[ids[3]]
+        archive.records[ids[3]] = (kind, id_a, id_b, seed, depth,
+                                   record + [["a", "XXXXXX", "Dom, 1"]])
+        with self.assertRaises(ValueError):
+            archive.get(ids[3])
+
+    def test_lineage_archive_copies(self):
+        genome = dgeann.unpack_genome(dgeann.pack_genome(self.genome_a))
+        genome.weightchr_a = dgeann.WeightChromosome(genome.weightchr_a)
+        genome.weightchr_b = dgeann.WeightChromosome(genome.weightchr_b)
+        weights = genome.weightchr_a.weight.tolist()
+        archive = dgeann.LineageArchive()
+        ident = archive.add(genome)
+        #changes to the genome stored...
+        genome.weightchr_a.weight[0] = 99.0
+        genome.mut_record.append(["a", "au00", "Weight, 1.0"])
+        got = archive.get(ident)
+        self.assertEqual(got.weightchr_a.weight.tolist(), weights)
+        self.assertEqual(got.mut_record, [])
+        #...and to genomes it returns do not reach the archive
+        got.weightchr_a.weight[1] = 77.0
+        got.weightchr_a.mut_rate[:] = 1.0
+        got.batch_mutate(got.weightchr_a, "a")
+        got.mut_record.append(["a", "au00", "Weight, 1.0"])
+        again = archive.get(ident)
+        self.assertEqual(again.weightchr_a.weight.tolist(), weights)
+        self.assertEqual(again.mut_record, [])
+        self.assertFalse(again.weightchr_a.weight is got.weightchr_a.weight)
+
+    def test_worker_settings(self):
+        old = dgeann.current_settings()
+        dgeann.record_muts = False
+        dgeann.weight_mut_probs = (1, 0, 0)
+        try:
+            settings = dgeann.current_settings()
+            #spawned processes start from the defaults...
+            context = dgeann.multiprocessing.get_context("spawn")
+            with context.Pool(1) as pool:
+                fresh = pool.apply(dgeann.current_settings)
+            self.assertTrue(fresh["record_muts"])
+            #...unless given the settings, as breed_population does
+            with context.Pool(1, dgeann.apply_settings, (settings,)) as pool:
+                given = pool.apply(dgeann.current_settings)
+            self.assertEqual(given, settings)
+            self.assertFalse(given["record_muts"])
+            self.assertEqual(given["weight_mut_probs"], (1, 0, 0))
+        finally:
+            dgeann.apply_settings(old)
+
 #while DGEANN is meant to deal with diploidy, haploidy is also an option
 #tests haploid cases
 class testHaploid(unittest.TestCase):
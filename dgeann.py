@@ -1,11 +1,25 @@
 import copy
+import functools
+import hashlib
+import json
 import math
+import multiprocessing
 import os
+import pickle
 import random
+import shutil
+import struct
+import tempfile
+import time
+import zlib
 from textwrap import dedent
 
-import caffe
 import numpy
+try:
+    import caffe
+except ImportError: # pragma: no cover
+    #Genome.build needs PyCaffe; Genome.build_numpy does not
+    caffe = None
 
 
 #default solver
@@ -20,6 +34,27 @@ solv = '''\
         max_iter: 2000000
         display: 10000
         '''
+#default solver for in-memory builds, with the network definition inline
+solv_inline = '''\
+        net_param {{
+        {0}}}
+        type: "AdaDelta"
+        momentum: 0.95
+        base_lr: 0.2
+        lr_policy: "step"
+        gamma: 0.1
+        stepsize: 1000000
+        max_iter: 2000000
+        display: 10000
+        '''
+#directory for temporary solver files (tmpfs if there is one;
+#None uses the system default)
+build_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+#set to a TemplateCache to reuse network definitions (and released solvers)
+#between builds of genomes with the same layer structure
+template_cache = None
+
 #sigma for mutation rate mutations
 sigma = 0.001
 
@@ -101,6 +136,131 @@ weight_mut_probs = (0.833, 0.117, 0.05)
 #toggles recording of mutations in child from parents
 record_muts = True
 
+#toggles the batched NumPy engine for weight mutations in Genome.mutate
+#(same rules as WeightGene.mutate, but draws all rolls at once)
+batch_mutation = False
+
+#toggles sampling only the genes that mutate in Genome.mutate (skipping
+#ahead geometrically, see sparse_hits) instead of rolling for every gene
+sparse_mutation = False
+
+#toggles making WeightBlockGenes (one per input node, covering all of its
+#output nodes) instead of WeightGenes in rand_weight_genes, add_nodes, and
+#dup_weights (list weight chromosomes only)
+block_weights = False
+
+#random generator for the NumPy-based passes
+#reseed with dgeann.np_random = numpy.random.default_rng(seed)
+np_random = numpy.random.default_rng()
+
+#toggles per-stage profiling of Genome.build, recombine, and mutate
+#(results go in each genome's profile, see Profile)
+profiling = False
+
+
+class Profile(object):
+    """Wall time, call count, genes touched, and bytes written for each
+    stage of building, recombining, and mutating a genome.
+
+    Stages nest, so a stage's time includes that of the stages it calls.
+    """
+
+    #the profile stages are currently recorded in (None if not profiling)
+    current = None
+
+    def __init__(self):
+        #stage name: {"seconds", "calls", "genes", "bytes"}
+        self.stages = {}
+
+    def add(self, name, seconds=0.0, calls=0, genes=0, nbytes=0):
+        """Add to the totals for a stage.
+        """
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = {"seconds": 0.0, "calls": 0, "genes": 0, "bytes": 0}
+            self.stages[name] = stats
+        stats["seconds"] += seconds
+        stats["calls"] += calls
+        stats["genes"] += genes
+        stats["bytes"] += nbytes
+
+    def merge(self, other):
+        """Add the totals from another profile to this one.
+        """
+        for name, stats in other.stages.items():
+            self.add(name, stats["seconds"], stats["calls"], stats["genes"],
+                     stats["bytes"])
+
+    def summary(self):
+        """Return the stage totals as a dict.
+        """
+        return {name: dict(stats) for name, stats in self.stages.items()}
+
+    def to_json(self, **kwargs):
+        """Return the stage totals as JSON (kwargs go to json.dumps).
+        """
+        return json.dumps(self.summary(), **kwargs)
+
+def population_profile(genomes):
+    """Return a Profile with the totals from every profiled genome.
+    """
+    total = Profile()
+    for genome in genomes:
+        if genome.profile is not None:
+            total.merge(genome.profile)
+    return total
+
+def profile_count(name, genes=0, nbytes=0):
+    """Add genes touched and bytes written to a stage of the current profile.
+    """
+    if Profile.current is not None:
+        Profile.current.add(name, genes=genes, nbytes=nbytes)
+
+def timed(name):
+    """Decorator recording each call as stage name in the current profile.
+    """
+    def wrap(func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            prof = Profile.current
+            if prof is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                prof.add(name, time.perf_counter() - start, 1)
+        return run
+    return wrap
+
+def profiled(name, fresh=False):
+    """Decorator for Genome methods that start profiling, if toggled.
+
+    Stages go in the profile already being recorded, if any; otherwise in
+    the genome's own profile (or a new one, if fresh, for methods that make
+    a new genome and hand it the profile).
+    """
+    def wrap(method):
+        timed_method = timed(name)(method)
+        @functools.wraps(method)
+        def run(self, *args, **kwargs):
+            if not profiling or (Profile.current is not None and not fresh):
+                return timed_method(self, *args, **kwargs)
+            if fresh:
+                prof = Profile()
+            else:
+                if self.profile is None:
+                    self.profile = Profile()
+                prof = self.profile
+            previous = Profile.current
+            Profile.current = prof
+            try:
+                return timed_method(self, *args, **kwargs)
+            finally:
+                Profile.current = previous
+        return run
+    return wrap
+
 
 class Genome(object):
     """Genome defining a neural network.
@@ -109,10 +269,22 @@ class Genome(object):
     These genomes are diploid, so there are two copies of each chromosome,
     which may have different genes on them.
     Chromosome pair 1: layer genes; pair 2: weight genes.
+    Weight chromosomes may be lists of WeightGenes or WeightChromosomes.
     Outs: optional list of output/top-level layers.
     Mut_record: record of mutations from parents, if toggled.
+    Profile: per-stage timings, if profiling is toggled.
+    Built: (active_list, sub_dict, concat offsets, length of mut_record) of
+    the last build, used by swap_weights.
+    Phenotype: the genome's Phenotype, once express has been called
+    (cleared by mutations).
+    Graphs: LayerGraph of each layer chromosome, made as needed by
+    structural mutations.
     """
 
+    profile = None
+    built = None
+    phenotype = None
+
     def __init__(self, layerchr_a, layerchr_b, weightchr_a, weightchr_b,
                  outs = None):
         self.layerchr_a = layerchr_a
@@ -121,10 +293,14 @@ class Genome(object):
         self.weightchr_b = weightchr_b
         self.outs = outs
         self.mut_record = []
+        self.graphs = {}
 
+    @profiled("recombine", fresh=True)
     def recombine(self, other_genome):
         """Return a new child genome from two parent genomes.
         """
+        self.share_genes()
+        other_genome.share_genes()
         #first we need to do crossover on each genome
         parent_one = self.crossover()
         parent_two = other_genome.crossover()
@@ -143,15 +319,13 @@ class Genome(object):
         else:
             weight_one = parent_one.weightchr_b
             weight_two = parent_two.weightchr_a
-        layer_one = copy.deepcopy(layer_one)
-        layer_two = copy.deepcopy(layer_two)
-        weight_one = copy.deepcopy(weight_one)
-        weight_two = copy.deepcopy(weight_two)
-        for gen in weight_one:
-            gen.alt_in = gen.in_node
-        for gen in weight_two:
-            gen.alt_in = gen.in_node
+        #the child shares genes with its parents until it changes them
+        layer_one = child_chromosome(layer_one)
+        layer_two = child_chromosome(layer_two)
+        weight_one = child_chromosome(weight_one)
+        weight_two = child_chromosome(weight_two)
         child = Genome(layer_one, layer_two, weight_one, weight_two)
+        child.profile = Profile.current
         #now just do mutations
         child.mutate()
 ##        if child.weightchr_a[34].in_node == 5 and\
@@ -205,9 +379,28 @@ class Genome(object):
 ##                              wei.out_layer)
         return child
 
+    #helper function for recombine
+    def share_genes(self):
+        """Make the genome's list chromosomes copy genes before changing
+        them, as they are about to be shared with a child.
+
+        Plain lists become CowChromosomes; WeightChromosomes are never
+        shared (children get copies of their arrays).
+        """
+        for name in ["layerchr_a", "layerchr_b", "weightchr_a", "weightchr_b"]:
+            chro = getattr(self, name)
+            if isinstance(chro, CowChromosome):
+                chro.share()
+            elif not isinstance(chro, WeightChromosome):
+                setattr(self, name, CowChromosome(chro))
+
+    @profiled("crossover")
     def crossover(self):
         """Return a new genome with both pairs of chromosomes crossed over.
         """
+        profile_count("crossover", genes=len(self.layerchr_a) +
+                      len(self.layerchr_b) + len(self.weightchr_a) +
+                      len(self.weightchr_b))
         if constrain_crossover:
             #n = last possible point of crossover for layer chros
             #m = last possible point of crossover for weight chros
@@ -232,6 +425,42 @@ class Genome(object):
         print(lay_cross, "lay cross")
         return result
 
+    def save(self, path, compress=False):
+        """Write the genome to a file in the binary genome format.
+
+        compress: if true, the weight arrays are zlib-compressed
+        (compressed files cannot be loaded with mmap).
+        """
+        with open(path, "wb") as f:
+            f.write(self.to_bytes(compress))
+
+    @staticmethod
+    def load(path, mmap=False):
+        """Return the genome (or HaploidGenome) saved in a file by save().
+
+        mmap: if true, the weight arrays are memory-mapped from the file
+        rather than read into memory; changes to them are not written back.
+        """
+        if mmap:
+            genome = unpack_genome(read_genome_buffer(None, path))
+            reserve_idents(genome)
+            return genome
+        with open(path, "rb") as f:
+            genome = Genome.from_bytes(f.read())
+        reserve_idents(genome)
+        return genome
+
+    def to_bytes(self, compress=False):
+        """Return the genome in the binary genome format.
+        """
+        return write_genome_buffer(pack_genome(self), compress)
+
+    @staticmethod
+    def from_bytes(data):
+        """Return the genome from bytes made by to_bytes().
+        """
+        return unpack_genome(read_genome_buffer(data))
+
     #helper function for crossover
     def last_shared(self):
         """Return the last possible crossover points for layer and weight
@@ -302,6 +531,7 @@ class Genome(object):
         return s_diffs
 
     #helper function for crossover
+    @timed("cross_weights")
     def cross_weights(self, s_diffs, m):
         """Return two crossed-over weight chromosomes.
 
@@ -313,143 +543,320 @@ class Genome(object):
         else:
             weight_cross = 0
         print("weight_cross", weight_cross)
-        #if there is no difference in layer sizes, easy way
-        if s_diffs == {}:
-            weight_a, weight_b = self.cross_weights_simple(weight_cross)
+        #if there is no difference in layer sizes or weight genes, easy way
+        if s_diffs == {} and same_weights(self.weightchr_a, self.weightchr_b):
+            parts_a, parts_b = self.cross_weights_simple(weight_cross)
         else:
-            weight_a = self.cross_weights_comp(weight_cross, self.weightchr_a,
-                                               self.weightchr_b, s_diffs)
-            weight_b = self.cross_weights_comp(weight_cross, self.weightchr_b,
-                                               self.weightchr_a, s_diffs)
-        return weight_a, weight_b
+            #index each chromosome once, rather than scanning it
+            #at every layer boundary
+            index_a = WeightIndex(self.weightchr_a)
+            index_b = WeightIndex(self.weightchr_b)
+            parts_a = self.cross_weights_comp(weight_cross, self.weightchr_a,
+                                              self.weightchr_b, s_diffs,
+                                              index_b, index_a)
+            parts_b = self.cross_weights_comp(weight_cross, self.weightchr_b,
+                                              self.weightchr_a, s_diffs,
+                                              index_a, index_b)
+        return assemble_weights(parts_a), assemble_weights(parts_b)
 
     #helper function for cross_weights
     def cross_weights_simple(self, weight_cross):
-        """Return new crossed-over weight chromomes when doing so is simple.
+        """Return the parts (see assemble_weights) of new crossed-over weight
+        chromosomes when doing so is simple.
 
         weight_cross: pre-determined crossover point
         """
-        weight_a = []
-        weight_b = []
-        for x in range(0, weight_cross):
-            self.weightchr_a[x].alt_in = self.weightchr_a[x].in_node
-            weight_a.append(self.weightchr_a[x])
-        for x in range(weight_cross, len(self.weightchr_b)):
-            self.weightchr_b[x].alt_in = self.weightchr_b[x].in_node
-            weight_a.append(self.weightchr_b[x])
-        for x in range(0, weight_cross):
-            self.weightchr_b[x].alt_in = self.weightchr_b[x].in_node
-            weight_b.append(self.weightchr_b[x])
-        for x in range(weight_cross, len(self.weightchr_a)):
-            self.weightchr_a[x].alt_in = self.weightchr_a[x].in_node
-            weight_b.append(self.weightchr_a[x])
-        return weight_a, weight_b
+        chr_a = self.weightchr_a
+        chr_b = self.weightchr_b
+        parts_a = [(chr_a, range(0, weight_cross)),
+                   (chr_b, range(weight_cross, len(chr_b)))]
+        parts_b = [(chr_b, range(0, weight_cross)),
+                   (chr_a, range(weight_cross, len(chr_a)))]
+        return parts_a, parts_b
 
     #helper function for cross_weights:
-    def cross_weights_comp(self, weight_cross, chr_a, chr_b, s_diffs):
-        """Return new crossed-over weight chromomes when a shared layer has
-        different lengths on either layer chromosome.
-
+    def cross_weights_comp(self, weight_cross, chr_a, chr_b, s_diffs,
+                           index_b=None, index_a=None):
+        """Return the parts (see assemble_weights) of a new crossed-over
+        weight chromosome when a shared layer has different lengths on
+        either layer chromosome.
+
+        Genes before the crossover point come from chr_a and the rest from
+        chr_b, each weight once. Where both chromosomes have genes between
+        two layers but for different weights (as when a layer has been
+        resized), weights only one of them has a gene for are kept on
+        either side of the point, and the genes are kept in node order.
         weight_cross: pre-determined crossover point
+        index_a, index_b: WeightIndex of chr_a and chr_b, if already made
         """
-        weights = []
-        cur_out = None
-        cur_in = None
+        if index_a is None:
+            index_a = WeightIndex(chr_a)
+        if index_b is None:
+            index_b = WeightIndex(chr_b)
+        keys_a = index_a.keys
+        keys_b = index_b.keys
+        uneven = index_a.uneven(index_b)
+        taken = set(keys_a[:weight_cross])
+        #chr_b's part starts after its gene for the last weight from chr_a
+        #(or, if it has none, after the last weight before that one)
+        start = min(weight_cross, len(chr_b))
+        if weight_cross > 0:
+            last = keys_a[weight_cross - 1]
+            pos = index_b.find(*last)
+            if pos is not None:
+                start = pos + 1
+            elif last[:2] in index_b.segments:
+                seg_start, seg_end = index_b.segments[last[:2]]
+                start = seg_end
+                for y in range(seg_start, seg_end):
+                    if keys_b[y][2:] > last[2:]:
+                        start = y
+                        break
+        #(chromosome, key, position) of each gene, in order
+        picks = [(chr_a, keys_a[x], x) for x in range(0, weight_cross)]
         #decided not to have orphaned weights w/ no genes to cover them
-        for x in range(0, weight_cross):
-            cur = chr_a[x]
-            if cur.in_node == 0 and cur.out_node == 0:
-                #if we didn't finish ins of previous layer
-                if cur_in != 0:
-                    last = chr_a[x-1]
-                    for y in range(len(chr_b)):
-                        oth = chr_b[y]
-                        if oth.in_layer == last.in_layer and \
-                           oth.out_layer == last.out_layer:
-                            if oth.in_node == last.in_node + 1:
-                                while oth.in_node <= (s_diffs[
-                                    oth.in_layer] - 1) and \
-                                    oth.in_layer == last.in_layer:
-                                   oth.alt_in = oth.in_node
-                                   weights.append(oth)
-                                   y += 1
-                                   oth = chr_b[y]
-                    cur_in = None
-                    if oth.out_layer in s_diffs.keys():
-                        if oth.out_node == (s_diffs[oth.out_layer] - 1):
-                            cur_out = None
-                    else:
-                        cur_out = None
-                #if we didn't finish outs of previous layer
-                if cur_out != None:
-                    last = chr_a[x-1]
-                    for y in range(len(chr_b)):
-                        oth = chr_b[y]
-                        if oth.in_layer == last.in_layer and \
-                           oth.out_layer == last.out_layer:
-                            if oth.in_node == last.in_node and \
-                               oth.out_node == last.out_node + 1:
-                                while oth.out_node <= (s_diffs[
-                                    oth.out_layer] - 1) and \
-                                    other.out_layer == last.out_layer:
-                                    oth.alt_in = other.in_node
-                                    weights.append(oth)
-                                    y += 1
-                                    oth = chr_b[y]
-                    cur_out = None
-            if cur.out_layer in s_diffs.keys():
-                pass
-            if cur.in_layer in s_diffs.keys():
-                pass
+        for y in range(0, start):
+            key = keys_b[y]
+            if key[:2] in uneven and key not in taken:
+                picks.append((chr_b, key, y))
+        for y in range(start, len(chr_b)):
+            if keys_b[y] not in taken:
+                picks.append((chr_b, keys_b[y], y))
+        for x in range(weight_cross, len(chr_a)):
+            key = keys_a[x]
+            if key[:2] in uneven and index_b.find(*key) is None:
+                picks.append((chr_a, key, x))
+        #put the genes of each resized layer together, in node order,
+        #where the first of them is
+        groups = []
+        resized = {}
+        for pick in picks:
+            seg = pick[1][:2]
+            if seg not in uneven:
+                groups.append([pick])
+            elif seg in resized:
+                resized[seg].append(pick)
             else:
-                cur.alt_in = cur.in_node
-                weights.append(cur)
-        #NTS also remember to check after end of chro
-        cur_out = 0
-        cur_in = 0
-        for x in range(weight_cross, len(chr_b)):
-            cur = chr_b[x]
-            if False:
-                pass
-            else:
-                cur.alt_in = cur.in_node
-                weights.append(cur)
-        return weights
+                resized[seg] = [pick]
+                groups.append(resized[seg])
+        parts = []
+        for group in groups:
+            group.sort(key=lambda pick: pick[1][2:])
+            for chro, key, pos in group:
+                if parts and parts[-1][0] is chro:
+                    parts[-1][1].append(pos)
+                else:
+                    parts.append((chro, [pos]))
+        return parts
 
     #TODO is it possible to simplify and get rid of active_list
     #   given that I now know that list(t._layer/blob_names) exists?
-    def build(self, delete=True):
+    @profiled("build")
+    def build(self, delete=True, in_memory=False):
         """Return the solver for the PyCaffe network from the Genome.
 
         Delete: if true, deletes the generated solver files.
+        In_memory: if true, no .gen file is written; the network definition
+        is handed to Caffe inline in one temporary solver file.
+        If template_cache is set, it is used instead (and nothing is written).
         """
         #first, generate a new ID for the network
         self.ident = network_ident()
-        if not os.path.exists('Gen files'): # pragma: no cover
-            os.makedirs('Gen files')
-        ident_file = os.path.join('Gen files', self.ident + '.gen')
         #then build network structure
         active_list = {}
         concat_dict = {}
-        active_list, concat_dict, sub_dict = self.build_layers(active_list,
-                                                               ident_file,
-                                                               concat_dict)
-        result = dedent(solv.format(ident_file))
-        f = open("temp_solver.txt", "w")
-        f.write(result)
-        f.close()
-        #TODO make replaceable with other solvers
-        solver = caffe.AdaDeltaSolver('temp_solver.txt')
-        os.remove('temp_solver.txt')
-        if delete == True:
-            os.remove(ident_file)
+        if template_cache is not None:
+            sub_dict, active_list, layout = self.express_layout(active_list)
+            self.layout_key = layout_key(layout)
+            text, concat_dict = template_cache.template(self.layout_key,
+                                                        layout, active_list)
+            solver = template_cache.acquire(self.layout_key, text)
+        elif in_memory:
+            text, active_list, concat_dict, sub_dict = self.build_net_text(
+                active_list, concat_dict)
+            solver = Genome.make_solver(dedent(solv_inline).format(text))
+        else:
+            if not os.path.exists('Gen files'): # pragma: no cover
+                os.makedirs('Gen files')
+            ident_file = os.path.join('Gen files', self.ident + '.gen')
+            #never add to another network's file
+            while os.path.exists(ident_file):
+                self.ident = network_ident()
+                ident_file = os.path.join('Gen files', self.ident + '.gen')
+            active_list, concat_dict, sub_dict = self.build_layers(
+                active_list, ident_file, concat_dict)
+            solver = Genome.make_solver(dedent(solv.format(ident_file)))
+            if delete == True:
+                os.remove(ident_file)
+        self.set_weights(solver.net, active_list, concat_dict, sub_dict)
+        return solver
+
+    @profiled("build")
+    def build_numpy(self):
+        """Return a NumpyNet for the network defined by the Genome.
+
+        Needs no Caffe and writes no files, but can only run forward.
+        """
+        self.ident = network_ident()
+        expressed = self.express()
+        net = NumpyNet(expressed.layout, expressed.concat_dict,
+                       expressed.weights)
+        self.layout_key = net.layout_key = expressed.key
+        self.built = (expressed.active_list, expressed.sub_dict,
+                      concat_offsets(expressed.concat_dict),
+                      len(self.mut_record))
+        return net
+
+    @timed("express")
+    def express(self):
+        """Return the Phenotype of the genome: its layout and weight
+        matrices, with dominance between the chromosomes resolved.
+
+        The result is kept on the genome and reused (by build and build_numpy
+        too) until a mutation clears it.
+        Weights that no weight gene defines are random, as in a new network.
+        """
+        if self.phenotype is not None:
+            return self.phenotype
+        sub_dict, active_list, layout = self.express_layout({})
+        concat_dict = {}
+        for gene in layout:
+            gene.read_out(concat_dict, active_list)
+        net = NumpyNet(layout, concat_dict)
+        self.set_weights(net, active_list, concat_dict, sub_dict)
+        weights = {key: net.params[key][0].data for key in net.params}
+        self.phenotype = Phenotype(layout, active_list, sub_dict,
+                                   concat_dict, weights)
+        return self.phenotype
+
+    #helper function for build
+    def set_weights(self, net, active_list, concat_dict, sub_dict):
+        """Set the weights of a newly made network from the weight genes
+        (or make weight genes from its random weights, if there are none).
+
+        If the genome has been expressed, its phenotype's weights are used.
+        """
+        if self.phenotype is not None:
+            for key, weights in self.phenotype.weights.items():
+                net.params[key][0].data[...] = weights
+            self.built = (active_list, sub_dict, concat_offsets(concat_dict),
+                          len(self.mut_record))
+            return
         #deal with concats and weights
+        #(alt_in is set fresh for each build, as genes may be shared)
+        for chro in [self.weightchr_a, self.weightchr_b]:
+            if isinstance(chro, WeightChromosome):
+                chro.alt_in[:] = chro.in_node
+            else:
+                for gen in chro:
+                    gen.alt_in = gen.in_node
         self.concat_adjust(concat_dict)
         #now change the weights to those specified in genetics
         if len(self.weightchr_a) > 0:
-            self.build_weights(active_list, solver.net, sub_dict)
+            self.build_weights(active_list, net, sub_dict)
         else:
-            self.rand_weight_genes(solver.net, concat_dict)
+            self.rand_weight_genes(net, concat_dict)
+        self.built = (active_list, sub_dict, concat_offsets(concat_dict),
+                      len(self.mut_record))
+
+    @profiled("swap_weights")
+    def swap_weights(self, net, changes=None):
+        """Write the weights of changed weight genes into a network already
+        built from this genome, instead of building it again.
+
+        net: solver.net (or a NumpyNet) from the genome's last build
+        changes: mut_record entries ([chromosome, ident, result]) or weight
+        gene idents; defaults to the mut_record entries made since the last
+        build (or the last swap_weights that used this default).
+        Each changed gene is read with its partner (the gene for the same
+        weight on the other chromosome), as in build_weights.
+        Returns the number of genes read.
+        """
+        if self.built is None:
+            raise ValueError("genome has not been built")
+        active_list, sub_dict, offsets, recorded = self.built
+        since_build = changes is None
+        if since_build:
+            changes = self.mut_record[recorded:]
+        layers = set(g.ident for g in self.layerchr_a + self.layerchr_b)
+        idents = {"a": set(), "b": set()}
+        for change in changes:
+            if isinstance(change, str):
+                idents["a"].add(change)
+                idents["b"].add(change)
+                continue
+            c, ident, result = change
+            if result[0:3] == "Rat":
+                continue
+            if ident in layers or result[0:3] in ("Dup", "Nod"):
+                #layer changes can change the network's structure
+                raise ValueError("mutation " + result + " of " + ident +
+                                 " needs a full build")
+            idents[c].add(ident)
+        chros = {"a": self.weightchr_a, "b": self.weightchr_b}
+        index = {}
+        done = set()
+        buf = WeightBuffer(net)
+        n = 0
+        for c, other_c in [("a", "b"), ("b", "a")]:
+            chro = chros[c]
+            if len(idents[c]) == 0:
+                continue
+            if isinstance(chro, WeightChromosome):
+                hits = numpy.flatnonzero(numpy.isin(
+                    chro.ident, list(idents[c]))).tolist()
+            else:
+                hits = [pos for pos, g in enumerate(chro)
+                        if g.ident in idents[c]]
+            for pos in hits:
+                gene = chro[pos]
+                key = (gene.in_layer, gene.out_layer, gene.in_node,
+                       gene.out_node)
+                if key in done:
+                    continue
+                done.add(key)
+                if other_c not in index:
+                    index[other_c] = WeightIndex(chros[other_c])
+                other_pos = index[other_c].find(*key)
+                other = None
+                if other_pos is not None:
+                    other = chros[other_c][other_pos]
+                for g in [gene, other]:
+                    if g is not None:
+                        g.alt_in = g.in_node + offsets.get(
+                            (g.in_layer, g.out_layer), 0)
+                values = gene.read(active_list, sub_dict, other)
+                if values is not None:
+                    Genome.adjust_weight(buf, values)
+                n += 1
+        profile_count("swap_weights", genes=n)
+        buf.flush()
+        if since_build:
+            self.built = (active_list, sub_dict, offsets,
+                          len(self.mut_record))
+        return n
+
+    #helper function for build
+    @staticmethod
+    @timed("solver")
+    def make_solver(solver_text):
+        """Return a Caffe solver made from the text of a solver definition.
+
+        The text goes into a uniquely named temporary file (in build_tmp_dir),
+        so that builds running at the same time do not overwrite each other.
+        """
+        if caffe is None:
+            raise ImportError("PyCaffe is not installed "
+                              "(Genome.build_numpy does not need it)")
+        f = tempfile.NamedTemporaryFile("w", suffix=".prototxt",
+                                        dir=build_tmp_dir, delete=False)
+        try:
+            f.write(solver_text)
+            f.close()
+            #TODO make replaceable with other solvers
+            solver = caffe.AdaDeltaSolver(f.name)
+        finally:
+            os.remove(f.name)
         return solver
 
     #helper function for build
@@ -457,6 +864,41 @@ class Genome(object):
         """Create the file with the layer structure of the network
         defined by the genome, and return active_list, concat_dict, and sub_dict.
         """
+        text, active_list, concat_dict, sub_dict = self.build_net_text(
+            active_list, concat_dict)
+        #print out to file
+        f = open(ident_file, "a")
+        f.write(text)
+        f.close()
+        return active_list, concat_dict, sub_dict
+
+    #helper function for build
+    @timed("net_text")
+    def build_net_text(self, active_list, concat_dict):
+        """Return the text of the Caffe network definition for the layer
+        structure defined by the genome, along with active_list, concat_dict,
+        and sub_dict.
+        """
+        sub_dict, active_list, layout = self.express_layout(active_list)
+        #read out combined genome
+        text = ""
+        for gene in layout:
+            text += gene.read_out(concat_dict, active_list)
+        return text, active_list, concat_dict, sub_dict
+
+    #helper function for build_net_text
+    def express_layout(self, active_list):
+        """Return sub_dict, active_list, and the list of layer genes that
+        make up the network.
+
+        If the genome has been expressed, its phenotype's layout is used.
+        """
+        #layer chromosomes may be rearranged
+        self.graphs = {}
+        if self.phenotype is not None:
+            active_list.update(self.phenotype.active_list)
+            return (dict(self.phenotype.sub_dict), active_list,
+                    list(self.phenotype.layout))
         if len(self.layerchr_b) != 0:
             self.layers_equalize()
         #(if genome is actually haploid)
@@ -465,15 +907,7 @@ class Genome(object):
                 self.layerchr_b.append(LayerGene(0, False, False, 0, "null",
                                                   [], None, None))
                 i += 1
-        sub_dict, active_list, layout = self.structure_network(active_list)
-        #read out combined genome
-        for gene in layout:
-            print_out = gene.read_out(concat_dict, active_list)
-            #print out to file
-            f = open(ident_file, "a")
-            f.write(print_out)
-            f.close()
-        return active_list, concat_dict, sub_dict
+        return self.structure_network(active_list)
 
     #helper function for build_layers
     def layers_equalize(self):
@@ -508,6 +942,7 @@ class Genome(object):
             self.layerchr_b.reverse()
 
     #helper function for build_layers
+    @timed("structure_network")
     def structure_network(self, active_list):
         """Return a list of genes that are ready to be turned into a
         Caffe network file, active_list ({layer: # nodes}), and substitution
@@ -516,7 +951,6 @@ class Genome(object):
         #choose one layer chr to use as layout structure pattern
         layout = copy.copy(random.choice([self.layerchr_a,
                                           self.layerchr_b]))
-        orphan_list = []
         sub_dict = {}
         del_list = []
         for i in range(len(self.layerchr_a)):
@@ -528,7 +962,7 @@ class Genome(object):
             #if gene already there in layout: keep
                 if read_gene == layout[i]:
                     if read_gene.ident != 'null':
-                        layout[i] = copy.deepcopy(read_gene)
+                        layout[i] = copy_gene(read_gene)
                         ins = []
                         for lay in layout[i].inputs:
                             if lay in sub_dict:
@@ -538,17 +972,13 @@ class Genome(object):
                                     ins.append(lay)
                         layout[i].inputs[:] = [a for a in ins]
                         active_list[read_gene.ident] = read_gene.nodes
-                        orphan_list.append(read_gene.ident)
-                        for j in read_gene.inputs:
-                            if j in orphan_list:
-                                orphan_list.remove(j)
                 #else if other gene, if not null
                 else:
                     if read_gene.ident != 'null':
                     #keep inputs the same if possible, but sub name in outputs
-                        new_layer = copy.deepcopy(read_gene)
+                        new_layer = copy_gene(read_gene)
                         if layout[i].ident != 'null':
-                            new_layer.inputs = layout[i].inputs
+                            new_layer.inputs = list(layout[i].inputs)
                         ins = []
                         for lay in new_layer.inputs:
                             if lay in sub_dict:
@@ -560,11 +990,7 @@ class Genome(object):
                         if layout[i].ident != new_layer.ident:
                             sub_dict = {layout[i].ident: new_layer.ident}
                         layout[i] = new_layer
-                        orphan_list.append(layout[i].ident)
                         active_list[layout[i].ident] = layout[i].nodes
-                        for j in layout[i].inputs:
-                            if j in orphan_list:
-                                orphan_list.remove(j)
                     else:
                         del_list.append(layout[i].ident)
                         layout[i] = read_gene
@@ -575,11 +1001,17 @@ class Genome(object):
                 if layout[i].ident != 'null':
                     layout[i] = LayerGene(3, False, False, 0, "null", [],
                                             None, None)
-        #clear out orphans
+        #clear out layers no output depends on (along with their weights,
+        #which are not read once the layers are out of active_list)
+        #unless no output is left in the layout, which would clear them all
         if self.outs != None:
+            live = live_layers(layout, [sub_dict.get(o, o) for o in self.outs])
+        else:
+            live = set()
+        if len(live) > 0:
             for i in range(len(layout)):
-                if (layout[i].ident in orphan_list
-                    and layout[i].ident not in self.outs):
+                if layout[i].ident != "null" and layout[i].ident not in live:
+                    active_list.pop(layout[i].ident, None)
                     layout[i] = LayerGene(3, False, False, 0, "null", [],
                                                 None, None)
         #now delete all null layers in chr a, chr b, and layout
@@ -592,26 +1024,39 @@ class Genome(object):
         """Adjust offsets for weight gene input nodes when concat layers
         exist, so that the correct weights are adjusted in the final network.
         """
-        #probably not the fastest way to do this
+        offsets = concat_offsets(concat_dict)
+        if len(offsets) == 0:
+            return
         for ch in [self.weightchr_a, self.weightchr_b]:
-            for weight in ch:
-                for key in concat_dict:
-                    if (weight.in_layer in concat_dict[key][0] and
-                        weight.out_layer in concat_dict[key][2]):
-                        #don't adjust the first one
-                        if (concat_dict[key][0].index(weight.in_layer)) != 0:
-                            n = concat_dict[key][1][0]
-                            for lay in concat_dict[key][1][
-                                1:(concat_dict[key][0].index(weight.in_layer))]:
-                                n += lay
-                            weight.alt_in = n + weight.in_node
+            if isinstance(ch, WeightChromosome):
+                #table of offsets by interned (in_layer, out_layer); -1 = none
+                table = numpy.full((len(ch.layers), len(ch.layers)), -1,
+                                   dtype=numpy.int64)
+                for (in_layer, out_layer), off in offsets.items():
+                    if in_layer in ch.layer_index and \
+                       out_layer in ch.layer_index:
+                        table[ch.layer_index[in_layer],
+                              ch.layer_index[out_layer]] = off
+                offs = table[ch.in_layer, ch.out_layer]
+                adjust = offs >= 0
+                ch.alt_in[adjust] = offs[adjust] + ch.in_node[adjust]
+            else:
+                for weight in ch:
+                    off = offsets.get((weight.in_layer, weight.out_layer))
+                    if off is not None:
+                        weight.alt_in = off + weight.in_node
 
+    @timed("build_weights")
     def build_weights(self, active_list, net, sub_dict):
         """Change the weights in the created network to those defined
         by the weight genes.
         """
+        #collect every change first, then write them a layer at a time
+        buf = WeightBuffer(net)
         weightchr_a = self.weightchr_a
         weightchr_b = self.weightchr_b
+        profile_count("build_weights", genes=len(weightchr_a) +
+                      len(weightchr_b))
         if len(weightchr_a) < len(weightchr_b):
             longer = weightchr_b
         elif len(weightchr_a) > len(weightchr_b):
@@ -630,7 +1075,7 @@ class Genome(object):
                 if a.out_node == b.out_node:
                     values = a.read(active_list, sub_dict, b)
                     if values is not None:
-                        Genome.adjust_weight(net, values)
+                        Genome.adjust_weight(buf, values)
                     n += 1
                     m += 1
                     if n > a_lim and m <= b_lim:
@@ -642,18 +1087,18 @@ class Genome(object):
                     #if one is at 0/0 and the other is not:
                     if a.in_node == 0 and a.out_node == 0:
                         m, b, longer = self.catch_out("b", b, b_lim, m,
-                                                      active_list, net,
+                                                      active_list, buf,
                                                       sub_dict, longer)
                     elif b.in_node == 0 and b.out_node == 0:
                         n, a, longer = self.catch_out("a", a, a_lim, n,
-                                                      active_list, net,
+                                                      active_list, buf,
                                                       sub_dict, longer)
                     else:
                         #can we get here? in nodes equal, out nodes not
                         #but neither is at 0/0?
                         print("somehow, got here", self.ident)
                         while a.out_node < b.out_node:
-                            n, a = self.read_through("a", n, active_list, net,
+                            n, a = self.read_through("a", n, active_list, buf,
                                                      sub_dict)
                             if n > a_lim:
                                 longer = self.weightchr_b
@@ -661,7 +1106,7 @@ class Genome(object):
                             if a.in_node == 0 and a.out_node == 0:
                                 break
                         while b.out_node < a.out_node:
-                            m, b = self.read_through("b", m, active_list, net,
+                            m, b = self.read_through("b", m, active_list, buf,
                                                      sub_dict)
                             if m > b_lim:
                                 longer = self.weightchr_a
@@ -672,25 +1117,25 @@ class Genome(object):
                 #if one is at 0 input/0 output, read the other 'till it catches up
                 if a.in_node == 0 and a.out_node == 0:
                     while b.in_node != 0:
-                        m, b = self.read_through("b", m, active_list, net,
+                        m, b = self.read_through("b", m, active_list, buf,
                                                  sub_dict)
                         if m > b_lim:
                             break
                     if m <= b_lim:
                         while b.out_node != 0:
-                            m, b = self.read_through("b", m, active_list, net,
+                            m, b = self.read_through("b", m, active_list, buf,
                                                      sub_dict)
                             if m > b_lim:
                                 break
                 elif b.in_node == 0 and b.out_node == 0:
                     while a.in_node != 0:
-                        n, a = self.read_through("a", n, active_list, net,
+                        n, a = self.read_through("a", n, active_list, buf,
                                                  sub_dict)
                         if n > a_lim:
                             break
                     if n <= a_lim:
                         while a.out_node != 0:
-                            n, a = self.read_through("a", n, active_list, net,
+                            n, a = self.read_through("a", n, active_list, buf,
                                                      sub_dict)
                             if n > a_lim:
                                 break
@@ -698,7 +1143,7 @@ class Genome(object):
                 #or until the other hits 0/0 i/o
                 else:
                     while a.in_node < b.in_node:
-                        n, a = self.read_through("a", n, active_list, net,
+                        n, a = self.read_through("a", n, active_list, buf,
                                                  sub_dict)
                         if n > a_lim:
                             longer = self.weightchr_b
@@ -706,7 +1151,7 @@ class Genome(object):
                         if a.in_node == 0 and a.out_node == 0:
                             break
                     while b.in_node < a.in_node:
-                        m, b = self.read_through("b", m, active_list, net,
+                        m, b = self.read_through("b", m, active_list, buf,
                                                  sub_dict)
                         if m > b_lim:
                             longer = self.weightchr_a
@@ -724,8 +1169,9 @@ class Genome(object):
                 while x <= (len(longer) - 1):
                     values = longer[x].read(active_list, sub_dict)
                     if values is not None:
-                        Genome.adjust_weight(net, values)
+                        Genome.adjust_weight(buf, values)
                     x += 1
+        buf.flush()
 
     #helper function for build_weights
     @staticmethod
@@ -736,17 +1182,35 @@ class Genome(object):
         #values is a list formatted as:
         #input (str), in node, output (str), out node, weight
         #with perhaps another set for a second weight adjustment
+        if isinstance(net, WeightBuffer):
+            net.add(values)
+            return
         output = values[2]
         out_node = values[3]
         in_node = values[1]
         weight = values[4]
-        net.params[output][0].data[out_node][in_node] = weight
+        Genome.write_weight(net.params[output][0].data, in_node, out_node,
+                            weight)
         if len(values) > 5:
             output = values[7]
             out_node = values[8]
             in_node = values[6]
             weight = values[9]
-            net.params[output][0].data[out_node][in_node] = weight
+            Genome.write_weight(net.params[output][0].data, in_node,
+                                out_node, weight)
+
+    #helper function for adjust_weight
+    @staticmethod
+    def write_weight(data, in_node, out_node, weight):
+        """Write one weight (or a block of them, from out_node on) into a
+        weight array.
+        """
+        if isinstance(weight, numpy.ndarray):
+            #any of the block past the end of the layer is not used
+            weight = weight[:max(0, len(data) - out_node)]
+            data[out_node:(out_node + len(weight)), in_node] = weight
+        else:
+            data[out_node][in_node] = weight
             
     #helper function for build_weights
     def read_through(self, chro, n, active_list, net, sub_dict):
@@ -790,27 +1254,23 @@ class Genome(object):
         return pos, gene, longer
 
     #helper function for build
+    @timed("rand_weight_genes")
     def rand_weight_genes(self, net, concat_dict):
         """Create a network with random weights and create weight genes for
         both chromosomes based on those weights.
 
         Both are given the same weights, but with random dominance.
         """
+        layer_names = list(net._layer_names)
+        blob_names = list(net._blob_names)
         for key in net.params:
             d = net.params[key][0].data
-            if type(d[0]) == numpy.ndarray:
+            if d.ndim > 1:
                 #have to find in_layer, undo concats
-                in_layer = list(net._blob_names)[
-                    list(net._bottom_ids(list(net._layer_names).index(key)))[0]]
-                #now see if this is in concat_dict?
-                conc = False
-                for con in concat_dict:
-                    #if in_layer in concat_dict[con][0]:
-                    if in_layer in concat_dict.keys():
-                        #then input is from a concat layer
-                        conc = True
-                        break
-                if conc == True:
+                in_layer = blob_names[
+                    list(net._bottom_ids(layer_names.index(key)))[0]]
+                #if so, then input is from a concat layer
+                if in_layer in concat_dict:
                     self.concat_rweights(net, in_layer, d, key, concat_dict)
                 else:
                     self.create_rweights(in_layer, d, key, net)
@@ -823,9 +1283,10 @@ class Genome(object):
         """
         #current layer is a concat layer; now we need to check *its* inputs
         #for i in  [list of input layer indexes]
+        blob_names = list(net._blob_names)
         for i in (list(net._bottom_ids(list(net._layer_names).index(
             in_layer)))):
-            ins = list(net._blob_names)[i]
+            ins = blob_names[i]
             #assuming concats should no longer end up stacked
             off = self.create_rweights(ins, d, out_layer, net, off)
         return off
@@ -838,40 +1299,191 @@ class Genome(object):
         d: weight array of the output layer.
         """
         limit = net.blobs[in_layer].data.shape[1]
-        new_off = off
-        #i is the input number/node
-        for i in range(limit):
-            #j is the output number/node
-            for j in range(len(d)):
-                weight = d[j][i+off]
-                w_gene = WeightGene(random.randint(1, 5), True, False,
-                                    def_mut_rate, gene_ident(), weight,
-                                    i, j, in_layer, out_layer)
-                self.weightchr_a.append(w_gene)
-                w_gene.dom = random.randint(1, 5)
-                self.weightchr_b.append(w_gene)
-            new_off += 1
-        return new_off
-
+        outs = len(d)
+        if block_weights:
+            if any(isinstance(chro, WeightChromosome) for chro in
+                   [self.weightchr_a, self.weightchr_b]):
+                raise ValueError("WeightChromosome cannot hold "
+                                 "WeightBlockGenes (turn block_weights off "
+                                 "for columnar genomes)")
+            #one block per input node, covering all its output nodes
+            idents = gene_idents(limit)
+            for chro in [self.weightchr_a, self.weightchr_b]:
+                doms = np_random.integers(1, 6, limit)
+                for i in range(limit):
+                    chro.append(WeightBlockGene(
+                        int(doms[i]), True, False, def_mut_rate, idents[i],
+                        numpy.array(d[:, off + i], dtype=numpy.float64), i, 0,
+                        in_layer, out_layer))
+            return off + limit
+        n = limit * outs
+        #genes go in order of input node, then output node
+        weights = numpy.asarray(d)[:, off:(off + limit)].T.ravel()
+        in_nodes = numpy.repeat(numpy.arange(limit), outs)
+        out_nodes = numpy.tile(numpy.arange(outs), limit)
+        idents = gene_idents(n)
+        for chro in [self.weightchr_a, self.weightchr_b]:
+            doms = np_random.integers(1, 6, n)
+            if isinstance(chro, WeightChromosome):
+                chro.extend_columns(n, dom=doms, can_mut=True, can_dup=False,
+                                    mut_rate=def_mut_rate, ident=idents,
+                                    weight=weights, in_node=in_nodes,
+                                    out_node=out_nodes, alt_in=in_nodes,
+                                    in_layer=in_layer, out_layer=out_layer)
+            else:
+                chro.extend([WeightGene(dom, True, False, def_mut_rate,
+                                        ident, weight, i, j, in_layer,
+                                        out_layer)
+                             for dom, ident, weight, i, j in zip(
+                                 doms.tolist(), idents, weights.tolist(),
+                                 in_nodes.tolist(), out_nodes.tolist())])
+        return off + limit
+
+    @profiled("mutate")
     def mutate(self):
         """Handle mutation checks for all genes.
         """
-        for layer in self.layerchr_a:
-            result = layer.mutate()
-            if result != "":
-                self.handle_mutation(result, layer, "a", self.layerchr_a)
-        for layer in self.layerchr_b:
-            result = layer.mutate()
-            if result != "":
-                self.handle_mutation(result, layer, "b", self.layerchr_b)
-        for weight in self.weightchr_a:
-            result = weight.mutate()
-            if result != "":
-                self.handle_mutation(result, weight, "a", self.weightchr_a)
-        for weight in self.weightchr_b:
-            result = weight.mutate()
+        self.phenotype = None
+        if sparse_mutation:
+            self.sparse_mutate()
+            return
+        self.mutate_genes(self.layerchr_a, "a")
+        self.mutate_genes(self.layerchr_b, "b")
+        if batch_mutation:
+            self.batch_mutate(self.weightchr_a, "a")
+            self.batch_mutate(self.weightchr_b, "b")
+            return
+        self.mutate_genes(self.weightchr_a, "a")
+        self.mutate_genes(self.weightchr_b, "b")
+
+    #helper function for mutate
+    def mutate_genes(self, chro, c):
+        """Roll for each gene of a chromosome in turn, and mutate it if it
+        mutates.
+
+        A duplicated layer's copy goes in before it, so the layer is rolled
+        for again.
+        c: "a" or "b", used for the mutation record
+        """
+        for i, gene in enumerate(chro):
+            result = gene.mutate()
             if result != "":
-                self.handle_mutation(result, weight, "b", self.weightchr_b)
+                profile_count("mutate", genes=1)
+                gene = own_gene(chro, i)
+                self.handle_mutation(result, gene, c, chro)
+
+    #helper function for mutate
+    def sparse_mutate(self):
+        """Mutate all genes, rolling only for the genes that mutate.
+
+        Which genes mutate is drawn from np_random by sparse_hits, with the
+        same odds as Gene.mutate; how they mutate is left to each gene's
+        determine_mutation.
+        Only the layer chromosomes (which are short) and WeightChromosomes
+        are mutated this way: finding the rates of a list weight chromosome
+        takes a pass over every gene anyway, so those are mutated as mutate
+        does without sparse_mutation.
+        """
+        for chro, c in [(self.layerchr_a, "a"), (self.layerchr_b, "b"),
+                        (self.weightchr_a, "a"), (self.weightchr_b, "b")]:
+            if isinstance(chro, WeightChromosome):
+                rates = numpy.where(chro.can_mut, chro.mut_rate, -1.0)
+            elif chro is self.weightchr_a or chro is self.weightchr_b:
+                if batch_mutation:
+                    self.batch_mutate(chro, c)
+                else:
+                    self.mutate_genes(chro, c)
+                continue
+            else:
+                rates = numpy.fromiter((g.mut_rate if g.can_mut else -1.0
+                                        for g in chro), numpy.float64,
+                                       len(chro))
+            hits = sparse_hits(rates).tolist()
+            #duplications insert a gene before the one duplicated, which
+            #is then rolled for again (as in mutate_genes)
+            shift = 0
+            k = 0
+            while k < len(hits):
+                pos = hits[k] + shift
+                n = len(chro)
+                result = chro[pos].determine_mutation()
+                profile_count("mutate", genes=1)
+                gene = own_gene(chro, pos)
+                self.handle_mutation(result, gene, c, chro)
+                if len(chro) > n:
+                    shift += len(chro) - n
+                    if np_random.random() <= rates[hits[k]]:
+                        continue
+                k += 1
+
+    #helper function for mutate
+    def batch_mutate(self, chro, c):
+        """Mutate a whole weight chromosome in one pass, drawing all rolls
+        from np_random.
+
+        Follows the same rules as WeightGene.mutate and determine_mutation.
+        c: "a" or "b", used for the mutation record
+        """
+        self.phenotype = None
+        n = len(chro)
+        if n == 0:
+            return
+        columnar = isinstance(chro, WeightChromosome)
+        if columnar:
+            rates = numpy.where(chro.can_mut, chro.mut_rate, -1.0)
+        else:
+            rates = numpy.fromiter((g.mut_rate if g.can_mut else -1.0
+                                    for g in chro), numpy.float64, n)
+        hits = numpy.flatnonzero(np_random.random(n) <= rates)
+        profile_count("mutate", genes=len(hits))
+        if len(hits) == 0:
+            return
+        if columnar:
+            doms = chro.dom[hits].astype(numpy.int64)
+            cur_rates = chro.mut_rate[hits]
+        else:
+            doms = numpy.array([chro[i].dom for i in hits], numpy.int64)
+            cur_rates = rates[hits]
+        #same thresholds as WeightGene.determine_mutation
+        roll = np_random.random(len(hits))
+        is_weight = roll < weight_mut_probs[0]
+        is_dom = ((roll > weight_mut_probs[0]) &
+                  (roll < sum(weight_mut_probs[0:2])))
+        is_rate = ~(is_weight | is_dom)
+        changes = numpy.zeros(len(hits))
+        changes[is_weight] = np_random.normal(0, 0.50, is_weight.sum())
+        changes[is_dom] = batch_dom_changes(doms[is_dom])
+        changes[is_rate] = batch_rate_changes(cur_rates[is_rate])
+        #position changed in each WeightBlockGene with a weight mutation
+        block_idx = {}
+        if columnar:
+            chro.weight[hits[is_weight]] += changes[is_weight]
+            chro.dom[hits[is_dom]] += changes[is_dom].astype(numpy.int8)
+            chro.mut_rate[hits[is_rate]] += changes[is_rate]
+        else:
+            for k in range(len(hits)):
+                gene = own_gene(chro, hits[k])
+                if is_weight[k] and isinstance(gene, WeightBlockGene):
+                    block_idx[k] = int(np_random.integers(len(gene.weight)))
+                    gene.weight[block_idx[k]] += changes[k]
+                elif is_weight[k]:
+                    gene.weight += changes[k]
+                elif is_dom[k]:
+                    gene.dom += int(changes[k])
+                else:
+                    gene.mut_rate += changes[k]
+        if record_muts:
+            for k in range(len(hits)):
+                if k in block_idx:
+                    result = ("Weight, " + str(block_idx[k]) + ", " +
+                              str(float(changes[k])))
+                elif is_weight[k]:
+                    result = "Weight, " + str(float(changes[k]))
+                elif is_dom[k]:
+                    result = "Dom, " + str(int(changes[k]))
+                else:
+                    result = "Rate, " + str(float(changes[k]))
+                self.mut_record.append([c, chro[hits[k]].ident, result])
 
     #helper function for mutate 
     def handle_mutation(self, result, gene, c, chro=None):
@@ -880,6 +1492,7 @@ class Genome(object):
         #this could be more complicated to take into account whether
         #the mutation actually changes anything, but keeping it simple for now
         #c is whether the chromosome is a or b, used for the mutaiton record
+        self.phenotype = None
         if record_muts:
             self.mut_record.append([c, gene.ident, result])
         val = result[(result.index(",") + 2)::]
@@ -888,8 +1501,14 @@ class Genome(object):
             val = float(val)
             gene.mut_rate += val
         elif result[0:3] == "Wei":
-            val = float(val)
-            gene.weight += val
+            if isinstance(gene, WeightBlockGene):
+                #"Weight, position in block, change"
+                idx, val = val.split(", ")
+                gene.weight = gene.weight.copy()
+                gene.weight[int(idx)] += float(val)
+            else:
+                val = float(val)
+                gene.weight += val
         #validation of this change is done at the mutate() function
         elif result[0:3] == "Dom":
             val = int(val)
@@ -900,10 +1519,7 @@ class Genome(object):
             if result[7] == "-":
                 gene.nodes -= int(result[8])
             else:
-                n_in = 0
-                for g in chro:
-                    if g.ident in gene.inputs:
-                        n_in += g.nodes
+                n_in = self.layer_graph(chro).inputs(gene)[0]
                 self.add_nodes(gene, chro, int(result[7]), self.weightchr_a,
                                n_in)
                 self.add_nodes(gene, chro, int(result[7]), self.weightchr_b,
@@ -914,18 +1530,20 @@ class Genome(object):
     def handle_duplication(self, gene, chro):
         """Handle duplication mutations.
         """
+        graph = self.layer_graph(chro)
         #first we make a new ident
         new_id = gene_ident()
         #then copy the gene
-        new_gene = copy.deepcopy(gene)
+        new_gene = copy_gene(gene)
         new_gene.ident = new_id
         #find index of gene, then stick new one in before that
-        chro.insert(chro.index(gene), new_gene)
+        graph.insert(graph.locate(gene), new_gene)
         #find a later gene that will use the new one as input
         out_gene = self.new_input(new_gene, chro)
-        out_gene.inputs.append(new_gene.ident)
+        out_gene = own_gene(chro, graph.locate(out_gene))
+        graph.add_input(out_gene, new_gene.ident)
         #then make the new weight genes
-        self.dup_weights(new_gene, out_gene, chro)
+        self.dup_weights(new_gene, out_gene, chro, gene)
 
     #helper function for handle_duplication
     def new_input(self, gene, chro):
@@ -934,56 +1552,112 @@ class Genome(object):
         after the new one.
         """
         potential = []
-        for g in chro[(chro.index(gene)+1):]:
+        pos = self.layer_graph(chro).locate(gene)
+        for g in chro[(pos + 1):]:
             if g.layer_type == "IP":
                 potential.append(g)
         return(potential[random.randint(0, len(potential)-1)])
 
     #helper function for handle_duplication
-    def dup_weights(self, new_gene, out_gene, chro):
+    def dup_weights(self, new_gene, out_gene, chro, parent=None):
         """Create the relevant new weight genes for a duplicated layer.
+
+        The genes are WeightBlockGenes (one per input node) if block_weights
+        is on, or if the weights of parent (the layer duplicated) are.
         """
-        new_weights = []
-        inputs = 0
-        in_dict = {}
-        out_inputs = new_gene.nodes
+        #columns of the new genes, added to each chromosome in one go
+        doms = []
+        idents = []
+        weights = []
+        in_nodes = []
+        out_nodes = []
+        in_layers = []
+        out_layers = []
+        graph = self.layer_graph(chro)
         #first we need to make weights from input -> new gene
-        for g in chro:
-            if g.ident in new_gene.inputs:
-                inputs += g.nodes
-                in_dict[g.ident] = g.nodes
-            if g.ident in out_gene.inputs:
-                out_inputs += g.nodes
+        inputs, in_dict = graph.inputs(new_gene)
+        out_inputs = new_gene.nodes + graph.inputs(out_gene)[0]
         #xavier weight initialization: mean = 0 variance=1/n inputs
         #gaussian distribution
         var = 1/inputs
         #we give this function the std, not var
         var = math.sqrt(var)
-        for layer in in_dict:
-            for i in range(in_dict[layer]):
-                for j in range(new_gene.nodes):
-                    weight = random.gauss(0, var)
-                    w = WeightGene(random.randint(1,5),
-                                   True, False, def_mut_rate, gene_ident(),
-                                   weight, i, j, layer, new_gene.ident)
-                    new_weights.append(w)
+        links = [(layer, in_dict[layer], new_gene.ident, new_gene.nodes, var)
+                 for layer in in_dict]
         #then from new gene -> the gene that now takes it as input
         var = 1/out_inputs
         var = math.sqrt(var)
-        for i in range(new_gene.nodes):
-            for j in range(out_gene.nodes):
-                weight = random.gauss(0, var)
-                w = WeightGene(random.randint(1,5),
-                               True, False, def_mut_rate,
-                               gene_ident(), weight, i, j,
-                               new_gene.ident, out_gene.ident)
-                new_weights.append(w)
+        links.append((new_gene.ident, new_gene.nodes, out_gene.ident,
+                      out_gene.nodes, var))
+        if self.uses_blocks(parent):
+            new_weights = []
+            for in_layer, ins, out_layer, outs, var in links:
+                for i in range(ins):
+                    new_weights.append(WeightBlockGene(
+                        random.randint(1, 5), True, False, def_mut_rate,
+                        gene_ident(), np_random.normal(0, var, outs), i, 0,
+                        in_layer, out_layer))
+            self.weightchr_a.extend(new_weights)
+            self.weightchr_b.extend(new_weights)
+            return
+        for in_layer, ins, out_layer, outs, var in links:
+            for i in range(ins):
+                for j in range(outs):
+                    weights.append(random.gauss(0, var))
+                    doms.append(random.randint(1,5))
+                    idents.append(gene_ident())
+                    in_nodes.append(i)
+                    out_nodes.append(j)
+                    in_layers.append(in_layer)
+                    out_layers.append(out_layer)
         #and lastly stick it all in the weight chromosome
         ###where?
         ###at end of both for now
-        for gene in new_weights:
-            self.weightchr_a.append(gene)
-            self.weightchr_b.append(gene)
+        n = len(weights)
+        new_weights = None
+        for weight_chr in [self.weightchr_a, self.weightchr_b]:
+            if isinstance(weight_chr, WeightChromosome):
+                weight_chr.extend_columns(
+                    n, dom=doms, can_mut=True, can_dup=False,
+                    mut_rate=def_mut_rate, ident=idents, weight=weights,
+                    in_node=in_nodes, out_node=out_nodes, alt_in=in_nodes,
+                    in_layer=in_layers, out_layer=out_layers)
+                continue
+            if new_weights is None:
+                new_weights = [WeightGene(dom, True, False, def_mut_rate,
+                                          ident, weight, i, j, in_layer,
+                                          out_layer)
+                               for dom, ident, weight, i, j, in_layer,
+                                   out_layer in zip(doms, idents, weights,
+                                                    in_nodes, out_nodes,
+                                                    in_layers, out_layers)]
+            weight_chr.extend(new_weights)
+
+    #helper function for dup_weights
+    def uses_blocks(self, layer=None):
+        """Return whether new weight genes for a layer should be
+        WeightBlockGenes: if block_weights is on, or if any weight gene to
+        or from the layer is one.
+
+        Raises ValueError if they should be but a weight chromosome is a
+        WeightChromosome, which cannot hold them.
+        """
+        blocks = block_weights
+        for weight_chr in [self.weightchr_a, self.weightchr_b]:
+            if blocks or layer is None:
+                break
+            if isinstance(weight_chr, WeightChromosome):
+                continue
+            for g in weight_chr:
+                if (isinstance(g, WeightBlockGene) and
+                        layer.ident in (g.in_layer, g.out_layer)):
+                    blocks = True
+                    break
+        if blocks and any(isinstance(weight_chr, WeightChromosome) for
+                          weight_chr in [self.weightchr_a, self.weightchr_b]):
+            raise ValueError("WeightChromosome cannot hold WeightBlockGenes "
+                             "(turn block_weights off for columnar genomes)")
+        return blocks
 
     #helper function for add_nodes
     #TODO: can I simplify this with the functions I just learned about?
@@ -991,13 +1665,7 @@ class Genome(object):
         """Return the total number of input layers to a layer gene
         and a dict of how many nodes each layer has.
         """
-        inputs = 0
-        in_dict = {}
-        for g in chro[:(chro.index(gene))]:
-            if g.ident in gene.inputs:
-                inputs += g.nodes
-                in_dict[g.ident] = g.nodes
-        return inputs, in_dict
+        return self.layer_graph(chro).inputs(gene, before=True)
                                
     #helper function for handle_mutation
     def add_nodes(self, gene, chro, new_nodes, weight_chr, n_in):
@@ -1015,20 +1683,44 @@ class Genome(object):
         out_dict = {}
         for layer in outs:
             out_dict[layer.ident] = layer
-        for g in reversed(weight_chr):
+        #new genes are collected first and spliced in all at once
+        #each batch goes after the first position of the gene it follows
+        batches = []
+        columnar = isinstance(weight_chr, WeightChromosome)
+        if columnar and block_weights:
+            raise ValueError("WeightChromosome cannot hold WeightBlockGenes "
+                             "(turn block_weights off for columnar genomes)")
+        if not columnar:
+            first = {}
+            for pos, g in enumerate(weight_chr):
+                first.setdefault(id(g), pos)
+        for pos in range(len(weight_chr) - 1, -1, -1):
+            g = weight_chr[pos]
             #outputs section
             #(where gene is the input for a given weight gene
             # and other layers are output)
             if g.in_layer == gene.ident and g.out_layer not in done_outs:
                 new = (gene.nodes + new_nodes - 1) - g.in_node
                 if new > 0:
-                    ind = weight_chr.index(g) + 1
+                    batch = []
+                    ind = pos if columnar else first[id(g)]
                     out_n = self.find_n_inputs(out_dict[g.out_layer],
                                                       chro)[0]
                     var = out_n/1
                     #we give this function the std, not var
                     var = math.sqrt(var)
+                    blocks = block_weights or isinstance(g, WeightBlockGene)
                     for i in range(new):
+                        if blocks:
+                            #one block per new input node
+                            w = np_random.normal(0, var,
+                                                 out_dict[g.out_layer].nodes)
+                            batch.append(WeightBlockGene(
+                                random.randint(1, 5), True, False,
+                                def_mut_rate, gene_ident(), w,
+                                (i + g.in_node + 1), 0, gene.ident,
+                                g.out_layer))
+                            continue
                         for j in range(out_dict[g.out_layer].nodes):
                             w = random.gauss(0, var)
                             weight = WeightGene(random.randint(1, 5), True,
@@ -1037,8 +1729,8 @@ class Genome(object):
                                                 w, (i + g.in_node + 1),
                                                 j, gene.ident,
                                                 g.out_layer)
-                            weight_chr.insert(ind, weight)
-                            ind += 1
+                            batch.append(weight)
+                    batches.append((ind + 1, batch))
                 done_outs.append(g.out_layer)
             #inputs section
             elif g.out_layer == gene.ident:
@@ -1046,9 +1738,27 @@ class Genome(object):
                     g.in_node in done_ins[g.in_layer]):
                     pass
                 else:
-                    new = (gene.nodes + new_nodes - 1) - g.out_node
-                    if new > 0:
-                        ind = weight_chr.index(g) + 1
+                    last_out = g.out_node
+                    if isinstance(g, WeightBlockGene):
+                        last_out += len(g.weight) - 1
+                    new = (gene.nodes + new_nodes - 1) - last_out
+                    if new > 0 and isinstance(g, WeightBlockGene):
+                        #blocks grow to cover the new output nodes
+                        var = math.sqrt(n_in/1)
+                        g = own_gene(weight_chr, pos)
+                        g.weight = numpy.concatenate(
+                            [g.weight, np_random.normal(0, var, new)])
+                    elif new > 0 and block_weights:
+                        var = math.sqrt(n_in/1)
+                        ind = pos if columnar else first[id(g)]
+                        batches.append((ind + 1, [WeightBlockGene(
+                            random.randint(1, 5), True, False, def_mut_rate,
+                            gene_ident(), np_random.normal(0, var, new),
+                            g.in_node, (g.out_node + 1), g.in_layer,
+                            gene.ident)]))
+                    elif new > 0:
+                        batch = []
+                        ind = pos if columnar else first[id(g)]
                         var = n_in/1
                         var = math.sqrt(var)
                         for i in range(new):
@@ -1058,12 +1768,20 @@ class Genome(object):
                                                 gene_ident(), w,
                                                 g.in_node, (i + g.out_node + 1),
                                                 g.in_layer, gene.ident)
-                            weight_chr.insert(ind, weight)
-                            ind += 1
+                            batch.append(weight)
+                        batches.append((ind + 1, batch))
                     if g.in_layer in done_ins.keys():
                         done_ins[g.in_layer].append(g.in_node)
                     else:
                         done_ins[g.in_layer] = [g.in_node]
+        #batches were made back to front; a later batch at the same spot
+        #goes in front of an earlier one (as inserting one by one would)
+        inserts = []
+        for ind, batch in reversed(batches):
+            for weight in batch:
+                inserts.append((ind, weight))
+        inserts.sort(key=lambda item: item[0])
+        insert_genes(weight_chr, inserts)
 
     #helper function for add_nodes
     #TODO: can I simplify this with the functions I just learned about?
@@ -1071,22 +1789,917 @@ class Genome(object):
         """Return a list of layers that a layer gene outputs to. Used when
         adding weights so that concat layers are traced to their outputs.
         """
-        out_list = []
-        concats = []
-        for g in chro:
-            if gene.ident in g.inputs:
-                if g.layer_type != "concat":
-                    out_list.append(g)
+        return self.layer_graph(chro).outputs(gene)
+
+    def layer_graph(self, chro):
+        """Return the LayerGraph of a layer chromosome, making a new one
+        if there is none or the chromosome has changed length.
+        """
+        graph = self.graphs.get(id(chro))
+        if (graph is None or graph.chro is not chro or
+                graph.length != len(chro)):
+            graph = LayerGraph(chro)
+            self.graphs[id(chro)] = graph
+        return graph
+
+#helper function for cross_weights
+def same_weights(chr_a, chr_b):
+    """Return whether two weight chromosomes have genes for the same
+    weights, in the same order.
+    """
+    if len(chr_a) != len(chr_b):
+        return False
+    if isinstance(chr_a, WeightChromosome) and \
+       isinstance(chr_b, WeightChromosome):
+        layers_a = numpy.array(chr_a.layers, dtype=object)
+        layers_b = numpy.array(chr_b.layers, dtype=object)
+        return bool((chr_a.in_node == chr_b.in_node).all() and
+                    (chr_a.out_node == chr_b.out_node).all() and
+                    (layers_a[chr_a.in_layer] ==
+                     layers_b[chr_b.in_layer]).all() and
+                    (layers_a[chr_a.out_layer] ==
+                     layers_b[chr_b.out_layer]).all())
+    for a, b in zip(chr_a, chr_b):
+        if (a.in_node != b.in_node or a.out_node != b.out_node or
+                a.in_layer != b.in_layer or a.out_layer != b.out_layer):
+            return False
+    return True
+
+def assemble_weights(parts):
+    """Return a weight chromosome made of the genes of other chromosomes.
+
+    parts: (chromosome, positions) pairs, in order
+    If every part is from a WeightChromosome, the result is a new one made
+    from copies of their arrays; otherwise it is a list of the genes.
+    alt_in is reset to in_node either way.
+    """
+    columnar = [isinstance(chro, WeightChromosome) for chro, positions in parts]
+    parts = [part for part in parts if len(part[1]) > 0]
+    if any(columnar) and all(isinstance(chro, WeightChromosome)
+                             for chro, positions in parts):
+        result = WeightChromosome.gather(parts)
+        result.alt_in[:] = result.in_node
+        return result
+    weights = []
+    for chro, positions in parts:
+        for pos in positions:
+            gene = chro[pos]
+            gene.alt_in = gene.in_node
+            weights.append(gene)
+    return weights
+
+def copy_gene(gene):
+    """Return a copy of a gene that can be changed without affecting the
+    original.
+    """
+    new = copy.copy(gene)
+    if isinstance(new, LayerGene):
+        new.inputs = list(new.inputs)
+    elif isinstance(new, WeightBlockGene):
+        new.weight = new.weight.copy()
+    return new
+
+def child_chromosome(chro):
+    """Return a crossed-over chromosome ready for a child: list chromosomes
+    become CowChromosomes, and WeightChromosomes (already copies of their
+    parents' arrays, see assemble_weights) are used as they are.
+    """
+    if isinstance(chro, WeightChromosome):
+        return chro
+    return CowChromosome(chro)
+
+def own_gene(chro, pos):
+    """Return the gene at pos in chro, made safe to change in place
+    if chro is a CowChromosome.
+    """
+    if isinstance(chro, CowChromosome):
+        return chro.own(pos)
+    return chro[pos]
+
+def insert_genes(chro, inserts):
+    """Insert genes into a chromosome with a single rebuild.
+
+    inserts: (position, gene) pairs, sorted by position; each gene goes
+    before the gene now at position (or at the end, for len(chro)).
+    """
+    if len(inserts) == 0:
+        return
+    if isinstance(chro, WeightChromosome):
+        chro.insert_many([pos for pos, gene in inserts],
+                         [gene for pos, gene in inserts])
+        return
+    result = []
+    k = 0
+    for pos in range(len(chro) + 1):
+        while k < len(inserts) and inserts[k][0] == pos:
+            result.append(inserts[k][1])
+            k += 1
+        if pos < len(chro):
+            result.append(chro[pos])
+    chro[:] = result
+
+class CowChromosome(list):
+    """Copy-on-write chromosome: a list of genes that starts out sharing its
+    genes with the chromosome it was made from.
+
+    A gene is only copied when it is about to be changed (see own()), so
+    making a child costs a list of references plus one copy per mutated gene.
+    A gene may be changed in place only while its owner is this chromosome's
+    token; share() takes a new token, so that genes handed on to a child
+    are copied by whichever side changes them first.
+    """
+
+    def __init__(self, genes=()):
+        super(CowChromosome, self).__init__(genes)
+        self.token = object()
+
+    def own(self, pos):
+        """Return the gene at pos, first swapping in a private copy of it
+        if it is (or may be) shared.
+        """
+        gene = self[pos]
+        if gene.owner is not self.token:
+            gene = copy_gene(gene)
+            gene.owner = self.token
+            self[pos] = gene
+        return gene
+
+    def share(self):
+        """Give up ownership of every gene, as they are about to be shared.
+        """
+        self.token = object()
+
+def sparse_hits(rates):
+    """Return the positions of the genes that mutate, in order, given each
+    gene's mutation rate (-1 if it cannot mutate), drawn from np_random.
+
+    Candidates are found by geometric skips at the highest rate, and each
+    is kept with odds of its rate over the highest, so every gene mutates
+    with odds of its own rate (as in Gene.mutate).
+    """
+    n = len(rates)
+    top = rates.max() if n > 0 else 0
+    if top <= 0:
+        return numpy.zeros(0, dtype=numpy.intp)
+    if top >= 1:
+        candidates = numpy.arange(n)
+    else:
+        chunks = []
+        last = -1
+        while last < n:
+            #enough skips to usually get past the end in one go
+            skips = np_random.geometric(top, int(n * top * 1.2) + 16)
+            found = last + numpy.cumsum(skips)
+            chunks.append(found[found < n])
+            last = found[-1]
+        candidates = numpy.concatenate(chunks)
+    keep = np_random.random(len(candidates)) * top < rates[candidates]
+    return candidates[keep]
+
+def batch_dom_changes(doms):
+    """Return an array of non-zero dominance changes, one per entry in doms,
+    that keep each dominance within 1~5.
+    """
+    changes = numpy.zeros(len(doms), dtype=numpy.int64)
+    todo = numpy.ones(len(doms), dtype=bool)
+    while todo.any():
+        draw = numpy.trunc(np_random.normal(0, 1, todo.sum())).astype(
+            numpy.int64)
+        changes[todo] = numpy.clip(draw, 1 - doms[todo], 5 - doms[todo])
+        todo = changes == 0
+    return changes
+
+def batch_rate_changes(rates):
+    """Return an array of non-zero mutation rate changes, one per entry in
+    rates, that keep each rate within (0, 1].
+    """
+    changes = numpy.zeros(len(rates))
+    todo = numpy.ones(len(rates), dtype=bool)
+    while todo.any():
+        draw = np_random.normal(0, sigma, todo.sum())
+        new = rates[todo] + draw
+        ok = (draw != 0) & (new <= 1) & (new > 0)
+        idx = numpy.flatnonzero(todo)[ok]
+        changes[idx] = draw[ok]
+        todo[idx] = False
+    return changes
+
+class LayerGraph(object):
+    """Index of the layers in a layer chromosome and how they connect, so
+    a layer's inputs and outputs can be found without scanning.
+
+    Holds positions rather than genes (genes can be swapped out when
+    copied on write), and reads node counts from the chromosome, so
+    only insert and add_input need to update it.
+    Crossover can leave several layer genes with the same ident, so
+    genes themselves are found by identity (see locate).
+    positions: ident: positions of the layer genes with that ident, in order
+    consumers: ident: idents of the layers that take it as an input
+    """
+
+    def __init__(self, chro):
+        self.chro = chro
+        #length of the chromosome as indexed
+        self.length = len(chro)
+        self.positions = {}
+        self.consumers = {}
+        for pos, g in enumerate(chro):
+            self.positions.setdefault(g.ident, []).append(pos)
+            for lay in set(g.inputs):
+                self.add_consumer(lay, g.ident)
+
+    #helper function for __init__, insert, and add_input
+    def add_consumer(self, ident, consumer):
+        """Note that layers with ident consumer take ident as an input.
+        """
+        consumers = self.consumers.setdefault(ident, [])
+        if consumer not in consumers:
+            consumers.append(consumer)
+
+    def locate(self, gene):
+        """Return the position of a layer gene in the chromosome.
+
+        If the gene itself is not there (e.g. it is a copy), the position
+        of the first gene with its ident is returned instead.
+        """
+        found = self.positions[gene.ident]
+        for pos in found:
+            if self.chro[pos] is gene:
+                return pos
+        return found[0]
+
+    def insert(self, pos, gene):
+        """Insert a layer gene into the chromosome before position pos.
+        """
+        for ident in self.positions:
+            self.positions[ident] = [p + 1 if p >= pos else p
+                                     for p in self.positions[ident]]
+        self.chro.insert(pos, gene)
+        self.length += 1
+        found = self.positions.setdefault(gene.ident, [])
+        found.append(pos)
+        found.sort()
+        for lay in set(gene.inputs):
+            self.add_consumer(lay, gene.ident)
+
+    def add_input(self, gene, ident):
+        """Add a new input layer to a layer gene.
+        """
+        gene.inputs.append(ident)
+        self.add_consumer(ident, gene.ident)
+
+    def inputs(self, gene, before=False):
+        """Return the total number of nodes in a layer gene's inputs, and
+        a dict of how many nodes each input has (in chromosome order).
+
+        An input ident is read from the first gene with it, or if before,
+        from the last gene with it before the gene (as Caffe would).
+        before: only count inputs that come before the gene
+        """
+        if before:
+            limit = self.locate(gene)
+        found = []
+        for lay in set(gene.inputs):
+            places = self.positions.get(lay, [])
+            if before:
+                places = [pos for pos in places if pos < limit][-1:]
+            if places:
+                found.append((places[0], lay))
+        found.sort()
+        total = 0
+        in_dict = {}
+        for pos, lay in found:
+            nodes = self.chro[pos].nodes
+            total += nodes
+            in_dict[lay] = nodes
+        return total, in_dict
+
+    def outputs(self, gene):
+        """Return the layer genes that take a layer gene as input, in
+        chromosome order, tracing concat layers through to their outputs.
+        """
+        found = []
+        for pos, g in self.consumer_genes(gene.ident):
+            if g.layer_type != "concat":
+                found.append((pos, g))
+                continue
+            for out_pos, out in self.consumer_genes(g.ident):
+                #(only layers after the concat)
+                if out_pos > pos:
+                    found.append((out_pos, out))
+        found.sort(key=lambda x: x[0])
+        return [g for pos, g in found]
+
+    #helper function for outputs
+    def consumer_genes(self, ident):
+        """Return (position, gene) for each layer gene that takes ident as
+        an input.
+        """
+        found = []
+        for consumer in self.consumers.get(ident, []):
+            for pos in self.positions.get(consumer, []):
+                g = self.chro[pos]
+                if ident in g.inputs:
+                    found.append((pos, g))
+        return found
+
+class WeightIndex(object):
+    """Index over a weight chromosome, so genes can be found by the weight
+    they define instead of by scanning the chromosome.
+
+    keys: (in_layer, out_layer, in_node, out_node) of each gene, in order
+    genes: (in_layer, out_layer, in_node, out_node): position
+    rows: (in_layer, out_layer, in_node): position of the first such gene
+    segments: (in_layer, out_layer): [start, end) positions of the genes
+    """
+
+    def __init__(self, chro):
+        self.keys = []
+        self.genes = {}
+        self.rows = {}
+        self.segments = {}
+        if isinstance(chro, WeightChromosome):
+            layers = chro.layers
+            keys = zip([layers[i] for i in chro.in_layer.tolist()],
+                       [layers[i] for i in chro.out_layer.tolist()],
+                       chro.in_node.tolist(), chro.out_node.tolist())
+        else:
+            keys = ((g.in_layer, g.out_layer, g.in_node, g.out_node)
+                    for g in chro)
+        for pos, key in enumerate(keys):
+            self.keys.append(key)
+            self.genes.setdefault(key, pos)
+            self.rows.setdefault(key[:3], pos)
+            seg = self.segments.get(key[:2])
+            if seg is None:
+                self.segments[key[:2]] = [pos, pos + 1]
+            else:
+                seg[1] = pos + 1
+
+    def find(self, in_layer, out_layer, in_node, out_node):
+        """Return the position of the gene for a weight, or None.
+        """
+        return self.genes.get((in_layer, out_layer, in_node, out_node))
+
+    def uneven(self, other):
+        """Return the set of (in_layer, out_layer) pairs that both this
+        index and another have genes for, but not for the same weights.
+        """
+        nodes = {}
+        for key in self.genes:
+            nodes.setdefault(key[:2], set()).add(key[2:])
+        other_nodes = {}
+        for key in other.genes:
+            other_nodes.setdefault(key[:2], set()).add(key[2:])
+        return set(seg for seg in nodes
+                   if seg in other_nodes and nodes[seg] != other_nodes[seg])
+
+class WeightBuffer(object):
+    """Collects weight changes for a network so that each layer's weights
+    are written with a single indexed assignment instead of one at a time.
+
+    Stands in for the net in Genome.adjust_weight; call flush() to write.
+    """
+
+    def __init__(self, net):
+        self.net = net
+        #output layer: [[out nodes], [in nodes], [weights]]
+        self.changes = {}
+
+    def add(self, values):
+        """Queue the weight change(s) in values, formatted as for
+        Genome.adjust_weight.
+        """
+        for k in range(0, len(values), 5):
+            output = values[k + 2]
+            if output not in self.changes:
+                self.changes[output] = [[], [], []]
+            change = self.changes[output]
+            weight = values[k + 4]
+            if isinstance(weight, numpy.ndarray):
+                #a block, from out_node on
+                n = len(weight)
+                change[0].extend(range(values[k + 3], values[k + 3] + n))
+                change[1].extend([values[k + 1]] * n)
+                change[2].extend(weight.tolist())
+            else:
+                change[0].append(values[k + 3])
+                change[1].append(values[k + 1])
+                change[2].append(weight)
+
+    def flush(self):
+        """Write all queued changes to the network.
+        """
+        for output in self.changes:
+            data = self.net.params[output][0].data
+            outs = numpy.array(self.changes[output][0], dtype=numpy.intp)
+            ins = numpy.array(self.changes[output][1], dtype=numpy.intp)
+            weights = numpy.array(self.changes[output][2], dtype=data.dtype)
+            #(blocks can run past the end of a layer)
+            fits = outs < data.shape[0]
+            if not fits.all():
+                outs = outs[fits]
+                ins = ins[fits]
+                weights = weights[fits]
+            #if the same weight was changed more than once, the last one wins
+            #(as it would if written one at a time)
+            flat = outs * data.shape[1] + ins
+            last = numpy.unique(flat[::-1], return_index=True)[1]
+            keep = len(flat) - 1 - last
+            data[outs[keep], ins[keep]] = weights[keep]
+            profile_count("build_weights", nbytes=len(keep) * data.itemsize)
+        self.changes = {}
+
+def concat_offsets(concat_dict):
+    """Return a dict of (in_layer, out_layer): offset of the in_layer's
+    nodes within the concat layer that feeds out_layer.
+
+    Layers that come first in their concat (offset 0) are left out.
+    """
+    offsets = {}
+    for key in concat_dict:
+        ins, nodes, outs = concat_dict[key][0:3]
+        seen = set()
+        for i in range(len(ins)):
+            #a layer listed twice uses its first place
+            if i > 0 and ins[i] not in seen:
+                off = sum(nodes[:i])
+                for out_layer in outs:
+                    offsets[(ins[i], out_layer)] = off
+            seen.add(ins[i])
+    return offsets
+
+def live_layers(layout, outs):
+    """Return the idents of the layers in a layout that the layers in outs
+    depend on, directly or through other layers (outs included).
+    """
+    inputs = {}
+    for gene in layout:
+        if gene.ident != "null":
+            inputs.setdefault(gene.ident, []).extend(gene.inputs)
+    live = set()
+    stack = [o for o in outs if o in inputs]
+    while stack:
+        ident = stack.pop()
+        if ident not in live:
+            live.add(ident)
+            stack.extend(inputs.get(ident, []))
+    return live
+
+def layout_key(layout):
+    """Return a hash of an expressed layout (as made by structure_network)
+    that is the same for any two layouts that build the same network.
+    """
+    parts = []
+    for gene in layout:
+        parts.append((gene.ident, gene.layer_type, gene.nodes,
+                      tuple(gene.inputs)))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def reset_params(net):
+    """Give a network fresh weights, as Caffe does for a new network:
+    xavier weights and zero biases.
+    """
+    for key in net.params:
+        params = net.params[key]
+        d = params[0].data
+        scale = math.sqrt(3.0 / d.shape[1])
+        d[...] = np_random.uniform(-scale, scale, d.shape)
+        if len(params) > 1:
+            params[1].data[...] = 0
+
+class TemplateCache(object):
+    """Cache of network definitions keyed by layout_key, plus a pool
+    of solvers handed back with release() that can be reused.
+
+    Each solver's state is saved (with Solver.snapshot) when it is made,
+    and a reused solver that has been stepped is restored from it, so it
+    starts again from iteration 0 with no AdaDelta history; then it gets
+    fresh weights (see reset_params), as a new solver would. The snapshots
+    are kept in a temporary directory (in build_tmp_dir) until clear().
+    max_pool: most solvers kept per layout
+    """
+
+    def __init__(self, max_pool=8):
+        self.max_pool = max_pool
+        #key: [network text, concat_dict]
+        self.templates = {}
+        #key: [free (solver, snapshot prefix) pairs]
+        self.pools = {}
+        #id(solver): (key, snapshot prefix), for solvers that are in use
+        self.owners = {}
+        #directory for the snapshots, made when first needed
+        self.state_dir = None
+        self.made = 0
+        self.hits = 0
+        self.misses = 0
+
+    @timed("net_text")
+    def template(self, key, layout, active_list):
+        """Return the network text and a fresh copy of the concat_dict for
+        a layout, generating them the first time the layout is seen.
+        """
+        if key in self.templates:
+            self.hits += 1
+        else:
+            self.misses += 1
+            concat_dict = {}
+            text = ""
+            for gene in layout:
+                text += gene.read_out(concat_dict, active_list)
+            self.templates[key] = [text, concat_dict]
+        text, concat_dict = self.templates[key]
+        return text, copy.deepcopy(concat_dict)
+
+    @timed("acquire_solver")
+    def acquire(self, key, text):
+        """Return a solver for the network text, reusing a released one for
+        the same layout if there is one.
+        """
+        pool = self.pools.get(key)
+        if pool:
+            solver, prefix = pool.pop()
+            if solver.iter > 0:
+                solver.restore(prefix + "_iter_0.solverstate")
+            reset_params(solver.net)
+        else:
+            if self.state_dir is None:
+                self.state_dir = tempfile.mkdtemp(dir=build_tmp_dir)
+            prefix = os.path.join(self.state_dir, str(self.made))
+            self.made += 1
+            solver = Genome.make_solver(dedent(solv_inline).format(text) +
+                                        'snapshot_prefix: "' + prefix + '"\n')
+            solver.snapshot()
+        self.owners[id(solver)] = (key, prefix)
+        return solver
+
+    def release(self, solver):
+        """Hand back a solver that is no longer needed so later builds of
+        the same layout can reuse it.
+        """
+        owner = self.owners.pop(id(solver), None)
+        if owner is None:
+            return
+        key, prefix = owner
+        pool = self.pools.setdefault(key, [])
+        if len(pool) < self.max_pool:
+            pool.append((solver, prefix))
+        else:
+            for ext in [".solverstate", ".caffemodel"]:
+                os.remove(prefix + "_iter_0" + ext)
+
+    def clear(self):
+        """Empty the cache (and delete the snapshots).
+        """
+        self.templates = {}
+        self.pools = {}
+        self.owners = {}
+        if self.state_dir is not None:
+            shutil.rmtree(self.state_dir, ignore_errors=True)
+            self.state_dir = None
+
+class Phenotype(object):
+    """Expressed form of a genome, as made by Genome.express.
+
+    layout, active_list, sub_dict, concat_dict: as used to build the network
+    weights: IP layer ident: weight array (output nodes x input nodes)
+    key: layout_key of the layout
+    """
+
+    def __init__(self, layout, active_list, sub_dict, concat_dict, weights):
+        self.layout = layout
+        self.active_list = active_list
+        self.sub_dict = sub_dict
+        self.concat_dict = concat_dict
+        self.weights = weights
+        self.key = layout_key(layout)
+
+class NumpyBlob(object):
+    """Array holder standing in for a Caffe blob.
+    """
+
+    def __init__(self, shape):
+        self.data = numpy.zeros(shape, dtype=numpy.float32)
+
+class NumpyNet(object):
+    """Forward-only network in NumPy, standing in for a Caffe net.
+
+    Made from an expressed layout (see Genome.build_numpy), with the same
+    layer, blob, and param names the Caffe network would have, so weights
+    can be set the same way. Supports input, IP (InnerProduct), concat, and
+    loss (EuclideanLoss) layers.
+    weights: optional dict of IP layer: weight array to start from,
+    instead of random weights
+    """
+
+    def __init__(self, layout, concat_dict, weights=None):
+        #set by Genome.build_numpy; nets with the same key can be run
+        #together by a PopulationNet
+        self.layout_key = None
+        self.blobs = {}
+        self.params = {}
+        self._layer_names = []
+        self._blob_names = []
+        #(layer type, [bottom names], top name) for each layer, in order
+        self.layers = []
+        self._bottoms = []
+        #concat layer for each layer with more than one input
+        #(layers with the same inputs share one, as in LayerGene.read_out)
+        concat_for = {}
+        for key in concat_dict:
+            for out_layer in concat_dict[key][2]:
+                concat_for[out_layer] = key
+        for gene in layout:
+            if gene.layer_type == "input":
+                self.blobs[gene.ident] = NumpyBlob((1, gene.nodes))
+                self._blob_names.append(gene.ident)
+            elif gene.layer_type == "loss":
+                self.add_layer("loss", gene.ident, list(gene.inputs[0:2]), ())
+            elif gene.layer_type == "IP":
+                bottom = gene.inputs[0]
+                if len(gene.inputs) > 1:
+                    bottom = concat_for[gene.ident]
+                    if bottom not in self.blobs:
+                        ins = concat_dict[bottom][0]
+                        width = sum(self.blobs[b].data.shape[1] for b in ins)
+                        self.add_layer("concat", bottom, list(ins),
+                                       (1, width))
+                self.add_layer("IP", gene.ident, [bottom], (1, gene.nodes))
+                fan_in = self.blobs[bottom].data.shape[1]
+                params = NumpyBlob((gene.nodes, fan_in))
+                if weights is not None:
+                    params.data[...] = weights[gene.ident]
+                else:
+                    #xavier weights and zero biases, as in layer_dict
+                    scale = math.sqrt(3.0 / fan_in)
+                    params.data[...] = np_random.uniform(-scale, scale,
+                                                         params.data.shape)
+                self.params[gene.ident] = [params, NumpyBlob((gene.nodes,))]
+            else:
+                raise ValueError("layer type not supported by NumpyNet: " +
+                                 str(gene.layer_type))
+        #outputs are the blobs no layer takes as input
+        used = set()
+        for kind, bottoms, top in self.layers:
+            used.update(bottoms)
+        self.outputs = [b for b in self._blob_names if b not in used]
+
+    #helper function for __init__
+    def add_layer(self, kind, name, bottoms, shape):
+        """Add a layer (and its top blob, of the given shape).
+        """
+        self._layer_names.append(name)
+        self._bottoms.append([self._blob_names.index(b) for b in bottoms])
+        self.layers.append((kind, bottoms, name))
+        self.blobs[name] = NumpyBlob(shape)
+        self._blob_names.append(name)
+
+    def _bottom_ids(self, i):
+        """Return the blob indexes of the inputs of layer i.
+        """
+        return list(self._bottoms[i])
+
+    def forward(self, **inputs):
+        """Run the network forward and return a dict of the output blobs'
+        data.
+
+        inputs: data for input blobs, by name; arrays of shape
+        (batch, nodes) run a whole batch at once.
+        """
+        for name in inputs:
+            data = numpy.asarray(inputs[name], dtype=numpy.float32)
+            self.blobs[name].data = data.reshape(-1,
+                                                 self.blobs[name].data.shape[-1])
+        for kind, bottoms, top in self.layers:
+            ins = [self.blobs[b].data for b in bottoms]
+            if kind == "IP":
+                weights, bias = self.params[top]
+                out = ins[0] @ weights.data.T + bias.data
+            elif kind == "concat":
+                out = numpy.concatenate(ins, axis=1)
+            else:
+                out = numpy.float32(((ins[0] - ins[1]) ** 2).sum() /
+                                    (2 * len(ins[0])))
+            self.blobs[top].data = out
+        return {name: self.blobs[name].data for name in self.outputs}
+
+class PopulationNet(object):
+    """Runs the forward pass of many NumpyNets at once.
+
+    Nets with the same layout_key are grouped, their IP weights stacked into
+    3-D arrays, and each group run with one batched matmul per layer.
+    Nets without a layout_key are each run in a group of their own.
+    Call refresh() after changing any net's weights.
+    """
+
+    def __init__(self, nets):
+        self.nets = list(nets)
+        #key: [indexes into nets]
+        self.groups = {}
+        for i, net in enumerate(self.nets):
+            key = net.layout_key
+            if key is None:
+                key = ("net", i)
+            self.groups.setdefault(key, []).append(i)
+        #key: {IP layer: (weights (nets, out, in), biases (nets, 1, out))}
+        self.stacks = {}
+        self.refresh()
+
+    @classmethod
+    def from_genomes(cls, genomes):
+        """Return a PopulationNet for the NumpyNets of a list of genomes.
+        """
+        return cls([genome.build_numpy() for genome in genomes])
+
+    def refresh(self):
+        """Restack the weights of every group from its nets.
+        """
+        for key, members in self.groups.items():
+            first = self.nets[members[0]]
+            stack = {}
+            for name in first.params:
+                weights = numpy.stack([self.nets[i].params[name][0].data
+                                       for i in members])
+                biases = numpy.stack([self.nets[i].params[name][1].data
+                                      for i in members])
+                stack[name] = (weights, biases[:, numpy.newaxis, :])
+            self.stacks[key] = stack
+
+    def forward(self, **inputs):
+        """Run every net forward and return a list with the dict of output
+        blob data for each net, as NumpyNet.forward would.
+
+        inputs: for each input blob, a sequence with one input per net
+        (in the same order as nets). Output blobs are also left in each
+        net's blobs.
+        """
+        results = [None] * len(self.nets)
+        for key, members in self.groups.items():
+            first = self.nets[members[0]]
+            stack = self.stacks[key]
+            data = {}
+            tops = set(top for kind, bottoms, top in first.layers)
+            for name in first._blob_names:
+                if name in tops:
+                    continue
+                #inputs not given keep what is in each net's blob
+                if name in inputs:
+                    rows = [inputs[name][i] for i in members]
                 else:
-                    concats.append(g.ident)
-            for c in concats:
-                if c in g.inputs:
-                    out_list.append(g)
-        return out_list
+                    rows = [self.nets[i].blobs[name].data for i in members]
+                rows = [numpy.asarray(row, dtype=numpy.float32)
+                        for row in rows]
+                data[name] = numpy.stack(rows).reshape(len(members), 1, -1)
+            for kind, bottoms, top in first.layers:
+                ins = [data[b] for b in bottoms]
+                if kind == "IP":
+                    weights, biases = stack[top]
+                    out = numpy.matmul(ins[0], weights.transpose(0, 2, 1))
+                    out += biases
+                elif kind == "concat":
+                    out = numpy.concatenate(ins, axis=2)
+                else:
+                    out = ((ins[0] - ins[1]) ** 2).sum(axis=(1, 2)) / 2
+                data[top] = out
+            for k, i in enumerate(members):
+                net = self.nets[i]
+                result = {}
+                for name in first.outputs:
+                    net.blobs[name].data = data[name][k]
+                    result[name] = data[name][k]
+                results[i] = result
+        return results
+
+class IdentAllocator(object):
+    """Hands out unique 64-bit integer IDs: a namespace for each process in
+    the high 32 bits and a counter in the low bits.
+
+    The namespace is ident_run in its top 10 bits over the process ID (below
+    2**22 on Linux), so no two processes running at once share one. Separate
+    runs with the same process ID (PID 1 in a container, or a recycled PID)
+    do share one, so the IDs in genomes loaded with Genome.load or
+    LineageArchive.load are reserved (see reserve_idents) and never handed
+    out again; load saved genomes before making new ones, or give runs
+    whose genomes will be mixed different ident_runs.
+    IDs are taken in blocks and only turned into strings when asked for.
+    """
+
+    letters = numpy.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    #26**14 > 2**64, so every ID fits in 14 letters
+    width = 14
+
+    def __init__(self, block=4096):
+        self.block = block
+        self.pid = None
+        self.run = None
+        self.namespace = 0
+        #namespace: next counter, so going back to a run never reuses IDs
+        self.counters = {}
+        #rendered IDs waiting to be handed out by next_ident
+        self.ready = []
+
+    def take(self, n):
+        """Return an array of n new IDs.
+        """
+        #a new process (e.g. a forked worker) must not reuse our IDs
+        if self.pid != os.getpid() or self.run != ident_run:
+            if not 0 <= ident_run < 2**10:
+                raise ValueError("ident_run must be from 0 to 1023")
+            if self.pid != os.getpid():
+                self.counters = {}
+            self.pid = os.getpid()
+            self.run = ident_run
+            self.namespace = (ident_run << 22) | (self.pid % 2**22)
+            self.ready = []
+        counter = max(self.counters.get(self.namespace, 0),
+                      ident_reserved.get(self.namespace, 0))
+        if counter + n > 2**32:
+            raise ValueError("no IDs left in namespace " +
+                             str(self.namespace))
+        self.counters[self.namespace] = counter + n
+        start = (self.namespace << 32) | counter
+        return numpy.arange(start, start + n, dtype=numpy.uint64)
+
+    def render(self, ids):
+        """Return an array of the letter strings for an array of IDs.
+        """
+        ids = numpy.array(ids, dtype=numpy.uint64)
+        digits = numpy.empty((len(ids), self.width), dtype=numpy.intp)
+        for k in range(self.width - 1, -1, -1):
+            digits[:, k] = ids % 26
+            ids //= 26
+        letters = numpy.ascontiguousarray(self.letters[digits])
+        return letters.view("U" + str(self.width)).ravel()
+
+    def parse(self, idents):
+        """Return an array of the IDs of those idents that are in the form
+        render makes.
+        """
+        idents = numpy.array(idents, dtype=str)
+        idents = idents[numpy.char.str_len(idents) == self.width]
+        codes = idents.astype("U" + str(self.width)).view(numpy.uint32)
+        digits = codes.reshape(len(idents), self.width).astype(numpy.int64)
+        digits -= ord("A")
+        digits = digits[((digits >= 0) & (digits < 26)).all(axis=1)]
+        ids = numpy.zeros(len(digits), dtype=numpy.uint64)
+        for k in range(self.width):
+            ids = ids * numpy.uint64(26) + digits[:, k].astype(numpy.uint64)
+        return ids
+
+    def next_ident(self):
+        """Return one new ID as a string (rendered a block at a time).
+        """
+        if len(self.ready) == 0 or self.pid != os.getpid() or \
+           self.run != ident_run:
+            self.ready = self.render(self.take(self.block)).tolist()
+            self.ready.reverse()
+        return self.ready.pop()
+
+#toggles taking gene and network IDs from ident_allocator instead of
+#random letters/digits (faster and collision-free, but longer)
+fast_idents = False
+
+#run number (0 to 1023) in the namespace of ident_allocator's IDs
+#runs whose genomes may be mixed need different ones
+ident_run = 0
+
+#namespace: first counter ident_allocator may use in it, past the IDs of
+#loaded genomes (see reserve_idents)
+ident_reserved = {}
+
+ident_allocator = IdentAllocator()
+
+def reserve_idents(genome):
+    """Keep ident_allocator from handing out any ID a genome already has
+    (e.g. one saved by an earlier run with the same process ID).
+    """
+    idents = []
+    for chro in [genome.layerchr_a, genome.layerchr_b]:
+        idents.extend(gene.ident for gene in chro)
+    ids = ident_allocator.parse(idents)
+    for chro in [genome.weightchr_a, genome.weightchr_b]:
+        if isinstance(chro, WeightChromosome):
+            idents = chro.ident
+        else:
+            idents = [gene.ident for gene in chro]
+        if len(idents) > 0:
+            ids = numpy.concatenate([ids, ident_allocator.parse(idents)])
+    if len(ids) == 0:
+        return
+    namespaces = ids >> numpy.uint64(32)
+    counters = ids & numpy.uint64(2**32 - 1)
+    for namespace in numpy.unique(namespaces).tolist():
+        top = int(counters[namespaces == namespace].max()) + 1
+        if top > ident_reserved.get(namespace, 0):
+            ident_reserved[namespace] = top
+            #drop rendered IDs that may now be reserved
+            ident_allocator.ready = []
 
 def network_ident():
     """Return a string that becomes a network's unique ID.
     """
+    if fast_idents:
+        return "T" + format(int(ident_allocator.take(1)[0]), "016X")
     ident = ""
     while len(ident) != 11:
         if len(ident) == 3 or len(ident) == 7:
@@ -1104,8 +2717,11 @@ class Gene(object):
     can_dup: can it be duplicated? (bool)
     mut_rate: mutation rate (float)
     ident: gene ID (str)
+    owner: token of the CowChromosome that may change it in place, if any
     """
 
+    owner = None
+
     def __init__(self, dom, can_mut, can_dup, mut_rate, ident):
         self.dom = dom
         self.can_mut = can_mut
@@ -1131,10 +2747,22 @@ class Gene(object):
         raise NotImplementedError
         
     
+def gene_idents(n):
+    """Return a list of n gene identifiers, made in one pass if
+    fast_idents is on.
+    """
+    if fast_idents:
+        return ident_allocator.render(ident_allocator.take(n)).tolist()
+    return [gene_ident() for i in range(n)]
+
 def gene_ident():
     """Generate a six-character alphabetical string to use as
     a gene identifier.
+
+    (Fourteen characters, and unique, if fast_idents is on.)
     """
+    if fast_idents:
+        return ident_allocator.next_ident()
     letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
     ident = ""
     while len(ident) < 6:
@@ -1231,25 +2859,27 @@ class LayerGene(Gene):
                 #checking to see if any of the current concat layers
                 #contain all of the inputs for this layer
                 #(so we don't have to create a new one)
-                #TODO: do we need to sort these?
-                if self.inputs == concat_dict[key][0]:
+                #order does not matter, as weight offsets come from the
+                #concat's own order (see concat_offsets)
+                if sorted(self.inputs) == sorted(concat_dict[key][0]):
                 #if so, then add this layer as an output
                     concat_dict[key][2].append(self.ident)
-                    in_con == key
+                    in_con = key
                     break
                 #else, need to make a new concat layer, and hence new entry
+            result = ""
             if in_con == None:
-                k = gene_ident()
-                in_con = k
+                in_con = gene_ident()
                 in_nodes = []
                 for lay in self.inputs:
                     in_nodes.append(active_list[lay])
-                concat_dict[k] = [self.inputs, in_nodes, [self.ident]]
-            #print the concat layer first
-            result = dedent(layer_dict["concat_0"].format(k)) + "\n"
-            for lay in self.inputs:
-                result += "  bottom: \"" + lay + "\"\n"
-            result += dedent(layer_dict["concat_1"].format(k))
+                concat_dict[in_con] = [list(self.inputs), in_nodes,
+                                       [self.ident]]
+                #print the concat layer first
+                result = dedent(layer_dict["concat_0"].format(in_con)) + "\n"
+                for lay in self.inputs:
+                    result += "  bottom: \"" + lay + "\"\n"
+                result += dedent(layer_dict["concat_1"].format(in_con))
             x = self.inputs
             #now this layer
             self.inputs = [in_con]
@@ -1340,6 +2970,8 @@ class WeightGene(Gene):
 
         Overrides read from base gene class. 
         """
+        if isinstance(other_gene, WeightBlockGene):
+            return other_gene.read(active_list, sub_dict, self)
         #first check that input and output are in dict (inc. node #) for both
         #if both there, but if only one can be read, read that
         #first check if they can be read
@@ -1407,6 +3039,15 @@ class WeightGene(Gene):
                         self.weight, o_in_lay, other_gene.alt_in,
                         o_out_lay, other_gene.out_node, other_gene.weight]
 
+    #helper function for read
+    def values(self, sub_dict):
+        """Return this gene's weight change, formatted as for
+        Genome.adjust_weight.
+        """
+        in_lay = sub_dict.get(self.in_layer, self.in_layer)
+        out_lay = sub_dict.get(self.out_layer, self.out_layer)
+        return [in_lay, self.alt_in, out_lay, self.out_node, self.weight]
+
     def can_read(self, active_list, sub_dict):
         """Return whether this gene defines an existing weight in the network.
         """
@@ -1471,6 +3112,391 @@ class WeightGene(Gene):
         return result
 
 
+class WeightBlockGene(WeightGene):
+    """Defines a block of weights in the Caffe network: those from in_node
+    to out_node and the output nodes after it, with one dominance and
+    mutation rate for the whole block.
+
+    weight: NumPy array of weights, the first for out_node
+    Only for list weight chromosomes: WeightChromosomes raise ValueError
+    for them, as do block_weights and columnar genomes together.
+    """
+
+    def __init__(self, dom, can_mut, can_dup, mut_rate, ident, weight, in_node,
+                 out_node, in_layer, out_layer):
+        super(WeightBlockGene, self).__init__(dom, can_mut, can_dup, mut_rate,
+                                              ident, numpy.array(
+                                                  weight, dtype=numpy.float64),
+                                              in_node, out_node, in_layer,
+                                              out_layer)
+
+    def read(self, active_list, sub_dict, other_gene=None):
+        """Return the weights to use from this gene, other_gene, or both.
+
+        Blocks that start at the same weight are combined: where both cover
+        a weight, the more dominant one is used (or the average, if they
+        co-dominate), and any extra weights of the longer one are kept.
+        Overrides read from WeightGene.
+        """
+        self_read = self.can_read(active_list, sub_dict)
+        other_read = (other_gene is not None and
+                      other_gene.can_read(active_list, sub_dict))
+        if not self_read and not other_read:
+            return None
+        if not other_read:
+            return self.values(sub_dict)
+        if not self_read:
+            return other_gene.values(sub_dict)
+        mine = self.values(sub_dict)
+        other = other_gene.values(sub_dict)
+        if (mine[0] != other[0] or mine[2] != other[2] or
+                self.in_node != other_gene.in_node or
+                self.out_node != other_gene.out_node):
+            #reading both if not same
+            return other + mine
+        own_w = numpy.atleast_1d(self.weight)
+        other_w = numpy.atleast_1d(other_gene.weight)
+        if len(own_w) >= len(other_w):
+            merged = own_w.astype(numpy.float64)
+        else:
+            merged = other_w.astype(numpy.float64)
+        n = min(len(own_w), len(other_w))
+        if self.dom > other_gene.dom:
+            merged[:n] = own_w[:n]
+        elif self.dom < other_gene.dom:
+            merged[:n] = other_w[:n]
+        else:
+            merged[:n] = (own_w[:n] + other_w[:n]) / 2
+        return mine[0:4] + [merged]
+
+    def determine_mutation(self):
+        """Return the result from a mutation event.
+
+        A weight mutation changes one weight in the block, and is given as
+        "Weight, position in block, change".
+        """
+        result = super(WeightBlockGene, self).determine_mutation()
+        if result[0:3] == "Wei":
+            idx = random.randrange(len(self.weight))
+            result = "Weight, " + str(idx) + result[6:]
+        return result
+
+
+#helper for WeightGeneView
+def _view_field(name):
+    """Return a property that reads and writes one array of a
+    WeightChromosome at the view's position.
+    """
+    def get(self):
+        return getattr(self._chro, name)[self._pos].item()
+    def set(self, value):
+        getattr(self._chro, name)[self._pos] = value
+    return property(get, set)
+
+
+class WeightGeneView(WeightGene):
+    """A WeightGene-compatible view onto one position of a WeightChromosome.
+
+    Getting or setting an attribute reads or writes the chromosome's arrays.
+    Copying a view returns an independent WeightGene.
+    """
+
+    def __init__(self, chro, pos):
+        self._chro = chro
+        self._pos = pos
+
+    dom = _view_field("dom")
+    can_mut = _view_field("can_mut")
+    can_dup = _view_field("can_dup")
+    mut_rate = _view_field("mut_rate")
+    weight = _view_field("weight")
+    in_node = _view_field("in_node")
+    out_node = _view_field("out_node")
+    alt_in = _view_field("alt_in")
+
+    @property
+    def ident(self):
+        return str(self._chro.ident[self._pos])
+
+    @ident.setter
+    def ident(self, value):
+        self._chro.set_ident(self._pos, value)
+
+    @property
+    def in_layer(self):
+        return self._chro.layers[self._chro.in_layer[self._pos]]
+
+    @in_layer.setter
+    def in_layer(self, value):
+        self._chro.in_layer[self._pos] = self._chro.intern(value)
+
+    @property
+    def out_layer(self):
+        return self._chro.layers[self._chro.out_layer[self._pos]]
+
+    @out_layer.setter
+    def out_layer(self, value):
+        self._chro.out_layer[self._pos] = self._chro.intern(value)
+
+    def to_gene(self):
+        """Return a standalone WeightGene with the same values as this view.
+        """
+        gene = WeightGene(self.dom, self.can_mut, self.can_dup, self.mut_rate,
+                          self.ident, self.weight, self.in_node, self.out_node,
+                          self.in_layer, self.out_layer)
+        gene.alt_in = self.alt_in
+        return gene
+
+    def __copy__(self):
+        return self.to_gene()
+
+    def __deepcopy__(self, memo):
+        return self.to_gene()
+
+
+class WeightChromosome(object):
+    """Weight chromosome stored as parallel NumPy arrays rather than as a
+    list of WeightGene objects.
+
+    Supports the list operations the Genome uses (indexing, iteration, len,
+    append, insert, index, del); single items are returned as WeightGeneViews.
+    layers: intern table of layer IDs; in_layer/out_layer hold indexes into it.
+    """
+
+    #(array name, dtype) for every per-gene value except ident
+    fields = (("dom", numpy.int8), ("can_mut", numpy.bool_),
+              ("can_dup", numpy.bool_), ("mut_rate", numpy.float64),
+              ("weight", numpy.float64), ("in_node", numpy.int32),
+              ("out_node", numpy.int32), ("alt_in", numpy.int32),
+              ("in_layer", numpy.int32), ("out_layer", numpy.int32))
+
+    def __init__(self, genes=None):
+        self.layers = []
+        self.layer_index = {}
+        for name, dtype in self.fields:
+            setattr(self, name, numpy.zeros(0, dtype=dtype))
+        self.ident = numpy.zeros(0, dtype="U6")
+        if genes is not None:
+            self.extend(genes)
+
+    def intern(self, layer):
+        """Return the index of a layer ID in the intern table, adding it
+        if necessary.
+        """
+        if layer not in self.layer_index:
+            self.layer_index[layer] = len(self.layers)
+            self.layers.append(layer)
+        return self.layer_index[layer]
+
+    def set_ident(self, pos, ident):
+        """Set the ident at pos, widening the ident array if needed.
+        """
+        if len(ident) > self.ident.itemsize // 4:
+            self.ident = self.ident.astype("U" + str(len(ident)))
+        self.ident[pos] = ident
+
+    def _arrays_for(self, genes):
+        """Return a dict of new arrays (one per field) holding genes' values.
+        """
+        genes = list(genes)
+        if any(isinstance(g, WeightBlockGene) for g in genes):
+            raise ValueError("WeightChromosome cannot hold WeightBlockGenes")
+        arrays = {}
+        for name, dtype in self.fields:
+            if name == "in_layer" or name == "out_layer":
+                vals = [self.intern(getattr(g, name)) for g in genes]
+            else:
+                vals = [getattr(g, name) for g in genes]
+            arrays[name] = numpy.array(vals, dtype=dtype)
+        idents = [g.ident for g in genes]
+        width = max([len(i) for i in idents] + [self.ident.itemsize // 4, 1])
+        arrays["ident"] = numpy.array(idents, dtype="U" + str(width))
+        return arrays
+
+    def _splice(self, pos, arrays):
+        """Insert a dict of field arrays before position pos (which may be
+        an array of positions, as for numpy.insert).
+        """
+        for name in arrays:
+            cur = getattr(self, name)
+            if name == "ident" and arrays[name].itemsize > cur.itemsize:
+                cur = cur.astype(arrays[name].dtype)
+            setattr(self, name, numpy.insert(cur, pos, arrays[name]))
+
+    def extend(self, genes):
+        """Add a sequence of weight genes to the end of the chromosome.
+        """
+        self._splice(len(self), self._arrays_for(genes))
+
+    def append(self, gene):
+        """Add one weight gene to the end of the chromosome.
+
+        Each call reallocates the arrays, so prefer extend for many genes.
+        """
+        self.extend([gene])
+
+    def insert(self, pos, gene):
+        """Insert one weight gene before position pos.
+        """
+        if pos < 0:
+            pos = max(0, len(self) + pos)
+        self._splice(min(pos, len(self)), self._arrays_for([gene]))
+
+    def extend_columns(self, n, **columns):
+        """Add n genes to the end of the chromosome, given their values by
+        field name (including ident) as sequences or as one value for all.
+
+        in_layer and out_layer are given as layer IDs.
+        """
+        arrays = {}
+        for name, dtype in self.fields:
+            vals = columns[name]
+            if name == "in_layer" or name == "out_layer":
+                if isinstance(vals, str):
+                    vals = self.intern(vals)
+                else:
+                    vals = [self.intern(v) for v in vals]
+            arrays[name] = numpy.broadcast_to(numpy.asarray(vals, dtype=dtype),
+                                              (n,))
+        idents = numpy.asarray(columns["ident"], dtype=str)
+        arrays["ident"] = numpy.broadcast_to(idents, (n,))
+        self._splice(len(self), arrays)
+
+    def insert_many(self, positions, genes):
+        """Insert weight genes before the given positions (sorted, as for
+        insert) with one rebuild of the arrays.
+        """
+        self._splice(numpy.array(positions, dtype=numpy.intp),
+                     self._arrays_for(genes))
+
+    def index(self, gene):
+        """Return the position of a view belonging to this chromosome.
+        """
+        if isinstance(gene, WeightGeneView) and gene._chro is self:
+            return gene._pos
+        raise ValueError("gene is not a view into this chromosome")
+
+    def to_genes(self):
+        """Return the chromosome as a list of standalone WeightGenes.
+        """
+        return [view.to_gene() for view in self]
+
+    def __len__(self):
+        return len(self.weight)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            result = WeightChromosome()
+            result.layers = list(self.layers)
+            result.layer_index = dict(self.layer_index)
+            for name in self.arrays():
+                setattr(result, name, getattr(self, name)[key].copy())
+            return result
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("weight chromosome index out of range")
+        return WeightGeneView(self, key)
+
+    def __setitem__(self, key, value):
+        if isinstance(key, slice):
+            genes = list(value)
+            if isinstance(value, WeightChromosome):
+                genes = [view.to_gene() for view in value]
+            rest = [v.to_gene() for v in self]
+            rest[key] = genes
+            fresh = WeightChromosome(rest)
+            self.layers = fresh.layers
+            self.layer_index = fresh.layer_index
+            for name in fresh.arrays():
+                setattr(self, name, getattr(fresh, name))
+        else:
+            arrays = self._arrays_for([value])
+            if key < 0:
+                key += len(self)
+            for name in arrays:
+                if name == "ident":
+                    self.set_ident(key, str(arrays[name][0]))
+                else:
+                    getattr(self, name)[key] = arrays[name][0]
+
+    def __delitem__(self, key):
+        for name in self.arrays():
+            setattr(self, name, numpy.delete(getattr(self, name), key))
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield WeightGeneView(self, pos)
+
+    def __reversed__(self):
+        for pos in range(len(self) - 1, -1, -1):
+            yield WeightGeneView(self, pos)
+
+    def __copy__(self):
+        return self[:]
+
+    def __deepcopy__(self, memo):
+        return self[:]
+
+    @classmethod
+    def gather(cls, parts):
+        """Return a new chromosome holding copies of the genes at the given
+        positions of other chromosomes.
+
+        parts: (WeightChromosome, positions) pairs, in order
+        """
+        result = cls()
+        columns = dict((name, []) for name in result.arrays())
+        for chro, positions in parts:
+            positions = numpy.asarray(positions, dtype=numpy.intp)
+            #layer indexes are mapped onto the new intern table
+            remap = numpy.array([result.intern(layer) for layer in chro.layers],
+                                dtype=numpy.int32)
+            for name in result.arrays():
+                values = getattr(chro, name)[positions]
+                if name == "in_layer" or name == "out_layer":
+                    values = remap[values]
+                columns[name].append(values)
+        for name, dtype in cls.fields:
+            setattr(result, name, numpy.concatenate(
+                [numpy.zeros(0, dtype=dtype)] + columns[name]).astype(dtype))
+        width = max([a.itemsize // 4 for a in columns["ident"]] + [6])
+        result.ident = numpy.concatenate(
+            [numpy.zeros(0, dtype="U6")] + columns["ident"]).astype(
+                "U" + str(width))
+        return result
+
+    @classmethod
+    def from_arrays(cls, layers, arrays):
+        """Return a chromosome built from a layer intern table and a dict of
+        per-gene arrays (as returned by state()).
+        """
+        result = cls()
+        for layer in layers:
+            result.intern(layer)
+        for name in result.arrays():
+            setattr(result, name, arrays[name])
+        return result
+
+    def state(self):
+        """Return the layer intern table and a dict of the per-gene arrays.
+        """
+        arrays = {}
+        for name in self.arrays():
+            arrays[name] = getattr(self, name)
+        return list(self.layers), arrays
+
+    def arrays(self):
+        """Return the names of all per-gene arrays.
+        """
+        return [name for name, dtype in self.fields] + ["ident"]
+
+    def nbytes(self):
+        """Return the number of bytes used by the gene arrays.
+        """
+        return sum(getattr(self, name).nbytes for name in self.arrays())
+
+
 class HaploidGenome(Genome):
     """Haploid genome defining a neural network.
 
@@ -1480,11 +3506,14 @@ class HaploidGenome(Genome):
     def __init__(self, layerchr, weightchr):
         super().__init__(layerchr, [], weightchr, [])
 
+    @profiled("recombine", fresh=True)
     def recombine(self, other_genome):
         """Return a new child genome from two parent genomes.
 
         Overrides recombine from base genome class. 
         """
+        self.share_genes()
+        other_genome.share_genes()
         #first, do 'crossover' b/w the two genomes
         #hm... could we cheat here real quick:
         self.layerchr_b = other_genome.layerchr_a
@@ -1495,8 +3524,429 @@ class HaploidGenome(Genome):
         #then randomly pick one possible child
         layers = random.sample([result.layerchr_a, result.layerchr_b], 1)
         weights = random.sample([result.weightchr_a, result.weightchr_b], 1)
-        layers = layers[0]
-        weights = weights[0]
+        layers = child_chromosome(layers[0])
+        weights = child_chromosome(weights[0])
         child = HaploidGenome(layers, weights)
+        child.profile = Profile.current
         child.mutate()
         return child
+
+
+#helper function for pack_genome
+def split_blocks(genes):
+    """Return a WeightChromosome of a list of weight genes, with each
+    WeightBlockGene in it as a WeightGene of its first weight, and the block
+    record of the list (None if it has no blocks).
+
+    block record: (array of the number of weights in each gene's block,
+    -1 if it is not a block; array of all the block weights, in order)
+    """
+    genes = list(genes)
+    lengths = numpy.full(len(genes), -1, dtype=numpy.int32)
+    block_weights = []
+    stand_ins = []
+    for pos, gene in enumerate(genes):
+        if isinstance(gene, WeightBlockGene):
+            lengths[pos] = len(gene.weight)
+            block_weights.append(gene.weight)
+            first = gene.weight[0] if len(gene.weight) > 0 else 0.0
+            stand_in = WeightGene(gene.dom, gene.can_mut, gene.can_dup,
+                                  gene.mut_rate, gene.ident, first,
+                                  gene.in_node, gene.out_node, gene.in_layer,
+                                  gene.out_layer)
+            stand_in.alt_in = gene.alt_in
+            gene = stand_in
+        stand_ins.append(gene)
+    if not block_weights:
+        return WeightChromosome(genes), None
+    return WeightChromosome(stand_ins), (
+        lengths, numpy.concatenate(block_weights).astype(numpy.float64))
+
+#helper function for unpack_genome
+def join_blocks(genes, blocks):
+    """Return a list of weight genes with the WeightBlockGenes of a block
+    record (see split_blocks) put back in place of their stand-ins.
+    """
+    lengths, block_weights = blocks
+    offset = 0
+    for pos in numpy.flatnonzero(lengths >= 0).tolist():
+        gene = genes[pos]
+        n = int(lengths[pos])
+        block = WeightBlockGene(gene.dom, gene.can_mut, gene.can_dup,
+                                gene.mut_rate, gene.ident,
+                                block_weights[offset:(offset + n)],
+                                gene.in_node, gene.out_node, gene.in_layer,
+                                gene.out_layer)
+        block.alt_in = gene.alt_in
+        genes[pos] = block
+        offset += n
+    return genes
+
+def pack_genome(genome, copy_arrays=False):
+    """Return a genome as a compact tuple of plain values and NumPy arrays,
+    suitable for sending to another process.
+
+    Layer genes become tuples; each weight chromosome becomes the state
+    of a WeightChromosome plus its block record (see split_blocks).
+    copy_arrays: if true, the arrays, outs, and mut_record are copies, so
+    later changes to the genome do not reach the packed one
+    """
+    layers = []
+    for chro in [genome.layerchr_a, genome.layerchr_b]:
+        layers.append([(g.dom, g.can_mut, g.can_dup, g.mut_rate, g.ident,
+                        list(g.inputs), g.nodes, g.layer_type) for g in chro])
+    weights = []
+    for chro in [genome.weightchr_a, genome.weightchr_b]:
+        blocks = None
+        if not isinstance(chro, WeightChromosome):
+            chro, blocks = split_blocks(chro)
+            weights.append(chro.state() + (blocks,))
+            continue
+        layer_ids, arrays = chro.state()
+        if copy_arrays:
+            arrays = dict((name, arr.copy()) for name, arr in arrays.items())
+        weights.append((layer_ids, arrays, blocks))
+    outs = genome.outs
+    mut_record = genome.mut_record
+    if copy_arrays:
+        outs = copy.deepcopy(outs)
+        mut_record = copy.deepcopy(mut_record)
+    return (isinstance(genome, HaploidGenome),
+            isinstance(genome.weightchr_a, WeightChromosome),
+            layers, weights, outs, mut_record)
+
+def unpack_genome(packed, copy_arrays=False):
+    """Return the genome packed by pack_genome.
+
+    copy_arrays: if true, the genome gets copies of the packed arrays,
+    outs, and mut_record, so changes to it do not reach the packed genome
+    """
+    haploid, columnar, layers, weights, outs, mut_record = packed
+    if copy_arrays:
+        outs = copy.deepcopy(outs)
+        mut_record = copy.deepcopy(mut_record)
+    layer_chros = []
+    for chro in layers:
+        layer_chros.append([LayerGene(dom, can_mut, can_dup, mut_rate, ident,
+                                      list(inputs), nodes, layer_type)
+                            for (dom, can_mut, can_dup, mut_rate, ident,
+                                 inputs, nodes, layer_type) in chro])
+    weight_chros = []
+    for layer_ids, arrays, blocks in weights:
+        if copy_arrays and columnar:
+            arrays = dict((name, arr.copy()) for name, arr in arrays.items())
+        chro = WeightChromosome.from_arrays(layer_ids, arrays)
+        if not columnar:
+            chro = chro.to_genes()
+            if blocks is not None:
+                chro = join_blocks(chro, blocks)
+        weight_chros.append(chro)
+    if haploid:
+        genome = HaploidGenome(layer_chros[0], weight_chros[0])
+    else:
+        genome = Genome(layer_chros[0], layer_chros[1], weight_chros[0],
+                        weight_chros[1], outs)
+    genome.outs = outs
+    genome.mut_record = mut_record
+    return genome
+
+#binary genome format:
+#header: magic, version, flags, length of metadata, length of array data
+#metadata: JSON with the layer chromosomes, outs, mut_record, and the
+#   layer table, length, and array types of each weight chromosome
+#   (and, from version 2, the number of block weights if it has blocks)
+#array data: each weight chromosome's arrays, little-endian, in
+#   WeightChromosome.arrays() order, then its block record arrays if any,
+#   each padded to 8 bytes
+#   (or all zlib-compressed together if flags & genome_compressed)
+genome_magic = b"DGEN"
+genome_version = 2
+genome_header = struct.Struct("<4sHHIQ")
+genome_compressed = 1
+
+#helper function for the binary genome format
+def padded(n):
+    """Return n rounded up to a multiple of 8.
+    """
+    return (n + 7) // 8 * 8
+
+def write_genome_buffer(packed, compress=False):
+    """Return a genome packed by pack_genome in the binary genome format.
+    """
+    haploid, columnar, layers, weights, outs, mut_record = packed
+    meta = {"haploid": haploid, "columnar": columnar, "layers": layers,
+            "outs": outs, "mut_record": mut_record, "weights": []}
+    data = []
+    for layer_ids, arrays, blocks in weights:
+        types = []
+        written = [arrays[name] for name in WeightChromosome().arrays()]
+        if blocks is not None:
+            written.extend(blocks)
+        for arr in written:
+            arr = numpy.ascontiguousarray(arr,
+                                          dtype=arr.dtype.newbyteorder("<"))
+            types.append(arr.dtype.str)
+            raw = arr.tobytes()
+            data.append(raw + bytes(padded(len(raw)) - len(raw)))
+        record = {"layers": layer_ids, "n": len(arrays["weight"]),
+                  "types": [[name, dtype] for name, dtype in
+                            zip(WeightChromosome().arrays(), types)]}
+        if blocks is not None:
+            record["blocks"] = [len(blocks[1])] + types[-2:]
+        meta["weights"].append(record)
+    data = b"".join(data)
+    flags = 0
+    if compress:
+        flags |= genome_compressed
+        data = zlib.compress(data)
+    meta = json.dumps(meta).encode()
+    meta += b" " * (padded(genome_header.size + len(meta)) -
+                    genome_header.size - len(meta))
+    header = genome_header.pack(genome_magic, genome_version, flags,
+                                len(meta), len(data))
+    return header + meta + data
+
+def read_genome_buffer(data, path=None):
+    """Return the packed genome (see pack_genome) from bytes in the binary
+    genome format, or memory-mapped from the file at path if data is None.
+    """
+    if data is None:
+        with open(path, "rb") as f:
+            head = f.read(genome_header.size)
+            magic, version, flags, meta_len, data_len = genome_header.unpack(
+                head)
+            meta = f.read(meta_len)
+    else:
+        magic, version, flags, meta_len, data_len = genome_header.unpack_from(
+            data)
+        meta = data[genome_header.size:(genome_header.size + meta_len)]
+    if magic != genome_magic:
+        raise ValueError("not a DGEANN genome file")
+    if version > genome_version:
+        raise ValueError("unsupported genome file version " + str(version))
+    meta = json.loads(meta.decode())
+    offset = genome_header.size + meta_len
+    if flags & genome_compressed:
+        if data is None:
+            raise ValueError("compressed genome files cannot be memory-mapped")
+        data = zlib.decompress(data[offset:(offset + data_len)])
+        offset = 0
+    weights = []
+    for chro in meta["weights"]:
+        n = chro["n"]
+        wanted = [(name, dtype, n) for name, dtype in chro["types"]]
+        if "blocks" in chro:
+            total, len_type, weight_type = chro["blocks"]
+            wanted += [("block_len", len_type, n),
+                       ("block_weight", weight_type, total)]
+        arrays = {}
+        for name, dtype, count in wanted:
+            dtype = numpy.dtype(dtype)
+            if data is not None:
+                arr = numpy.frombuffer(data, dtype, count, offset).copy()
+            elif count == 0:
+                arr = numpy.zeros(0, dtype)
+            else:
+                arr = numpy.memmap(path, dtype, "c", offset, (count,))
+            arrays[name] = arr
+            offset += padded(count * dtype.itemsize)
+        blocks = None
+        if "blocks" in chro:
+            blocks = (arrays.pop("block_len"), arrays.pop("block_weight"))
+        weights.append((chro["layers"], arrays, blocks))
+    return (meta["haploid"], meta["columnar"], meta["layers"], weights,
+            meta["outs"], meta["mut_record"])
+
+#helper function for breed_population
+def seeded_recombine(parent_a, parent_b, seed):
+    """Return the child of two genomes, with random and np_random seeded
+    from seed (a numpy SeedSequence).
+
+    The previous random state and np_random are restored afterwards.
+    """
+    global np_random
+    state = random.getstate()
+    old_np_random = np_random
+    random.seed(int(seed.generate_state(1, numpy.uint64)[0]))
+    np_random = numpy.random.default_rng(seed)
+    try:
+        child = parent_a.recombine(parent_b)
+    finally:
+        random.setstate(state)
+        np_random = old_np_random
+    return child
+
+#module settings breed_population hands to its worker processes
+#(which do not inherit them under the spawn start method)
+worker_settings = ("sigma", "def_mut_rate", "constrain_crossover",
+                   "layer_mut_probs", "weight_mut_probs", "record_muts",
+                   "batch_mutation", "sparse_mutation", "block_weights",
+                   "fast_idents", "ident_run", "ident_reserved",
+                   "profiling")
+
+def current_settings():
+    """Return a dict of the current values of the worker_settings.
+    """
+    return dict((name, globals()[name]) for name in worker_settings)
+
+#helper function for breed_population, run in each worker process
+def apply_settings(settings):
+    """Set module settings from a dict made by current_settings.
+    """
+    globals().update(settings)
+
+#helper function for breed_population, run in the worker processes
+def breed_packed(task):
+    """Return the packed child of a pair of packed genomes.
+    """
+    packed_a, packed_b, seed = task
+    child = seeded_recombine(unpack_genome(packed_a), unpack_genome(packed_b),
+                             seed)
+    return pack_genome(child)
+
+def breed_population(pairs, workers=None, seed=None):
+    """Return a list of children, one for each (genome, genome) pair in
+    pairs, in the same order.
+
+    Each pair gets its own random stream spawned from seed, so the children
+    are the same whatever the number of workers.
+    workers: number of worker processes (None or 1 breeds in this process),
+    each given this process's worker_settings
+    seed: seed for the random streams (if None, one is drawn from random)
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    seeds = numpy.random.SeedSequence(seed).spawn(len(pairs))
+    if workers is None or workers <= 1:
+        return [seeded_recombine(a, b, s) for (a, b), s in zip(pairs, seeds)]
+    tasks = [(pack_genome(a), pack_genome(b), s)
+             for (a, b), s in zip(pairs, seeds)]
+    chunk = max(1, len(tasks) // (workers * 4))
+    with multiprocessing.Pool(workers, apply_settings,
+                              (current_settings(),)) as pool:
+        packed = pool.map(breed_packed, tasks, chunk)
+    return [unpack_genome(p) for p in packed]
+
+class LineageArchive(object):
+    """Stores genomes by lineage instead of in full.
+
+    Founders (and every child keyframe_every generations from its last
+    keyframe) are stored whole, in the binary genome format; other children
+    are stored as their parents' IDs, the seed they were bred with, and
+    their mutation record, and are bred again from their parents when asked
+    for. Reconstruction needs the same module settings (mutation rates,
+    toggles, fast_idents off) as when the child was bred.
+    records: ID: ("key", bytes) or ("child", parent ID, parent ID, seed,
+    depth, mut_record)
+    cache_size: number of recently used genomes kept packed in memory
+    """
+
+    def __init__(self, keyframe_every=8, cache_size=64):
+        self.keyframe_every = keyframe_every
+        self.cache_size = cache_size
+        self.records = {}
+        self.cache = {}
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, ident):
+        return ident in self.records
+
+    def add(self, genome):
+        """Store a genome in full, and return its ID.
+        """
+        ident = self.next_id
+        self.next_id += 1
+        self.records[ident] = ("key", genome.to_bytes(compress=True))
+        self.remember(ident, genome)
+        return ident
+
+    def breed(self, id_a, id_b, seed=None):
+        """Return the ID of a new child of two stored genomes, and the child.
+
+        The child is bred as seeded_recombine would, with seed (an int; if
+        None, one is drawn from random).
+        """
+        if seed is None:
+            seed = random.getrandbits(64)
+        child = seeded_recombine(self.get(id_a), self.get(id_b),
+                                 numpy.random.SeedSequence(seed))
+        depth = max(self.depth(id_a), self.depth(id_b)) + 1
+        ident = self.next_id
+        self.next_id += 1
+        if depth >= self.keyframe_every:
+            self.records[ident] = ("key", child.to_bytes(compress=True))
+        else:
+            self.records[ident] = ("child", id_a, id_b, seed, depth,
+                                   list(child.mut_record))
+        self.remember(ident, child)
+        return ident, child
+
+    def depth(self, ident):
+        """Return the number of generations since a genome's last keyframe.
+        """
+        record = self.records[ident]
+        if record[0] == "key":
+            return 0
+        return record[4]
+
+    def get(self, ident):
+        """Return a new copy of a stored genome.
+        """
+        if ident in self.cache:
+            return unpack_genome(self.cache[ident], copy_arrays=True)
+        record = self.records[ident]
+        if record[0] == "key":
+            genome = Genome.from_bytes(record[1])
+        else:
+            kind, id_a, id_b, seed, depth, mut_record = record
+            genome = seeded_recombine(self.get(id_a), self.get(id_b),
+                                      numpy.random.SeedSequence(seed))
+            if genome.mut_record != mut_record:
+                raise ValueError("genome " + str(ident) + " did not breed "
+                                 "the same way again; have the module "
+                                 "settings changed?")
+        self.remember(ident, genome)
+        return genome
+
+    #helper function for add, breed, and get
+    def remember(self, ident, genome):
+        """Keep a packed copy of a genome in the cache, dropping the oldest
+        if the cache is full.
+        """
+        if self.cache_size <= 0:
+            return
+        self.cache.pop(ident, None)
+        if len(self.cache) >= self.cache_size:
+            del self.cache[next(iter(self.cache))]
+        self.cache[ident] = pack_genome(genome, copy_arrays=True)
+
+    def nbytes(self):
+        """Return the number of bytes used by keyframes.
+        """
+        return sum(len(r[1]) for r in self.records.values() if r[0] == "key")
+
+    def save(self, path):
+        """Write the archive's records to a file.
+        """
+        with open(path, "wb") as f:
+            pickle.dump((self.keyframe_every, self.next_id, self.records), f,
+                        pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path, cache_size=64):
+        """Return an archive read from a file written by save.
+        """
+        with open(path, "rb") as f:
+            keyframe_every, next_id, records = pickle.load(f)
+        archive = cls(keyframe_every, cache_size)
+        archive.next_id = next_id
+        archive.records = records
+        #children are bred again with fast_idents off, so only keyframes
+        #can hold IDs from ident_allocator
+        for record in records.values():
+            if record[0] == "key":
+                reserve_idents(Genome.from_bytes(record[1]))
+        return archive